@@ -0,0 +1,853 @@
+#!/usr/bin/env python3
+"""
+Session Inspector Benchmark - JSONL ingestion throughput on a synthetic session.
+
+Writes one large synthetic session (tool calls, large tool results, hook and
+turn-duration entries, attachments) and measures lines/sec for:
+- full decode with the stdlib decoder (behaviour before pre-decode filtering)
+- pre-decode filtering for the tool-call reports (permissions/tools/errors)
+- both again with orjson, when installed
+
+With --classify, measures result classification instead: string tool results
+from real sessions (topped up with synthetic ones) through the hard-coded
+checks used before classification rules, the rules tried one by one, and the
+compiled Classifier, with and without extra config rules.
+
+With --replay, measures permission ruleset replay: synthetic tool calls
+decided by the indexed Ruleset and by a scan of every rule, for a small and
+a large synthetic ruleset.
+
+With --suite, generates a sessions tree (generate_sessions.py) and times each
+pipeline stage (discovery, read, decode, extract, index build/load, report
+aggregation, rendering) and each subcommand in its own process, with its
+peak RSS. The run exits non-zero when throughput drops or RSS grows beyond
+the thresholds against the baseline: benchmark-baseline.json next to this
+script holds the reference numbers and the tree they were taken on
+(--save-baseline records one, --baseline PATH keeps one per machine). Slower
+cases are measured a second time before they count.
+
+With --serve, times repeated queries run in a fresh process against the warm
+index and answered by a resident `session_inspector.py serve` process.
+
+With --startup, times `summary -c` from process start to exit on a warm index
+(found by full discovery, through $CLAUDE_PROJECT_DIR and by --transcript) next
+to bare interpreter startup, and fails when a run exceeds the budget.
+
+Usage:
+    python benchmark.py [--turns N] [--repeat N] [--keep PATH]
+    python benchmark.py --classify [--corpus N] [--path DIR] [--repeat N]
+    python benchmark.py --replay [--calls N] [--ruleset-rules N] [--repeat N]
+    python benchmark.py --suite [--size 50MB | --tree DIR] [--save-baseline] [--threshold 0.2]
+    python benchmark.py --serve [--size 50MB | --tree DIR] [--repeat N]
+    python benchmark.py --startup [--size 50MB | --tree DIR] [--budget SECONDS]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import generate_sessions as gen  # noqa: E402
+import session_inspector_core as si  # noqa: E402
+
+INSPECTOR = Path(__file__).resolve().parent / 'session_inspector.py'
+
+
+# === Synthetic Session ===
+
+def write_synthetic_session(path: Path, turns: int, seed: int = 1):
+    """Write a session of `turns` turns (see generate_sessions), return the line count."""
+    return gen.write_session(path, random.Random(seed), turns=turns)['lines']
+
+
+# === Result Classification ===
+
+# classify_result() before classification rules, the reference for categories
+LEGACY_REJECTION_PATTERNS = ['User rejected tool use', "The user doesn't want to proceed"]
+LEGACY_DCG_PATTERN = 'BLOCKED by dcg'
+LEGACY_ERROR_PREFIXES = [
+    'Error: Exit code', 'Error: File does not exist', 'Error: File has not been read',
+    'Error: String to replace not found', 'Error: Request failed', 'Error: File content',
+    'Sibling tool call errored',
+]
+
+
+def legacy_classify(result) -> str:
+    if LEGACY_DCG_PATTERN in result:
+        return 'dcg_blocked'
+    for pattern in LEGACY_REJECTION_PATTERNS:
+        if pattern in result:
+            return 'user_rejected'
+    for prefix in LEGACY_ERROR_PREFIXES:
+        if result.startswith(prefix):
+            return 'error'
+    if result.startswith('Error:'):
+        return 'error'
+    return 'success'
+
+
+def one_by_one(rules: list):
+    """Classify function trying each rule in turn (no combined prefix check)."""
+    tests = []
+    for rule in rules:
+        flags = re.IGNORECASE if rule.get('ignore_case') else 0
+        if 'regex' in rule or 'substring' in rule:
+            pattern = rule.get('regex') or re.escape(rule['substring'])
+            search = re.compile(pattern, flags).search
+            gate = rule.get('prefix', '')
+            test = (lambda gate, search: lambda text: text.startswith(gate) and search(text))(
+                gate, search)
+        else:
+            pattern = r'\A' + re.escape(rule['prefix'])
+            test = re.compile(pattern, flags).match
+        tests.append((test, (rule.get('category', 'error'), rule['class'])))
+
+    def classify(result):
+        for test, outcome in tests:
+            if test(result):
+                return outcome
+        return 'success', None
+    return classify
+
+
+def config_rules(n: int) -> list:
+    """N synthetic config rules: substrings, prefixes and a few regexes."""
+    rules = []
+    for i in range(n):
+        if i % 10 == 9:
+            rules.append({'class': f'custom_{i}', 'regex': rf'\AError:[^\n]*code {i}\b'})
+        elif i % 2:
+            rules.append({'class': f'custom_{i}', 'prefix': f'Error: Custom failure {i}'})
+        else:
+            rules.append({'class': f'custom_{i}', 'substring': f'deprecated API {i}'})
+    return rules
+
+
+def synthetic_results(rnd: random.Random) -> str:
+    """One synthetic string result (error, rejection or plain string output)."""
+    def text(n):
+        return ('lorem ipsum dolor sit amet ' * (n // 27 + 1))[:n]
+
+    r = rnd.random()
+    if r < 0.3:
+        return f'Error: Exit code {rnd.choice([1, 1, 2, 127])}\n' + text(rnd.randint(20, 4000))
+    if r < 0.4:
+        return 'User rejected tool use'
+    if r < 0.45:
+        return ("The user doesn't want to proceed with this tool use. The tool use was "
+                "rejected (eg. if it was a file edit, the new_string was NOT written).")
+    if r < 0.5:
+        return f'Error: BLOCKED by dcg: {rnd.choice(gen.BASH_COMMANDS)}'
+    if r < 0.55:
+        return rnd.choice(['Error: File does not exist.', 'Error: Request timed out after 120s',
+                           'Error: connect ECONNREFUSED 127.0.0.1:8080',
+                           'Error: MCP error -32603: Internal error',
+                           'Error: String to replace not found in file.'])
+    return text(rnd.randint(20, 2000))
+
+
+def result_corpus(path: Path, size: int, seed: int = 1) -> tuple:
+    """(corpus, real count): string results found under path, topped up to size."""
+    corpus = []
+    for session_file in sorted(path.glob('*/*.jsonl')) if path.is_dir() else []:
+        with open(session_file, 'rb') as f:
+            for line in f:
+                if b'"toolUseResult"' not in line:
+                    continue
+                try:
+                    result = json.loads(line).get('toolUseResult')
+                except ValueError:
+                    continue
+                if isinstance(result, str):
+                    corpus.append(result)
+        if len(corpus) >= size:
+            break
+    corpus = corpus[:size]
+    real = len(corpus)
+    rnd = random.Random(seed)
+    corpus += [synthetic_results(rnd) for _ in range(size - real)]
+    rnd.shuffle(corpus)
+    return corpus, real
+
+
+def measure_classify(classify, corpus: list, repeat: int) -> tuple:
+    """Best-of-N seconds to classify the corpus, and the outcomes."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        outcomes = [classify(result) for result in corpus]
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, outcomes
+
+
+def run_classify(args):
+    corpus, real = result_corpus(args.path, args.corpus)
+    size_mb = sum(len(r) for r in corpus) / 1e6
+    print(f"Result corpus: {len(corpus)} strings ({real} from {args.path}), {size_mb:.1f} MB")
+    print()
+
+    builtin = si.Classifier(si.CLASSIFY_RULES)
+    extended = si.Classifier(config_rules(args.config_rules) + si.CLASSIFY_RULES)
+    cases = [
+        ('hard-coded checks (before)', legacy_classify, None),
+        ('rules one by one', one_by_one(builtin.rules), 'builtin'),
+        ('compiled', builtin.classify, 'builtin'),
+        (f'one by one, +{args.config_rules} rules', one_by_one(extended.rules), 'extended'),
+        (f'compiled, +{args.config_rules} rules', extended.classify, 'extended'),
+    ]
+
+    print(f"{'Case':<28} {'Seconds':>9} {'Results/sec':>13} {'Speedup':>8}")
+    print("-" * 61)
+    baseline = None
+    expected = {}
+    for label, classify, rules in cases:
+        seconds, outcomes = measure_classify(classify, corpus, args.repeat)
+        if rules is None:
+            # The built-in rules must keep the categories of the hard-coded checks
+            expected['legacy'] = outcomes
+        elif rules not in expected:
+            expected[rules] = outcomes
+            if rules == 'builtin' and [c for c, _ in outcomes] != expected['legacy']:
+                print(f"Error: {label} changed result categories", file=sys.stderr)
+                sys.exit(1)
+        elif outcomes != expected[rules]:
+            print(f"Error: {label} disagrees with the one-by-one rules", file=sys.stderr)
+            sys.exit(1)
+        rate = len(corpus) / seconds
+        baseline = baseline or rate
+        print(f"{label:<28} {seconds:>9.3f} {rate:>13,.0f} {rate / baseline:>7.1f}x")
+
+
+# === Ruleset Replay ===
+
+REPLAY_PROGRAMS = ['git', 'npm', 'pytest', 'make', 'docker', 'kubectl', 'cargo', 'go', 'rm', 'ls']
+REPLAY_SUBCOMMANDS = ['status', 'test', 'run', 'build', 'push', 'log', '-rf', '-la']
+
+
+def synthetic_calls(n: int, seed: int = 1) -> list:
+    """N tool calls as extracted (Bash lines, edits, fetches, MCP and read-only tools)."""
+    rnd = random.Random(seed)
+    calls = []
+    for _ in range(n):
+        r = rnd.random()
+        tc = {'tool': 'Read', 'command': None, 'file_path': None, 'input': {}}
+        if r < 0.5:
+            commands = [f"{rnd.choice(REPLAY_PROGRAMS)} {rnd.choice(REPLAY_SUBCOMMANDS)} "
+                        f"x{rnd.randint(0, 50)}" for _ in range(rnd.choice([1, 1, 2, 3]))]
+            line = rnd.choice([' && ', ' | ', '; ']).join(commands)
+            tc.update(tool='Bash', command=rnd.choice(['', 'cd src && ', 'FOO=1 ']) + line)
+        elif r < 0.7:
+            tc.update(tool=rnd.choice(['Edit', 'Write']),
+                      file_path=f"/home/dev/proj{rnd.randint(0, 9)}/src/m{rnd.randint(0, 99)}.py")
+        elif r < 0.8:
+            tc.update(tool='WebFetch', input={'url': f"https://site{rnd.randint(0, 30)}.dev/x"})
+        elif r < 0.9:
+            tc['tool'] = f"mcp__srv{rnd.randint(0, 5)}__tool{rnd.randint(0, 5)}"
+        calls.append(tc)
+    return calls
+
+
+def synthetic_ruleset(n: int, seed: int = 1) -> dict:
+    """About N rules of every kind, most of them Bash prefixes, plus two DCG patterns."""
+    rnd = random.Random(seed)
+    rules = {'allow': [], 'ask': [], 'deny': [], 'dcg': [r'\brm\s+-rf\s+/', r'push --force']}
+    for i in range(n):
+        kind = rnd.choice(['allow'] * 8 + ['ask', 'deny'])
+        r = rnd.random()
+        if r < 0.7:
+            words = f"{rnd.choice(REPLAY_PROGRAMS)} {rnd.choice(REPLAY_SUBCOMMANDS)} x{i % 60}"
+            rule = f"Bash({' '.join(words.split()[:rnd.randint(1, 3)])}{rnd.choice([':*', ''])})"
+        elif r < 0.85:
+            rule = f"Edit(//home/dev/proj{i % 12}/{rnd.choice(['src', 'docs'])}/**)"
+        elif r < 0.95:
+            rule = f"WebFetch(domain:site{i % 40}.dev)"
+        else:
+            rule = f"mcp__srv{i % 8}" + rnd.choice(['', f"__tool{i % 6}"])
+        rules[kind].append(rule)
+    return rules
+
+
+def linear_decide(rules: dict):
+    """Ruleset.decide() reference that tries every rule against every path."""
+    parsed = []
+    for kind in si.PERMISSION_RULE_KINDS:
+        for rule in rules[kind]:
+            found = si.parse_permission_rule(rule)
+            if found is not None:
+                parsed.append((kind, found[0], found[1], rule))
+    dcg = [(pattern, re.compile(pattern)) for pattern in rules['dcg']]
+
+    def match(path):
+        best = {}
+        for kind, rule_path, prefix, rule in parsed:
+            if path[:len(rule_path)] == rule_path if prefix else path == rule_path:
+                score = (not prefix, len(rule_path))  # Most specific, first on ties
+                if kind not in best or score > best[kind][0]:
+                    best[kind] = (score, rule)
+        return {kind: rule for kind, (_, rule) in best.items()}
+
+    def decide(tc):
+        paths = si.permission_paths(tc)
+        if not paths:
+            return None, ()
+        if tc['tool'] == 'Bash':
+            for pattern, rx in dcg:
+                if rx.search(tc['command'] or ''):
+                    return 'block', (f"dcg:{pattern}",)
+        allowed, asked, unmatched = [], [], False
+        for path in paths:
+            found = match(path)
+            if 'deny' in found:
+                return 'block', (found['deny'],)
+            if 'ask' in found:
+                asked.append(found['ask'])
+            elif 'allow' in found:
+                allowed.append(found['allow'])
+            else:
+                unmatched = True
+        if asked or unmatched:
+            return 'prompt', tuple(dict.fromkeys(asked))
+        return 'allow', tuple(dict.fromkeys(allowed))
+    return decide
+
+
+def run_replay(args):
+    calls = synthetic_calls(args.calls)
+    print(f"Tool calls: {len(calls)} synthetic")
+    print()
+    print(f"{'Case':<28} {'Seconds':>9} {'Calls/sec':>13} {'Speedup':>8}")
+    print("-" * 61)
+    for n in (args.ruleset_rules // 10, args.ruleset_rules):
+        rules = synthetic_ruleset(n)
+        baseline, expected = None, None
+        for label, decide in ((f'linear scan, {n} rules', linear_decide(rules)),
+                              (f'indexed, {n} rules', si.Ruleset(rules).decide)):
+            seconds, outcomes = measure_classify(decide, calls, args.repeat)
+            if expected is None:
+                expected = outcomes
+            elif outcomes != expected:
+                print(f"Error: {label} disagrees with the linear scan", file=sys.stderr)
+                sys.exit(1)
+            rate = len(calls) / seconds
+            baseline = baseline or rate
+            print(f"{label:<28} {seconds:>9.3f} {rate:>13,.0f} {rate / baseline:>7.1f}x")
+
+
+# === Suite ===
+
+# The suite's baseline (reference numbers, committed with the tree parameters
+# they were recorded on), and the changes that fail a run: throughput below, or
+# peak RSS above, the baseline by more than this share
+BASELINE_PATH = Path(__file__).resolve().parent / 'benchmark-baseline.json'
+THROUGHPUT_THRESHOLD = 0.2
+RSS_THRESHOLD = 0.2
+
+# ... and by more than this much: on small trees most cases take little more than
+# interpreter startup, whose jitter alone exceeds the shares
+SUITE_NOISE_SECONDS = 0.1
+SUITE_NOISE_RSS_MB = 8
+
+# Pipeline stages, each timed in a fresh process. Later stages use the index
+# the earlier ones built; render aggregates first (untimed).
+STAGES = ('discover', 'read', 'decode', 'extract', 'index-build', 'index-load',
+          'aggregate', 'render')
+
+# Subcommands timed end to end on the warm index with one job, plus a cold pass.
+# {ruleset} and {export} are files in the suite's work directory.
+SUBCOMMANDS = [
+    ['summary'], ['permissions'], ['tools'], ['latency'], ['turns'], ['hooks'], ['tokens'],
+    ['context'], ['timeline'], ['errors'], ['all'], ['all', '--no-cache'],
+    ['search', 'Exit code'], ['classify'], ['suggest-rules'], ['replay', '{ruleset}'],
+    ['export', '-o', '{export}'],
+]
+SUITE_RULESET = {'permissions': {'allow': ['Bash(git status)', 'Bash(ls:*)', 'Read'],
+                                 'deny': ['Bash(rm:*)']},
+                 'dcg': [r'\brm\s+-rf\b']}
+
+
+def report_args(tree: Path, index: Path) -> argparse.Namespace:
+    """The common session_inspector options, as a report run with defaults sees them."""
+    return argparse.Namespace(
+        path=tree, session=None, project=None, current=False, recent=None, since=None,
+        until=None, last=None, json=False, brief=False, index=index, no_cache=False,
+        catalog=False, json_decoder='auto', jobs=1, classify_rules=None, filter=None,
+        profile=False, profile_json=False, cprofile=None)
+
+
+def run_stage(stage: str, tree: Path, index: Path) -> float:
+    """Seconds one pipeline stage takes over the whole tree."""
+    args = report_args(tree, index)
+    start = time.perf_counter()
+    sessions = si.find_sessions(tree)
+    if stage == 'discover':
+        return time.perf_counter() - start
+    if stage == 'render':
+        reports = si.run_reports(list(si.REPORTS.values()), sessions, args)
+        with open(os.devnull, 'w') as devnull:
+            stdout, sys.stdout = sys.stdout, devnull
+            try:
+                start = time.perf_counter()
+                for report in reports:
+                    report.render()
+            finally:
+                sys.stdout = stdout
+        return time.perf_counter() - start
+
+    if stage == 'index-build' and index.exists():
+        index.unlink()
+    start = time.perf_counter()
+    if stage == 'aggregate':
+        si.run_reports(list(si.REPORTS.values()), sessions, args)
+    elif stage in ('index-build', 'index-load'):
+        db = si.SessionIndex(index)
+        try:
+            for _, session_file, proj_name in sessions:
+                db.load(session_file, proj_name)
+        finally:
+            db.close()
+    else:
+        for _, session_file, proj_name in sessions:
+            if stage == 'read':
+                with open(session_file, 'rb') as f:
+                    while f.read(1 << 20):
+                        pass
+            elif stage == 'decode':
+                for _ in si.SessionReader(session_file):
+                    pass
+            else:
+                si.load_session(session_file, proj_name)  # extract
+    return time.perf_counter() - start
+
+
+# Runs a suite child and writes its wall seconds and ru_maxrss to the fd in argv[1].
+# Linux hands a process's peak RSS on to the children it forks, so children of the
+# suite process itself would report at least its own peak: this runner stays small.
+CHILD_RUNNER = """
+import os, subprocess, sys, time
+start = time.perf_counter()
+proc = subprocess.Popen(sys.argv[2:])
+_, status, usage = os.wait4(proc.pid, 0)
+os.write(int(sys.argv[1]), f'{time.perf_counter() - start} {usage.ru_maxrss}'.encode())
+sys.exit(1 if os.waitstatus_to_exitcode(status) else 0)
+"""
+
+
+def run_child(command: list, env: dict) -> tuple:
+    """(wall seconds, peak RSS in MB, stdout) of a child process; exits if it fails."""
+    with (tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err,
+          tempfile.TemporaryFile() as stats):
+        fd = stats.fileno()
+        returncode = subprocess.call(
+            [sys.executable, '-c', CHILD_RUNNER, str(fd)] + [str(part) for part in command],
+            stdout=out, stderr=err, env=env, pass_fds=(fd,))
+        out.seek(0)
+        err.seek(0)
+        stats.seek(0)
+        output, errors, measured = out.read().decode(), err.read().decode(), stats.read()
+    if returncode:
+        print(f"Error: {' '.join(map(str, command))} failed:\n{errors}", file=sys.stderr)
+        sys.exit(1)
+    elapsed, maxrss = measured.split()
+    rss_mb = int(maxrss) / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
+    return float(elapsed), rss_mb, output
+
+
+def tree_bytes(tree: Path) -> int:
+    return sum(path.stat().st_size for path in tree.rglob('*.jsonl'))
+
+
+def is_slower(result: dict, base: dict, threshold: float) -> bool:
+    """Throughput dropped beyond the threshold, by more than timer noise."""
+    return (result['mb_per_s'] < base['mb_per_s'] * (1 - threshold)
+            and result['seconds'] - base['seconds'] >= SUITE_NOISE_SECONDS)
+
+
+def is_heavier(result: dict, base: dict, threshold: float) -> bool:
+    """Peak RSS grew beyond the threshold, by more than allocator noise."""
+    return (result['rss_mb'] > base['rss_mb'] * (1 + threshold)
+            and result['rss_mb'] - base['rss_mb'] >= SUITE_NOISE_RSS_MB)
+
+
+def tree_params(args) -> dict:
+    """Generator parameters of the suite's tree, as recorded with a baseline."""
+    return {'size': args.size, 'projects': args.projects, 'sessions': args.sessions,
+            'seed': 1}
+
+
+def run_suite(args):
+    baseline = None
+    if not args.save_baseline and args.baseline.exists():
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    work = Path(tempfile.mkdtemp(prefix='session-inspector-bench-'))
+    try:
+        tree = args.tree or work / 'projects'
+        if not tree.exists():
+            stats = gen.generate_tree(tree, args.size, args.projects, args.sessions)
+            print(f"Generated {stats['sessions']} sessions ({stats['subagents']} subagent "
+                  f"transcripts) in {tree}")
+        size = tree_bytes(tree)
+        size_mb = size / (1 << 20)
+        print(f"Tree: {size_mb:.1f} MB")
+        print()
+        if baseline and baseline.get('tree_bytes') != size:
+            params = baseline.get('tree', {})
+            print(f"Error: baseline {args.baseline} was recorded on a different tree "
+                  f"({baseline.get('tree_bytes', 0) / (1 << 20):.1f} MB, generated with "
+                  f"--size {params.get('size')} --projects {params.get('projects')} "
+                  f"--sessions {params.get('sessions')}); rerun with those, or record "
+                  f"a baseline of this tree with --baseline PATH --save-baseline",
+                  file=sys.stderr)
+            sys.exit(1)
+
+        # A private HOME keeps ~/.claude config (classification rules, settings) out;
+        # a fixed hash seed keeps set/dict layouts, and their timings, stable
+        env = dict(os.environ, HOME=str(work), PYTHONHASHSEED='0')
+        index = work / 'index.db'
+        export = work / 'export.db'
+        (work / 'ruleset.json').write_text(json.dumps(SUITE_RULESET))
+        inspector = [sys.executable, str(INSPECTOR)]
+
+        def run_stage_child(stage):
+            command = [sys.executable, str(Path(__file__).resolve()), '--stage', stage,
+                       '--tree', str(tree), '--index', str(index), '--repeat', str(args.repeat)]
+            _, rss_mb, output = run_child(command, env)
+            return json.loads(output)['seconds'], rss_mb
+
+        def run_subcommand(subcommand):
+            best, peak = None, 0
+            for _ in range(args.repeat):
+                if export.exists():
+                    export.unlink()
+                command = inspector + [part.format(ruleset=work / 'ruleset.json', export=export)
+                                       for part in subcommand]
+                seconds, rss_mb, _ = run_child(command + ['--path', str(tree), '--index',
+                                                          str(index), '-j', '1'], env)
+                best = seconds if best is None else min(best, seconds)
+                peak = max(peak, rss_mb)
+            return best, peak
+
+        cases = {f"stage {stage}": (lambda stage=stage: run_stage_child(stage))
+                 for stage in STAGES}
+        for subcommand in SUBCOMMANDS:
+            name = ' '.join(subcommand).replace(' {ruleset}', '').replace(' -o {export}', '')
+            cases[name] = lambda subcommand=subcommand: run_subcommand(subcommand)
+
+        def result(seconds, rss_mb):
+            return {'seconds': round(seconds, 4), 'mb_per_s': round(size_mb / seconds, 2),
+                    'rss_mb': round(rss_mb, 1)}
+
+        results = {name: result(*run()) for name, run in cases.items()}
+        # Timings on a shared machine come in bursts: a case only counts as slower if
+        # a second measurement confirms it, keeping the better of the two
+        for name, run in cases.items():
+            base = (baseline or {}).get('cases', {}).get(name)
+            if base and is_slower(results[name], base, args.threshold):
+                retry = result(*run())
+                if retry['seconds'] < results[name]['seconds']:
+                    results[name] = dict(retry, rss_mb=max(retry['rss_mb'],
+                                                           results[name]['rss_mb']))
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    regressions = print_suite(results, baseline and baseline['cases'], args)
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({'tree': None if args.tree else tree_params(args), 'tree_bytes': size,
+                       'python': sys.version.split()[0], 'machine': platform.machine(),
+                       'cpus': os.cpu_count(), 'cases': results}, f, indent=2)
+            f.write('\n')
+        print(f"\nBaseline saved -> {args.baseline}")
+    elif baseline is None:
+        print(f"\nNo baseline at {args.baseline} (record one with --save-baseline)")
+    elif regressions:
+        print(f"\n{regressions} case(s) regressed beyond the thresholds "
+              f"(throughput -{args.threshold:.0%}, RSS +{args.rss_threshold:.0%})")
+        sys.exit(1)
+
+
+def print_suite(results: dict, baseline: dict, args) -> int:
+    """Print the suite table against the baseline, return the number of regressions."""
+    print(f"{'Case':<24} {'Seconds':>8} {'MB/s':>9} {'RSS MB':>8} "
+          f"{'Base MB/s':>10} {'Change':>8} {'Base RSS':>9}  Status")
+    print("-" * 92)
+    regressions = 0
+    for name, r in results.items():
+        base = (baseline or {}).get(name)
+        if base is None:
+            status, base_cols = ('new' if baseline else ''), f"{'':>10} {'':>8} {'':>9}"
+        else:
+            change = r['mb_per_s'] / base['mb_per_s'] - 1
+            slower = is_slower(r, base, args.threshold)
+            heavier = is_heavier(r, base, args.rss_threshold)
+            status = ' '.join(flag for flag, bad in (('SLOWER', slower), ('RSS', heavier))
+                              if bad) or 'ok'
+            regressions += slower or heavier
+            base_cols = f"{base['mb_per_s']:>10.1f} {change:>+8.0%} {base['rss_mb']:>9.1f}"
+        print(f"{name:<24} {r['seconds']:>8.3f} {r['mb_per_s']:>9.1f} {r['rss_mb']:>8.1f} "
+              f"{base_cols}  {status}".rstrip())
+    return regressions
+
+
+# === Served Queries ===
+
+# Questions asked repeatedly while debugging, timed in a fresh process each
+SERVE_QUERIES = [
+    ['summary', '-c'], ['errors', '-c'], ['timeline', '-c', '-n', '20'],
+    ['tools', '-r', '5'], ['permissions', '-r', '5'], ['all', '-r', '5'], ['tools'], ['all'],
+]
+
+
+def run_serve(args):
+    """Time each query run locally (warm index) and answered by a serve process."""
+    work = Path(tempfile.mkdtemp(prefix='session-inspector-bench-'))
+    env = dict(os.environ, HOME=str(work), PYTHONHASHSEED='0')
+    inspector = [sys.executable, str(INSPECTOR)]
+    sock = work / 'serve.sock'
+    try:
+        tree = args.tree or work / 'projects'
+        if not tree.exists():
+            gen.generate_tree(tree, args.size, args.projects, args.sessions)
+        print(f"Tree: {tree_bytes(tree) / (1 << 20):.1f} MB")
+        print()
+        common = ['--path', str(tree), '--index', str(work / 'index.db'), '--socket', str(sock)]
+        run_child(inspector + ['reindex'] + common, env)
+        run_child(inspector + ['serve', '--detach', '--socket', str(sock)], env)
+
+        startup = min(run_child([sys.executable, '-c', 'pass'], env)[0]
+                      for _ in range(args.repeat))
+        print(f"{'Query':<24} {'Local s':>9} {'Served s':>9} {'Speedup':>8}")
+        print("-" * 54)
+        for query in SERVE_QUERIES:
+            run_child(inspector + query + common, env)  # Loads the sessions into the server
+            local = min(run_child(inspector + query + common + ['--no-server'], env)[0]
+                        for _ in range(args.repeat))
+            served = min(run_child(inspector + query + common, env)[0]
+                         for _ in range(args.repeat))
+            print(f"{' '.join(query):<24} {local:>9.3f} {served:>9.3f} {local / served:>7.1f}x")
+        print(f"{'(interpreter startup)':<24} {startup:>9.3f}")
+    finally:
+        subprocess.run(inspector + ['serve', '--stop', '--socket', str(sock)], env=env,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        shutil.rmtree(work, ignore_errors=True)
+
+
+# === Startup Budget ===
+
+# `summary -c` from process start to exit, warm index and filesystem
+STARTUP_BUDGET = 0.08
+# Runs this short are noisy: at least this many per case, the best is kept
+STARTUP_MIN_RUNS = 10
+
+
+def run_startup(args) -> int:
+    """Time `summary -c` cold-started against the budget; returns the exit status."""
+    work = Path(tempfile.mkdtemp(prefix='session-inspector-bench-'))
+    env = dict(os.environ, HOME=str(work), PYTHONHASHSEED='0',
+               PYTHONPATH=str(INSPECTOR.parent))
+    # The budget counts on cached bytecode and on -c finding the newest session itself
+    for name in ('PYTHONDONTWRITEBYTECODE', 'CLAUDE_PROJECT_DIR'):
+        env.pop(name, None)
+    runs = max(args.repeat, STARTUP_MIN_RUNS)
+    try:
+        tree = args.tree or work / 'projects'
+        if not tree.exists():
+            gen.generate_tree(tree, args.size, args.projects, args.sessions)
+        sessions = list(tree.glob('*/*.jsonl'))
+        newest = max(sessions, key=lambda path: path.stat().st_mtime)
+        print(f"Tree: {tree_bytes(tree) / (1 << 20):.1f} MB, {len(sessions)} sessions")
+        print()
+
+        inspector = [sys.executable, str(INSPECTOR)]
+        common = ['--path', str(tree)]
+        # Any path whose '/' become '-' names the project directory
+        project_env = dict(env, CLAUDE_PROJECT_DIR=newest.parent.name.replace('-', '/'))
+        cases = [
+            ('python -c pass', [sys.executable, '-c', 'pass'], env, False),
+            ('import session_inspector_core',
+             [sys.executable, '-c', 'import session_inspector_core'], env, False),
+            ('summary -c', inspector + ['summary', '-c'] + common, env, True),
+            ('summary -c ($CLAUDE_PROJECT_DIR)',
+             inspector + ['summary', '-c'] + common, project_env, True),
+            ('summary --transcript FILE',
+             inspector + ['summary', '--transcript', str(newest)], env, True),
+        ]
+
+        over = []
+        print(f"{'Case':<34} {'Best s':>8} {'Budget s':>9}")
+        print("-" * 53)
+        for label, command, case_env, budgeted in cases:
+            run_child(command, case_env)  # Warms the index, bytecode and page cache
+            best = min(run_child(command, case_env)[0] for _ in range(runs))
+            if not budgeted:
+                print(f"{label:<34} {best:>8.3f}")
+                continue
+            verdict = 'ok' if best <= args.budget else 'OVER'
+            print(f"{label:<34} {best:>8.3f} {args.budget:>9.3f}  {verdict}")
+            if best > args.budget:
+                over.append(label)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    print()
+    if over:
+        print(f"Over the {args.budget * 1000:.0f} ms startup budget: {', '.join(over)}")
+        return 1
+    print(f"Every run within the {args.budget * 1000:.0f} ms startup budget")
+    return 0
+
+
+# === Measurements ===
+
+def measure(session_file: Path, kinds: int, decoder: str, repeat: int) -> dict:
+    """Best-of-N read of the session, feeding entries to a scanner."""
+    si.set_json_decoder(decoder)
+    best = None
+    for _ in range(repeat):
+        reader = si.SessionReader(session_file, kinds=kinds)
+        scanner = si.SessionScanner()
+        start = time.perf_counter()
+        for entry in reader:
+            scanner.feed(entry)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best['seconds']:
+            best = {'seconds': elapsed, 'lines': reader.lines, 'decoded': reader.decoded,
+                    'tool_calls': len(scanner.data['tool_calls'])}
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Session Inspector ingestion benchmark')
+    parser.add_argument('--turns', type=int, default=3000,
+                        help='Turns in the synthetic session (default: 3000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case, best is kept')
+    parser.add_argument('--keep', type=Path, help='Write the session here and keep it')
+    parser.add_argument('--classify', action='store_true',
+                        help='Benchmark result classification instead of ingestion')
+    parser.add_argument('--corpus', type=int, default=100000,
+                        help='--classify: string results in the corpus (default: 100000)')
+    parser.add_argument('--path', type=Path, default=si.DEFAULT_CLAUDE_PATH,
+                        help='--classify: sessions to take real results from')
+    parser.add_argument('--config-rules', type=int, default=40,
+                        help='--classify: extra synthetic config rules (default: 40)')
+    parser.add_argument('--replay', action='store_true',
+                        help='Benchmark permission ruleset replay instead of ingestion')
+    parser.add_argument('--calls', type=int, default=200000,
+                        help='--replay: synthetic tool calls (default: 200000)')
+    parser.add_argument('--ruleset-rules', type=int, default=2000,
+                        help='--replay: rules in the larger ruleset (default: 2000)')
+    parser.add_argument('--suite', action='store_true',
+                        help='Time every pipeline stage and subcommand on a generated tree, '
+                             'compare with the baseline')
+    parser.add_argument('--tree', type=Path,
+                        help='--suite: sessions tree to use (generated there and kept if missing)')
+    parser.add_argument('--size', type=gen.parse_size, default=gen.parse_size('50MB'),
+                        help='--suite: size of the generated tree (default: 50MB)')
+    parser.add_argument('--projects', type=int, default=3,
+                        help='--suite: projects in the generated tree (default: 3)')
+    parser.add_argument('--sessions', type=int, default=8,
+                        help='--suite: sessions per project (default: 8)')
+    parser.add_argument('--baseline', type=Path, default=BASELINE_PATH,
+                        help=f'--suite: baseline file (default: {BASELINE_PATH})')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='--suite: record this run as the baseline')
+    parser.add_argument('--threshold', type=float, default=THROUGHPUT_THRESHOLD,
+                        help='--suite: fail when throughput drops by more than this share '
+                             f'(default: {THROUGHPUT_THRESHOLD})')
+    parser.add_argument('--rss-threshold', type=float, default=RSS_THRESHOLD,
+                        help='--suite: fail when peak RSS grows by more than this share '
+                             f'(default: {RSS_THRESHOLD})')
+    parser.add_argument('--serve', action='store_true',
+                        help='Compare queries run locally with queries answered by serve '
+                             '(uses --tree/--size/--projects/--sessions)')
+    parser.add_argument('--startup', action='store_true',
+                        help='Time `summary -c` from process start against --budget '
+                             '(uses --tree/--size/--projects/--sessions)')
+    parser.add_argument('--budget', type=float, default=STARTUP_BUDGET, metavar='SECONDS',
+                        help=f'--startup: time allowed per run (default: {STARTUP_BUDGET})')
+    parser.add_argument('--stage', choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument('--index', type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        # Child process of --suite: best time of one stage, as JSON
+        seconds = min(run_stage(args.stage, args.tree, args.index) for _ in range(args.repeat))
+        print(json.dumps({'seconds': seconds}))
+        return
+    if args.suite:
+        run_suite(args)
+        return
+    if args.serve:
+        run_serve(args)
+        return
+    if args.startup:
+        sys.exit(run_startup(args))
+    if args.classify:
+        run_classify(args)
+        return
+    if args.replay:
+        run_replay(args)
+        return
+
+    if args.keep:
+        session_file = args.keep
+    else:
+        fd, name = tempfile.mkstemp(suffix='.jsonl')
+        os.close(fd)
+        session_file = Path(name)
+
+    try:
+        lines = write_synthetic_session(session_file, args.turns)
+        size_mb = session_file.stat().st_size / 1e6
+        print(f"Synthetic session: {lines} lines, {size_mb:.1f} MB")
+        print()
+
+        tool_reports = si.LINE_TOOL_USE | si.LINE_TOOL_RESULT
+        cases = [
+            ('full decode (before)', si.LINE_ALL, 'stdlib'),
+            ('filtered: tool reports', tool_reports, 'stdlib'),
+        ]
+        if si._import_orjson() is not None:
+            cases += [
+                ('full decode, orjson', si.LINE_ALL, 'orjson'),
+                ('filtered, orjson', tool_reports, 'orjson'),
+            ]
+        else:
+            print("orjson not installed: skipping orjson cases")
+            print()
+
+        print(f"{'Case':<28} {'Decoded':>9} {'Seconds':>9} {'Lines/sec':>11} {'Speedup':>8}")
+        print("-" * 69)
+        baseline = None
+        tool_calls = None
+        for label, kinds, decoder in cases:
+            result = measure(session_file, kinds, decoder, args.repeat)
+            rate = result['lines'] / result['seconds']
+            baseline = baseline or rate
+            if tool_calls is None:
+                tool_calls = result['tool_calls']
+            elif result['tool_calls'] != tool_calls:
+                print(f"Error: {label} extracted {result['tool_calls']} tool calls, "
+                      f"expected {tool_calls}", file=sys.stderr)
+                sys.exit(1)
+            print(f"{label:<28} {result['decoded']:>9} {result['seconds']:>9.3f} "
+                  f"{rate:>11,.0f} {rate / baseline:>7.1f}x")
+    finally:
+        if not args.keep:
+            session_file.unlink()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+Synthetic Session Generator - deterministic ~/.claude/projects-style trees.
+
+Writes project directories of session JSONL files with the entry mix of real
+transcripts: user prompts, attachments, thinking and text blocks, tool_use
+entries (some several per message, answered in any order), tool results
+(rejections, DCG blocks and errors included, a few very large), the
+assistant's closing text, hook progress and stop hook summaries, turn
+durations and bookkeeping entries.
+Task calls can write a subagent transcript under <session>/subagents/.
+
+The same options and seed always produce the same bytes. Session sizes vary
+around --size / session count; file mtimes are set to each session's last
+entry, so --recent and --since select the same sessions on every run.
+
+Usage:
+    python generate_sessions.py OUTPUT [--size 100MB] [--projects N] [--sessions N] [--seed N]
+    python generate_sessions.py OUTPUT --size 2GB --parallel 0.3 --large-results 0.05
+    python generate_sessions.py OUTPUT --mix Bash=60,Read=30,Edit=10 --reject-rate 0.1
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Tool mix (relative weights) and per-call outcome rates
+DEFAULT_MIX = {'Bash': 38, 'Read': 25, 'Edit': 12, 'Grep': 8, 'Write': 4, 'WebFetch': 3,
+               'Task': 3, 'mcp__github__search_code': 7}
+REJECT_RATE = 0.03
+DCG_RATE = 0.02
+ERROR_RATE = 0.08
+
+# Share of tool-calling messages with several tool_use blocks, of results that
+# are large (and their size), and of Task calls that write a subagent transcript
+PARALLEL_RATE = 0.25
+LARGE_RESULT_RATE = 0.02
+LARGE_RESULT_BYTES = 256 * 1024
+SUBAGENT_RATE = 0.5
+
+# Share of turns that end on an assistant text after the last tool results
+# (the others end on a tool result, as when the user interrupts)
+CLOSING_TEXT_RATE = 0.9
+
+# Sessions start this many hours apart (with jitter), from this date
+SESSION_START = datetime(2026, 1, 5, 9, 0, tzinfo=timezone.utc)
+SESSION_SPACING_HOURS = 7
+
+BASH_COMMANDS = [
+    'git status', 'cd src && npm test', 'FOO=1 pytest -q', 'ls -la',
+    'python build.py | tee build.log', 'rm -rf dist', 'git diff --stat',
+    'npm run lint -- --fix', 'timeout 60 cargo test', 'grep -rn TODO src | head -20',
+    'docker compose up -d', 'make -j8 && ./bin/check',
+]
+FETCH_HOSTS = ['docs.python.org', 'developer.mozilla.org', 'github.com', 'docs.rs']
+VERSION = '2.1.3'
+
+_TEXT = 'lorem ipsum dolor sit amet consectetur adipiscing elit ' * 64
+
+
+def text(n: int) -> str:
+    """n characters of filler text."""
+    if n <= len(_TEXT):
+        return _TEXT[:n]
+    return (_TEXT * (n // len(_TEXT) + 1))[:n]
+
+
+def parse_size(value: str) -> int:
+    """Bytes of a size like 500KB, 100MB or 2GB (a bare number is bytes)."""
+    m = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMG]?)B?\s*', value, re.I)
+    if m is None:
+        raise argparse.ArgumentTypeError(f"invalid size: {value!r} (e.g. 500KB, 100MB, 2GB)")
+    return int(float(m.group(1)) * 1024 ** ' KMG'.index(m.group(2).upper() or ' '))
+
+
+def parse_mix(value: str) -> dict:
+    """Tool weights from 'Bash=60,Read=30,...'."""
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        try:
+            mix[name.strip()] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid mix entry: {part!r} (e.g. Bash=60)")
+    return mix
+
+
+def default_options() -> dict:
+    """Generator options with their defaults (see the command line flags)."""
+    return {'mix': dict(DEFAULT_MIX), 'reject_rate': REJECT_RATE, 'dcg_rate': DCG_RATE,
+            'error_rate': ERROR_RATE, 'parallel': PARALLEL_RATE,
+            'large_results': LARGE_RESULT_RATE, 'large_result_bytes': LARGE_RESULT_BYTES,
+            'subagents': SUBAGENT_RATE}
+
+
+# === Sessions ===
+
+class SessionWriter:
+    """Writes the entries of one session file, keeping its clock and byte count.
+
+    Subagent transcripts written for Task calls are counted in `bytes` too.
+    """
+
+    def __init__(self, path: Path, rnd: random.Random, options: dict, session_id: str,
+                 cwd: str, start: datetime, agent_id: str = None):
+        self.path = path
+        self.rnd = rnd
+        self.options = options
+        self.session_id = session_id
+        self.cwd = cwd
+        self.t = start
+        self.agent_id = agent_id
+        self.parent = None
+        self.bytes = self.lines = self.tool_calls = self.subagents = 0
+        self.tools = list(options['mix'])
+        self.weights = list(options['mix'].values())
+        self.f = open(path, 'w', encoding='utf-8')
+
+    def close(self):
+        self.f.close()
+        mtime = self.t.timestamp()
+        os.utime(self.path, (mtime, mtime))
+
+    def ts(self) -> str:
+        return self.t.strftime('%Y-%m-%dT%H:%M:%S.') + f"{self.t.microsecond // 1000:03d}Z"
+
+    def tick(self, low_ms: int, high_ms: int):
+        self.t += timedelta(milliseconds=self.rnd.randint(low_ms, high_ms))
+
+    def uid(self) -> str:
+        return uuid_from(self.rnd)
+
+    def write(self, entry: dict) -> str:
+        """Write an entry with the common transcript fields, return its uuid."""
+        uuid = entry.setdefault('uuid', self.uid())
+        entry.update(parentUuid=self.parent, isSidechain=self.agent_id is not None,
+                     userType='external', cwd=self.cwd, sessionId=self.session_id,
+                     version=VERSION, timestamp=entry.get('timestamp') or self.ts())
+        if self.agent_id:
+            entry['agentId'] = self.agent_id
+        line = json.dumps(entry, separators=(',', ':'), ensure_ascii=False) + '\n'
+        self.f.write(line)
+        self.bytes += len(line)
+        self.lines += 1
+        self.parent = uuid
+        return uuid
+
+    def turn(self, number: int):
+        """One turn: prompt, thinking and text, tool calls, closing text, stop hook and duration."""
+        rnd = self.rnd
+        turn_start = self.t
+        self.write({'type': 'user', 'message': {
+            'role': 'user', 'content': f"Task {number}: " + text(rnd.randint(50, 1500))}})
+        if self.agent_id is None:
+            for _ in range(rnd.randint(0, 3)):
+                self.write({'type': 'attachment', 'attachment': {
+                    'type': 'environment', 'text': text(rnd.randint(300, 3000))}})
+            self.write({'type': 'queue-operation', 'operation': 'dequeue'})
+
+        for step in range(rnd.choice([1, 1, 2, 3])):
+            message_id = 'msg_' + self.uid()[:24]
+            usage = {'input_tokens': rnd.randint(2, 50), 'output_tokens': rnd.randint(50, 2000),
+                     'cache_read_input_tokens': 20000 + 350 * (number + step),
+                     'cache_creation_input_tokens': rnd.randint(200, 3000)}
+            self.tick(1000, 6000)
+            if step == 0:
+                self.write({'type': 'assistant', 'message': {
+                    'id': message_id, 'role': 'assistant', 'usage': usage,
+                    'content': [{'type': 'thinking', 'thinking': text(rnd.randint(500, 6000)),
+                                 'signature': 'S' * 400}]}})
+            self.write({'type': 'assistant', 'message': {
+                'id': message_id, 'role': 'assistant', 'usage': usage,
+                'content': [{'type': 'text', 'text': text(rnd.randint(100, 2000))}]}})
+            parallel = rnd.random() < self.options['parallel']
+            self.tool_calls_step(message_id, usage, rnd.randint(2, 5) if parallel else 1)
+
+        if rnd.random() < CLOSING_TEXT_RATE:
+            self.tick(1000, 6000)
+            usage = {'input_tokens': rnd.randint(2, 50), 'output_tokens': rnd.randint(50, 800),
+                     'cache_read_input_tokens': 20000 + 350 * (number + step + 1),
+                     'cache_creation_input_tokens': rnd.randint(200, 3000)}
+            self.write({'type': 'assistant', 'message': {
+                'id': 'msg_' + self.uid()[:24], 'role': 'assistant', 'usage': usage,
+                'content': [{'type': 'text', 'text': text(rnd.randint(100, 1500))}]}})
+        self.tick(200, 1500)
+        errors = ['Hook exited with code 1'] if rnd.random() < 0.02 else []
+        self.write({'type': 'system', 'subtype': 'stop_hook_summary', 'hookCount': 1,
+                    'hookErrors': errors, 'preventedContinuation': False,
+                    'hookInfos': [{'command': 'node fleet-deck-status.js Stop'}]})
+        self.write({'type': 'system', 'subtype': 'turn_duration',
+                    'durationMs': int((self.t - turn_start).total_seconds() * 1000)})
+        if self.agent_id is None and rnd.random() < 0.3:
+            self.write({'type': 'file-history-snapshot', 'messageId': self.uid(),
+                        'snapshot': {'trackedFileBackups': {}, 'timestamp': self.ts()}})
+        self.tick(5000, 90000)
+
+    def tool_calls_step(self, message_id: str, usage: dict, count: int):
+        """`count` tool_use entries of one message, then their results in any order."""
+        rnd = self.rnd
+        calls = []
+        for _ in range(count):
+            name = rnd.choices(self.tools, self.weights)[0]
+            if name == 'Task' and self.agent_id is not None:
+                name = 'Read'  # Subagents do not start subagents
+            tool_id = 'toolu_' + self.uid().replace('-', '')[:24]
+            tool_input = self.tool_input(name)
+            uuid = self.write({'type': 'assistant', 'message': {
+                'id': message_id, 'role': 'assistant', 'usage': usage,
+                'content': [{'type': 'tool_use', 'id': tool_id, 'name': name,
+                             'input': tool_input}]}})
+            self.write({'type': 'progress', 'toolUseID': tool_id, 'data': {
+                'type': 'hook_progress', 'hookEvent': 'PreToolUse', 'hookName': 'PreToolUse:*'}})
+            calls.append((name, tool_id, tool_input, uuid))
+            self.tool_calls += 1
+        rnd.shuffle(calls)
+        for name, tool_id, tool_input, uuid in calls:
+            self.tick(50, 8000 if name != 'Task' else 60000)
+            result, content, is_error = self.tool_result(name, tool_input, uuid)
+            block = {'tool_use_id': tool_id, 'type': 'tool_result', 'content': content}
+            if is_error:
+                block['is_error'] = True
+            self.write({'type': 'user', 'message': {'role': 'user', 'content': [block]},
+                        'toolUseResult': result, 'sourceToolAssistantUUID': uuid})
+
+    def tool_input(self, name: str) -> dict:
+        rnd = self.rnd
+        path = f"{self.cwd}/src/module_{rnd.randint(0, 80)}.py"
+        if name == 'Bash':
+            return {'command': rnd.choice(BASH_COMMANDS), 'description': 'Run command'}
+        if name == 'Read':
+            return {'file_path': path}
+        if name == 'Edit':
+            return {'file_path': path, 'old_string': text(rnd.randint(100, 3000)),
+                    'new_string': text(rnd.randint(100, 3000))}
+        if name == 'Write':
+            return {'file_path': path, 'content': text(rnd.randint(500, 8000))}
+        if name == 'Grep':
+            return {'pattern': rnd.choice(['TODO', 'def main', 'import json']), 'path': self.cwd}
+        if name == 'WebFetch':
+            return {'url': f"https://{rnd.choice(FETCH_HOSTS)}/page/{rnd.randint(0, 99)}",
+                    'prompt': 'Summarize the page'}
+        if name == 'Task':
+            return {'description': 'Explore code', 'prompt': text(rnd.randint(200, 1500)),
+                    'subagent_type': 'Explore'}
+        return {'query': text(rnd.randint(10, 60))}
+
+    def tool_result(self, name: str, tool_input: dict, uuid: str) -> tuple:
+        """(toolUseResult, tool_result content, is_error) of a call."""
+        rnd = self.rnd
+        r = rnd.random()
+        options = self.options
+        if r < options['reject_rate']:
+            return 'User rejected tool use', 'User rejected tool use', True
+        r -= options['reject_rate']
+        if name == 'Bash' and r < options['dcg_rate']:
+            blocked = f"Error: BLOCKED by dcg: destructive command ({tool_input['command']})"
+            return blocked, blocked, True
+        r -= options['dcg_rate']
+        if r < options['error_rate'] and name in ('Bash', 'Read', 'Edit', 'WebFetch'):
+            error = {'Bash': 'Error: Exit code 1\n' + text(rnd.randint(50, 2000)),
+                     'Read': 'Error: File does not exist.',
+                     'Edit': 'Error: String to replace not found in file.',
+                     'WebFetch': 'Error: Request failed with status code 404'}[name]
+            return error, error, True
+
+        size = (options['large_result_bytes'] if rnd.random() < options['large_results']
+                else rnd.randint(100, 8000))
+        if name == 'Bash':
+            output = text(size)
+            return {'stdout': output, 'stderr': '', 'interrupted': False}, output, False
+        if name == 'Read':
+            content = text(size)
+            return ({'type': 'text', 'file': {'filePath': tool_input['file_path'],
+                                              'content': content, 'numLines': size // 40,
+                                              'startLine': 1, 'totalLines': size // 40}},
+                    content, False)
+        if name == 'Edit':
+            return ({'filePath': tool_input['file_path'], 'oldString': tool_input['old_string'],
+                     'newString': tool_input['new_string'], 'structuredPatch': []},
+                    f"The file {tool_input['file_path']} has been updated.", False)
+        if name == 'Write':
+            return ({'type': 'create', 'filePath': tool_input['file_path'],
+                     'content': tool_input['content']},
+                    f"File created successfully at: {tool_input['file_path']}", False)
+        if name == 'Grep':
+            output = text(min(size, 4000))
+            return {'mode': 'content', 'numFiles': 3, 'filenames': [], 'content': output}, \
+                output, False
+        if name == 'WebFetch':
+            output = text(size)
+            return ({'bytes': size * 3, 'code': 200, 'codeText': 'OK', 'result': output,
+                     'url': tool_input['url']}, output, False)
+        if name == 'Task':
+            agent_id = self.uid()[:8]
+            if rnd.random() < options['subagents']:
+                self.write_subagent(agent_id)
+            output = text(rnd.randint(300, 3000))
+            return ({'status': 'completed', 'agentId': agent_id, 'prompt': tool_input['prompt'],
+                     'content': [{'type': 'text', 'text': output}]}, output, False)
+        output = text(size)
+        return [{'type': 'text', 'text': output}], output, False
+
+    def write_subagent(self, agent_id: str):
+        """A subagent transcript under <session>/subagents/, as Task calls leave them."""
+        directory = self.path.parent / self.session_id / 'subagents'
+        directory.mkdir(parents=True, exist_ok=True)
+        agent = SessionWriter(directory / f"agent-{agent_id}.jsonl", self.rnd, self.options,
+                              self.session_id, self.cwd, self.t, agent_id)
+        for number in range(self.rnd.randint(1, 4)):
+            agent.turn(number)
+        agent.close()
+        self.bytes += agent.bytes
+        self.subagents += 1
+
+
+def uuid_from(rnd: random.Random) -> str:
+    h = f"{rnd.getrandbits(128):032x}"
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+
+def write_session(path: Path, rnd: random.Random, options: dict = None, turns: int = None,
+                  target_bytes: int = None, start: datetime = SESSION_START,
+                  cwd: str = '/home/dev/project') -> dict:
+    """Write one session of `turns` turns, or until it holds `target_bytes`; return stats."""
+    session_id = path.stem
+    writer = SessionWriter(path, rnd, options or default_options(), session_id, cwd, start)
+    number = 0
+    while (number < turns) if turns is not None else (writer.bytes < target_bytes):
+        writer.turn(number)
+        number += 1
+    writer.close()
+    return {'turns': number, 'lines': writer.lines, 'bytes': writer.bytes,
+            'tool_calls': writer.tool_calls, 'subagents': writer.subagents}
+
+
+# === Trees ===
+
+def generate_tree(output: Path, size: int, projects: int, sessions: int, seed: int = 1,
+                  options: dict = None) -> dict:
+    """Write `projects` x `sessions` sessions of about `size` bytes in total; return stats.
+
+    Session sizes are spread around the mean (a few long sessions, many
+    short ones), each session drawn from its own seeded generator.
+    """
+    options = options or default_options()
+    rnd = random.Random(f"{seed}:tree")
+    weights = [rnd.lognormvariate(0, 0.8) for _ in range(projects * sessions)]
+    total_weight = sum(weights)
+    stats = {'projects': projects, 'sessions': 0, 'subagents': 0, 'lines': 0, 'bytes': 0,
+             'tool_calls': 0}
+    for p in range(projects):
+        cwd = f"/home/dev/project-{p}"
+        project_dir = output / cwd.replace('/', '-')
+        project_dir.mkdir(parents=True, exist_ok=True)
+        for s in range(sessions):
+            i = p * sessions + s
+            session_rnd = random.Random(f"{seed}:{p}:{s}")
+            start = SESSION_START + timedelta(
+                hours=SESSION_SPACING_HOURS * i, minutes=session_rnd.randint(0, 300))
+            path = project_dir / f"{uuid_from(session_rnd)}.jsonl"
+            result = write_session(path, session_rnd, options,
+                                   target_bytes=max(1, int(size * weights[i] / total_weight)),
+                                   start=start, cwd=cwd)
+            stats['sessions'] += 1
+            for key in ('subagents', 'lines', 'bytes', 'tool_calls'):
+                stats[key] += result[key]
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Write a deterministic synthetic ~/.claude/projects tree')
+    parser.add_argument('output', type=Path, help='Directory to create (must be empty)')
+    parser.add_argument('--size', type=parse_size, default=parse_size('10MB'),
+                        help='Total size, e.g. 1MB, 500MB, 2GB (default: 10MB)')
+    parser.add_argument('--projects', type=int, default=3, help='Projects (default: 3)')
+    parser.add_argument('--sessions', type=int, default=4,
+                        help='Sessions per project (default: 4)')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+    parser.add_argument('--mix', type=parse_mix,
+                        help='Tool weights, e.g. Bash=60,Read=30,Edit=10 (default: '
+                             + ','.join(f"{k}={v}" for k, v in DEFAULT_MIX.items()) + ')')
+    parser.add_argument('--reject-rate', type=float, default=REJECT_RATE,
+                        help=f'Share of calls the user rejects (default: {REJECT_RATE})')
+    parser.add_argument('--dcg-rate', type=float, default=DCG_RATE,
+                        help=f'Share of Bash calls DCG blocks (default: {DCG_RATE})')
+    parser.add_argument('--error-rate', type=float, default=ERROR_RATE,
+                        help=f'Share of calls that fail (default: {ERROR_RATE})')
+    parser.add_argument('--parallel', type=float, default=PARALLEL_RATE,
+                        help='Share of messages with several tool_use blocks '
+                             f'(default: {PARALLEL_RATE})')
+    parser.add_argument('--large-results', type=float, default=LARGE_RESULT_RATE,
+                        help=f'Share of large tool results (default: {LARGE_RESULT_RATE})')
+    parser.add_argument('--large-result-size', type=parse_size, default=LARGE_RESULT_BYTES,
+                        help='Size of a large tool result (default: 256KB)')
+    parser.add_argument('--subagents', type=float, default=SUBAGENT_RATE,
+                        help='Share of Task calls that write a subagent transcript '
+                             f'(default: {SUBAGENT_RATE})')
+    args = parser.parse_args()
+
+    if args.output.exists() and any(args.output.iterdir()):
+        print(f"Error: {args.output} is not empty", file=sys.stderr)
+        sys.exit(1)
+    options = {'mix': args.mix or dict(DEFAULT_MIX), 'reject_rate': args.reject_rate,
+               'dcg_rate': args.dcg_rate, 'error_rate': args.error_rate,
+               'parallel': args.parallel, 'large_results': args.large_results,
+               'large_result_bytes': args.large_result_size, 'subagents': args.subagents}
+    stats = generate_tree(args.output, args.size, args.projects, args.sessions,
+                          args.seed, options)
+    print(f"Wrote {stats['sessions']} sessions ({stats['subagents']} subagent transcripts) "
+          f"in {stats['projects']} projects: {stats['bytes'] / (1 << 20):.1f} MB, "
+          f"{stats['lines']:,} lines, {stats['tool_calls']:,} tool calls -> {args.output}")
+
+
+if __name__ == '__main__':
+    main()
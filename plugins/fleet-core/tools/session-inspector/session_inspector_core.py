@@ -0,0 +1,5787 @@
+#!/usr/bin/env python3
+"""
+Session Inspector implementation. Run it through session_inspector.py (see there for usage).
+
+Kept separate from the entry script so its bytecode is cached between runs; heavy
+modules (multiprocessing, socket, signal, orjson) are imported only where they are used.
+"""
+
+import argparse
+import bisect
+import contextlib
+import functools
+import hashlib
+import heapq
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from collections import defaultdict, Counter, OrderedDict
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from urllib.parse import urlsplit
+
+try:
+    import resource  # Peak RSS for --profile (not on Windows)
+except ImportError:
+    resource = None
+
+
+# === Configuration ===
+
+DEFAULT_CLAUDE_PATH = Path(os.path.expanduser('~')) / '.claude' / 'projects'
+DEFAULT_INDEX_PATH = Path(os.path.expanduser('~')) / '.claude' / 'session-inspector' / 'index.db'
+
+# Characters of tool input / string results kept per tool call
+PREVIEW_CHARS = 500
+
+# Lines read from the top of a session to find its start time
+SESSION_START_LINES = 20
+
+# --since/--until bisection: below this range size, scan lines instead of probing.
+# --current --last N: first window read from the end of the file (doubled as needed)
+BISECT_MIN_BYTES = 64 * 1024
+TAIL_READ_BYTES = 256 * 1024
+
+# Poll interval and read size for --follow
+FOLLOW_INTERVAL = 1.0
+FOLLOW_READ_BYTES = 1 << 20
+
+# Latency histogram bucket upper bounds (ms), default length of "slowest" lists
+LATENCY_BUCKETS_MS = [100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 300000]
+SLOWEST_ROWS = 10
+
+# Cache efficiency: a call that creates more cache than it reads, and at least
+# this many tokens, rebuilt the prompt cache; sessions below the hit ratio
+# (with enough calls) are flagged
+CACHE_REBUILD_MIN_TOKENS = 10000
+CACHE_HIT_WARN_RATIO = 0.7
+CACHE_HIT_WARN_MIN_CALLS = 5
+
+# Context report: rows per table, sessions with a printed curve, rows per curve,
+# and the usual bytes-per-token estimate for tool output
+CONTEXT_TOP_ROWS = 15
+CONTEXT_CURVES = 3
+CONTEXT_CURVE_ROWS = 20
+BYTES_PER_TOKEN = 4
+
+# Hooks report: debug log written by fleet-dev's log-hook-input.js (PreToolUse),
+# and the longest tool_use -> log line delay still paired with a tool call
+DEFAULT_HOOK_LOG_PATH = Path(os.path.expanduser('~')) / '.claude' / 'logs'
+HOOK_LOG_MATCH_MS = 30000
+HOOK_LOG_HOOK = 'log-hook-input'
+
+# Search: kinds of indexed text, characters kept per text, default result count
+SEARCH_KINDS = ('user', 'assistant', 'command', 'file', 'error')
+SEARCH_TEXT_CHARS = 10000
+SEARCH_RESULTS = 20
+
+# Bash command analysis: parsed command lines kept per process (they repeat a
+# lot), up to this length (longer ones are one-off scripts)
+BASH_PARSE_CACHE = 8192
+BASH_PARSE_CACHE_CHARS = 4096
+
+# Commands that run the command in their arguments: options taking a value, and
+# positional arguments before the command (timeout DURATION); command -v/-V only
+# looks its argument up and stays a command of its own
+COMMAND_WRAPPERS = {
+    'sudo': ({'-u', '-g', '-h', '-p', '-C', '-D', '-r', '-t', '-U'}, 0),
+    'doas': ({'-u', '-C'}, 0),
+    'env': ({'-u', '-C', '-S'}, 0),
+    'nice': ({'-n'}, 0),
+    'ionice': ({'-c', '-n', '-p'}, 0),
+    'stdbuf': ({'-i', '-o', '-e'}, 0),
+    'nohup': (set(), 0),
+    'time': ({'-f', '-o'}, 0),
+    'command': (set(), 0),
+    'exec': ({'-a'}, 0),
+    'timeout': ({'-s', '-k'}, 1),
+    'xargs': ({'-I', '-L', '-n', '-P', '-d', '-E', '-s', '-a'}, 0),
+}
+
+# Commands that only prepare the shell or test a condition: a command line is
+# keyed by the first command that is not one of these (cd src && npm test -> npm,
+# command -v node && node x.js -> node)
+SETUP_COMMANDS = {'cd', 'pushd', 'popd', 'export', 'set', 'unset', 'source', '.',
+                  'true', ':', 'shopt', 'ulimit', 'umask', '[', '[[', 'test',
+                  'command', 'type', 'which', 'hash'}
+
+# Permission rules: tools that ask before running (read-only tools do not; every
+# MCP tool does), file tools that share Edit(...) rules, and the settings file
+# whose permissions.allow rules count as granted
+PERMISSION_TOOLS = {'Bash', 'Edit', 'Write', 'MultiEdit', 'NotebookEdit', 'WebFetch', 'WebSearch'}
+EDIT_TOOLS = {'Edit', 'Write', 'MultiEdit', 'NotebookEdit'}
+DEFAULT_SETTINGS_PATH = Path(os.path.expanduser('~')) / '.claude' / 'settings.json'
+PERMISSION_RULE_KINDS = ('allow', 'ask', 'deny')
+
+# suggest-rules: prompts a rule must save, fewest path components of an
+# Edit(dir/**) rule, and commands that run their arguments as code: no
+# Bash(python:*), only longer prefixes like Bash(python -m pytest:*) (the
+# COMMAND_WRAPPERS are treated the same)
+SUGGEST_MIN_PROMPTS = 2
+SUGGEST_MIN_PATH_DEPTH = 3
+CODE_RUNNERS = {'bash', 'sh', 'zsh', 'eval', 'source', '.', 'python', 'python3', 'node',
+                'npx', 'perl', 'ruby', 'ssh'}
+
+# Below this many sessions a process pool costs more than it saves
+PARALLEL_MIN_SESSIONS = 4
+
+# serve: socket of the resident process, sessions it keeps in memory (least
+# recently used go first), idle seconds before it exits, and how often it checks
+DEFAULT_SOCKET_PATH = (Path(os.path.expanduser('~')) / '.claude' / 'session-inspector' /
+                       'serve.sock')
+SERVE_CACHE_SESSIONS = 2000
+SERVE_IDLE_TIMEOUT = 4 * 3600
+SERVE_POLL_INTERVAL = 1.0
+SERVE_READ_TIMEOUT = 10.0  # A client that connects but sends nothing
+# Client environment a served command runs with (see current_project_dir)
+SERVE_ENV = ('CLAUDE_PROJECT_DIR',)
+
+# --profile: phases in print order. read/decode/extract split the wall time of
+# parse per line; their CPU time is only known in total (a CPU clock read per
+# line would cost more than the line)
+PROFILE_PHASES = ('discover', 'index-read', 'parse', 'read', 'decode', 'extract',
+                  'index-write', 'aggregate', 'render')
+PROFILE_PARSE_PHASES = ('read', 'decode', 'extract')
+
+# Token counters of message.usage (one record per API message)
+USAGE_FIELDS = ('input_tokens', 'cache_read_input_tokens',
+                'cache_creation_input_tokens', 'output_tokens')
+
+# Line kinds for pre-decode filtering (bit flags, see classify_line)
+LINE_TOOL_USE = 1       # Assistant entries with tool_use blocks
+LINE_TOOL_RESULT = 2    # User entries carrying a toolUseResult
+LINE_SYSTEM = 4         # System entries (hook summaries, turn durations, API errors)
+LINE_OTHER = 8          # Messages, text blocks and everything else
+LINE_ALL = LINE_TOOL_USE | LINE_TOOL_RESULT | LINE_SYSTEM | LINE_OTHER
+
+# Result classification: rules from this file (see load_classify_rules) are
+# tried before the built-in ones, first match wins
+DEFAULT_CLASSIFY_RULES_PATH = (Path(os.path.expanduser('~')) / '.claude' /
+                               'session-inspector' / 'classify.json')
+
+# Result categories the reports count; a rule's named class refines one of them
+RESULT_CATEGORIES = ('success', 'user_rejected', 'dcg_blocked', 'error')
+
+# Built-in rules, in order. Only string results are classified (dict results are
+# tool output); rules without a category classify as error. The regex rules
+# name otherwise generic "Error:" results by their first line.
+CLASSIFY_RULES = [
+    {'class': 'dcg_blocked', 'category': 'dcg_blocked', 'substring': 'BLOCKED by dcg'},
+    {'class': 'user_rejected', 'category': 'user_rejected',
+     'substring': 'User rejected tool use'},
+    {'class': 'user_rejected', 'category': 'user_rejected',
+     'substring': "The user doesn't want to proceed"},
+    {'class': 'exit_code', 'prefix': 'Error: Exit code'},
+    {'class': 'file_not_found', 'prefix': 'Error: File does not exist'},
+    {'class': 'file_not_read', 'prefix': 'Error: File has not been read'},
+    {'class': 'edit_mismatch', 'prefix': 'Error: String to replace not found'},
+    {'class': 'request_failed', 'prefix': 'Error: Request failed'},
+    {'class': 'file_too_large', 'prefix': 'Error: File content'},
+    {'class': 'sibling_error', 'prefix': 'Sibling tool call errored'},
+    {'class': 'timeout', 'prefix': 'Error:',
+     'regex': r'\A[^\n]*?(?i:timed out|timeout|etimedout)'},
+    {'class': 'network', 'prefix': 'Error:',
+     'regex': r'\A[^\n]*?(?:ECONNREFUSED|ECONNRESET|ENOTFOUND|EAI_AGAIN|socket hang up|'
+              r'fetch failed)'},
+    {'class': 'mcp_error', 'prefix': 'Error:', 'regex': r'\A[^\n]*?\bMCP error\b'},
+    {'class': 'error', 'prefix': 'Error:'},
+]
+
+
+# === Session Finding ===
+
+def find_sessions(base_path: Path, session_id: str = None, project: str = None,
+                  current: bool = False, recent: int = None, since: datetime = None,
+                  until: datetime = None, catalog: 'SessionIndex' = None,
+                  project_dir: Path = None) -> list:
+    """Find session file(s) matching criteria, newest first.
+
+    --current/--recent keep only the newest N files in a bounded heap instead of
+    sorting every session. --since/--until keep sessions active in the range:
+    files last written before --since are dropped on mtime alone, and a start
+    time is only read for files written after --until.
+    """
+    since_ns = int(since.timestamp() * 1e9) if since else None
+    until_ns = int(until.timestamp() * 1e9) if until else None
+    if catalog is not None:
+        files = catalog.scan_catalog(base_path, project, session_id, project_dir)
+        start_time = catalog.session_start
+    else:
+        files = _scan_session_files(base_path, project, session_id, project_dir)
+        start_time = session_start
+
+    def candidates():
+        for proj_name, path, mtime_ns in files:
+            if since_ns is not None and mtime_ns < since_ns:
+                continue
+            if until_ns is not None and mtime_ns > until_ns:
+                started = _parse_ts(start_time(path))
+                if started is None or started > until:
+                    continue
+            yield mtime_ns, path, proj_name
+
+    limit = 1 if current else recent
+    if limit:
+        selected = heapq.nlargest(limit, candidates())
+    else:
+        selected = sorted(candidates(), reverse=True)
+    return [(mtime_ns / 1e9, Path(path), proj_name)
+            for mtime_ns, path, proj_name in selected]
+
+
+def _scan_session_files(base_path: Path, project: str = None, session_id: str = None,
+                        project_dir: Path = None):
+    """Yield (project dir, path, mtime_ns) of session files.
+
+    Only files matching the session prefix are stat-ed. Given project_dir,
+    only that project directory is listed.
+    """
+    if project_dir is not None:
+        proj_dirs = [(project_dir.name, str(project_dir))]
+    else:
+        with os.scandir(base_path) as entries:
+            proj_dirs = [(entry.name, entry.path) for entry in entries if entry.is_dir()
+                         and (not project or project.lower() in entry.name.lower())]
+    for proj_name, proj_path in proj_dirs:
+        for name, path in _list_session_files(proj_path):
+            if session_id and not name.startswith(session_id):
+                continue
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                continue  # Removed since the listing
+            yield proj_name, path, mtime_ns
+
+
+def current_project_dir(base_path: Path):
+    """The project directory of $CLAUDE_PROJECT_DIR under base_path, None if unknown.
+
+    Project directories are named after the project path with every character
+    but letters and digits replaced by '-' (/home/me/my.app -> -home-me-my-app).
+    """
+    project_path = os.environ.get('CLAUDE_PROJECT_DIR')
+    if not project_path:
+        return None
+    proj_dir = base_path / re.sub(r'[^A-Za-z0-9]', '-', project_path)
+    return proj_dir if proj_dir.is_dir() else None
+
+
+def transcript_session(path: Path) -> list:
+    """find_sessions() for a session file named directly ([] if it does not exist)."""
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return []
+    path = Path(os.path.abspath(path))
+    return [(mtime_ns / 1e9, path, path.parent.name)]
+
+
+def _list_session_files(proj_path: str) -> list:
+    """(name, path) of the session files in one project directory."""
+    with os.scandir(proj_path) as entries:
+        return [(entry.name, entry.path) for entry in entries
+                if entry.name.endswith('.jsonl') and 'subagent' not in entry.name
+                and entry.is_file()]
+
+
+def session_start(session_file) -> str:
+    """Timestamp of the first timestamped entry ('' if none near the top)."""
+    try:
+        with open(session_file, 'rb') as f:
+            for _, line in zip(range(SESSION_START_LINES), f):
+                try:
+                    entry = _json_loads(line)
+                except ValueError:
+                    continue
+                if isinstance(entry, dict) and entry.get('timestamp'):
+                    return entry['timestamp']
+    except OSError:
+        pass
+    return ''
+
+
+def decode_project_name(encoded: str) -> str:
+    """Convert encoded path back to readable project name."""
+    # d--dev-Projects-fleet-plugins -> fleet-plugins
+    parts = encoded.split('-')
+    # Find last meaningful segment
+    if 'Projects' in parts:
+        idx = parts.index('Projects')
+        return '-'.join(parts[idx + 1:])
+    return encoded
+
+
+# === JSONL Reading ===
+
+def _import_orjson():
+    try:
+        import orjson  # Optional, faster JSON decoding
+    except ImportError:
+        return None
+    return orjson
+
+
+def _auto_json_loads(line):
+    """The 'auto' decoder before its first use: import orjson now and switch to it."""
+    global _json_loads
+    orjson = _import_orjson()
+    _json_loads = orjson.loads if orjson else json.loads
+    return _json_loads(line)
+
+
+_json_loads = _auto_json_loads
+
+
+def set_json_decoder(name: str):
+    """Select the JSON decoder: 'auto' (orjson if installed), 'stdlib' or 'orjson'.
+
+    'auto' imports orjson on the first decode, so runs answered from the index
+    alone never load it.
+    """
+    global _json_loads
+    if name == 'auto':
+        _json_loads = _auto_json_loads
+        return
+    orjson = _import_orjson() if name == 'orjson' else None
+    if name == 'orjson' and orjson is None:
+        print("Warning: orjson not installed, using the stdlib decoder", file=sys.stderr)
+    _json_loads = orjson.loads if orjson else json.loads
+
+
+# Byte probes per line kind: quoted keys/values, which cannot occur unescaped
+# inside JSON string content. A probe may over-report (the line is decoded
+# anyway) but never misses a line of its kind.
+LINE_PROBES = {
+    b'"tool_use"': LINE_TOOL_USE,
+    b'"tool_use_id"': LINE_TOOL_RESULT,  # Near the start of result lines
+    b'"toolUseResult"': LINE_TOOL_RESULT,
+    b'"subtype"': LINE_SYSTEM,
+}
+
+_probe_patterns = {}
+
+
+def classify_line(line: bytes, kinds: int = LINE_ALL) -> int:
+    """Cheap byte-level guess of a raw JSONL line's kind (one LINE_* flag).
+
+    Only probes for the requested kinds run, as one regex search that stops at
+    the first hit; 0 means the line is none of them. Lines matching no probe
+    are LINE_OTHER.
+    """
+    pattern = _probe_patterns.get(kinds)
+    if pattern is None:
+        # Longest first; shared prefixes ('"tool') are factored out by re
+        probes = sorted((p for p, k in LINE_PROBES.items() if k & kinds), key=len, reverse=True)
+        pattern = re.compile(b'|'.join(re.escape(p) for p in probes) or b'(?!)')
+        _probe_patterns[kinds] = pattern
+
+    match = pattern.search(line)
+    if match:
+        return LINE_PROBES[match.group()]
+    return kinds & LINE_OTHER
+
+
+class SessionReader:
+    """Stream decoded entries of a session JSONL file, one line at a time.
+
+    Iterating yields entries starting at byte `offset`; afterwards `offset`
+    points past the last complete line, so an incomplete trailing line (still
+    being written) is picked up by the next reader. Only the current line is
+    held in memory.
+
+    `kinds` restricts decoding to lines of the given LINE_* kinds; other lines
+    are skipped after a cheap byte probe without being decoded. With `end`,
+    reading stops at the first line starting at or after that offset.
+    """
+
+    def __init__(self, session_file: Path, offset: int = 0, kinds: int = LINE_ALL,
+                 end: int = None):
+        self.file = session_file
+        self.offset = offset
+        self.kinds = kinds
+        self.end = end
+        self.lines = 0
+        self.decoded = 0
+        # With --profile: time spent decoding, and the clock after the last decode
+        self.decode_seconds = 0.0
+        self.decoded_at = 0.0
+
+    def __iter__(self):
+        try:
+            f = open(self.file, 'rb')
+        except OSError as e:
+            print(f"Error reading {self.file}: {e}", file=sys.stderr)
+            return
+
+        kinds = self.kinds
+        clock = time.perf_counter if _profiler is not None else None
+        with f:
+            f.seek(self.offset)
+            for line in f:
+                if self.end is not None and self.offset >= self.end:
+                    break
+                self.lines += 1
+                complete = line.endswith(b'\n')
+                if kinds != LINE_ALL and complete and not classify_line(line, kinds):
+                    self.offset += len(line)
+                    continue
+
+                self.decoded += 1
+                if clock:
+                    start = clock()
+                    entry = _decode_line(line)
+                    self.decoded_at = clock()
+                    self.decode_seconds += self.decoded_at - start
+                else:
+                    entry = _decode_line(line)
+                if not complete and entry is None:
+                    break  # Partial last line
+                self.offset += len(line)
+                if entry is not None:
+                    yield entry
+
+
+def _decode_line(line: bytes):
+    """Decode one JSONL line, None if it is not a JSON object."""
+    try:
+        entry = _json_loads(line)
+    except ValueError:
+        # Invalid UTF-8 (or no JSON at all): retry leniently with the stdlib
+        try:
+            entry = json.loads(line.decode('utf-8', errors='replace'))
+        except ValueError:
+            return None
+    return entry if isinstance(entry, dict) else None
+
+
+def _line_timestamp(line: bytes) -> str:
+    entry = _decode_line(line)
+    return entry.get('timestamp', '') if entry is not None else ''
+
+
+def _next_line_start(f, offset: int) -> int:
+    """Offset of the first line starting at or after `offset`."""
+    if offset <= 0:
+        return 0
+    f.seek(offset - 1)
+    f.readline()
+    return f.tell()
+
+
+def seek_timestamp(f, target: str) -> int:
+    """Offset of the first line whose timestamp is >= target (file size if none).
+
+    Entries are appended in time order, so the range is bisected on byte
+    offsets: each probe resyncs to the next line boundary and decodes lines
+    until one carries a timestamp. The last few KB are scanned line by line.
+    """
+    lo, hi = 0, f.seek(0, os.SEEK_END)
+    while hi - lo > BISECT_MIN_BYTES:
+        mid = (lo + hi) // 2
+        pos = _next_line_start(f, mid)
+        ts = ''
+        while pos < hi and not ts:
+            line = f.readline()
+            if not line:
+                break
+            ts = _line_timestamp(line)
+            if not ts:
+                pos = f.tell()
+        if not ts:
+            hi = mid
+        elif ts < target:
+            lo = f.tell()
+        else:
+            hi = pos
+
+    f.seek(lo)
+    while True:
+        pos = f.tell()
+        line = f.readline()
+        if not line:
+            return pos
+        ts = _line_timestamp(line)
+        if ts and ts >= target:
+            return pos
+
+
+# === Extraction ===
+
+class Record:
+    """Fixed-field record: __slots__ storage with dict-style access.
+
+    Sessions hold thousands of tool calls and events, and reports like
+    timeline keep them across sessions. A slotted object takes a fraction of
+    a dict with the same keys, while tc['tool'] style access keeps working.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields[name])
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.as_dict()!r})"
+
+
+class ToolCall(Record):
+    """A tool_use and, once it arrived, its result (payload: size + preview)."""
+
+    __slots__ = ('tool', 'command', 'input', 'tool_id', 'timestamp', 'assistant_uuid',
+                 'file_path', 'result', 'result_class', 'result_kind', 'duration_ms',
+                 'result_bytes')
+
+
+class Event(Record):
+    """One timeline row."""
+
+    __slots__ = ('timestamp', 'event', 'tool', 'detail', 'project')
+
+
+def new_session_data(session_file: Path = None, proj_name: str = '') -> dict:
+    """Empty container for everything extracted from one session."""
+    return {
+        'file': session_file,
+        'project': decode_project_name(proj_name) if proj_name else '',
+        'tool_calls': [],
+        'events': [],
+        'hook_events': [],
+        'hook_runs': Counter(),  # Hook starts by (event, command), see _feed_progress()
+        'turn_durations': [],
+        'turns': [],
+        'open_turn': None,  # Turn in progress, see _start_turn()
+        'usage': [],  # Token usage per API message, see _track_usage()
+        'texts': [],  # Searchable text, only collected with keep_texts
+        'user_messages': 0,
+        'assistant_turns': 0,
+        'first_ts': '',
+        'last_ts': '',
+    }
+
+
+class SessionScanner:
+    """Incremental extractor: feed entries in file order, results collect in `data`.
+
+    All subcommands read from the same session data, whether it was just parsed
+    or restored from the session index. A scanner can resume on restored data,
+    so appended entries still find their pending tool calls.
+
+    Unless `keep_results` is set, tool inputs are reduced to a preview and only
+    string results (errors/rejections) are retained, so memory stays bounded by
+    the number of calls rather than the size of their payloads. `keep_texts`
+    collects message texts, commands, file paths and errors for the search index.
+    """
+
+    def __init__(self, data: dict = None, keep_results: bool = False,
+                 keep_texts: bool = False):
+        self.data = data if data is not None else new_session_data()
+        self.keep_results = keep_results
+        self.keep_texts = keep_texts
+
+        # Pending tool calls by tool_use id and by assistant entry UUID
+        self._pending_by_id = {}
+        self._pending_by_uuid = defaultdict(list)
+        for tc in self.data['tool_calls']:
+            if tc['result_class'] == 'pending':
+                self._track(tc)
+
+        self._usage_by_id = {u['message_id']: u for u in self.data['usage'] if u['message_id']}
+
+    def _track(self, tc: dict):
+        if tc['tool_id']:
+            self._pending_by_id[tc['tool_id']] = tc
+        self._pending_by_uuid[tc['assistant_uuid']].append(tc)
+
+    def _resolve(self, tool_use_id: str, source_uuid: str):
+        """Pop the pending tool call a result belongs to, None if unknown.
+
+        Results name their tool_use id, which pairs parallel calls of one
+        assistant entry correctly. Older transcripts without it fall back to the
+        first pending call of the source assistant entry.
+        """
+        tc = self._pending_by_id.pop(tool_use_id, None) if tool_use_id else None
+        if tc is None:
+            candidates = self._pending_by_uuid.get(source_uuid)
+            if not candidates:
+                return None
+            tc = candidates[0]
+            self._pending_by_id.pop(tc['tool_id'], None)
+        candidates = self._pending_by_uuid[tc['assistant_uuid']]
+        candidates.remove(tc)
+        if not candidates:
+            del self._pending_by_uuid[tc['assistant_uuid']]
+        return tc
+
+    def feed(self, entry: dict):
+        data = self.data
+        ts = entry.get('timestamp', '')
+        if ts:
+            if not data['first_ts'] or ts < data['first_ts']:
+                data['first_ts'] = ts
+            if ts > data['last_ts']:
+                data['last_ts'] = ts
+
+        etype = entry.get('type', '')
+        if etype == 'assistant':
+            data['assistant_turns'] += 1
+            self._feed_assistant(entry, ts)
+        elif etype == 'user':
+            if not entry.get('sourceToolAssistantUUID'):
+                data['user_messages'] += 1
+            self._feed_user(entry, ts)
+        elif etype == 'system':
+            self._feed_system(entry, ts)
+        elif etype == 'progress':
+            self._feed_progress(entry)
+
+        turn = data['open_turn']
+        if turn is not None and ts > turn['last_ts']:
+            turn['last_ts'] = ts
+
+    def _text(self, ts: str, kind: str, text: str):
+        if self.keep_texts and text:
+            self.data['texts'].append({'timestamp': ts, 'kind': kind,
+                                       'text': text[:SEARCH_TEXT_CHARS]})
+
+    def _event(self, ts: str, event: str, tool: str, detail: str):
+        # Event and tool names repeat endlessly: share one string each
+        self.data['events'].append(Event(
+            timestamp=ts, event=sys.intern(event), tool=_intern(tool),
+            detail=detail, project=self.data['project']))
+
+    def _feed_assistant(self, entry: dict, ts: str):
+        msg = entry.get('message', {})
+        content = msg.get('content', [])
+        usage = msg.get('usage')
+        if isinstance(usage, dict):
+            self._track_usage(msg.get('id', ''), usage, ts, content)
+        if not isinstance(content, list):
+            return
+
+        for block in content:
+            if not isinstance(block, dict):
+                continue
+            if block.get('type') == 'tool_use':
+                tool_name = _intern(block.get('name', 'unknown'))
+                tool_input = block.get('input', {})
+
+                # Extract command for Bash, file path for file tools
+                command = None
+                if tool_name == 'Bash':
+                    command = tool_input.get('command', '')
+                file_path = tool_input.get('file_path') if isinstance(tool_input, dict) else None
+
+                if not self.keep_results:
+                    tool_input = str(tool_input)[:PREVIEW_CHARS]
+
+                tc = ToolCall(
+                    tool=tool_name,
+                    command=command,
+                    input=tool_input,
+                    tool_id=block.get('id', ''),
+                    timestamp=ts,
+                    assistant_uuid=entry.get('uuid', ''),
+                    file_path=file_path,
+                    result=None,
+                    result_class='pending',
+                    result_kind=None,
+                    duration_ms=None,
+                    result_bytes=None,
+                )
+                self.data['tool_calls'].append(tc)
+                self._track(tc)
+                self._event(ts, 'tool_call', block.get('name', ''), _tool_detail(block))
+                if isinstance(command, str):
+                    self._text(ts, 'command', command)
+                if isinstance(file_path, str):
+                    self._text(ts, 'file', file_path)
+            elif block.get('type') == 'text':
+                text = block.get('text', '')
+                if text.strip():
+                    self._event(ts, 'assistant_text', '', text[:100].replace('\n', ' '))
+                    self._text(ts, 'assistant', text)
+
+    def _feed_user(self, entry: dict, ts: str):
+        result = entry.get('toolUseResult')
+        source = entry.get('sourceToolAssistantUUID')
+        msg = entry.get('message', {})
+
+        if source and result is not None:
+            rc, kind = classify_result(result)
+
+            block = _tool_result_block(msg)
+            tc = self._resolve(block.get('tool_use_id', '') if block else '', source)
+            if tc is not None:
+                if self.keep_results:
+                    tc['result'] = result
+                elif isinstance(result, str):
+                    tc['result'] = result[:PREVIEW_CHARS]
+                tc['result_class'] = rc
+                tc['result_kind'] = kind
+                tc['duration_ms'] = _duration_ms(tc['timestamp'], ts)
+                # What enters the context is the tool_result block sent to the model
+                tc['result_bytes'] = _result_size(
+                    block['content'] if block and 'content' in block else result)
+
+            self._event(ts, f'tool_result:{rc}', '', _result_preview(result))
+            if rc != 'success' and isinstance(result, str):
+                self._text(ts, 'error', result)
+        elif msg:
+            # User message
+            content = msg.get('content', '')
+            if isinstance(content, list):
+                text = ' '.join(b.get('text', '') for b in content
+                                if isinstance(b, dict) and b.get('type') == 'text')
+            elif isinstance(content, str):
+                text = content
+            else:
+                text = str(content)
+            if text.strip():
+                self._event(ts, 'user_message', '', text[:100].replace('\n', ' '))
+                self._text(ts, 'user', text)
+                if ts:
+                    self._start_turn(ts, text)
+
+    def _feed_system(self, entry: dict, ts: str):
+        subtype = entry.get('subtype', '')
+        if subtype == 'stop_hook_summary':
+            errors = entry.get('hookErrors', [])
+            infos = entry.get('hookInfos', [])
+            prevented = entry.get('preventedContinuation', False)
+            turn = self.data['open_turn']
+            duration = None
+            if turn is not None:
+                # From the entry before the summary (feed() has not moved
+                # last_ts yet): a turn ending on tool results spent that time
+                # in tools, not in hooks
+                duration = _duration_ms(turn['last_ts'], ts)
+                turn['hook_ms'] += duration or 0
+            self.data['hook_events'].append({
+                'subtype': subtype,
+                'hookCount': entry.get('hookCount', 0),
+                'hookErrors': errors,
+                'hookInfos': infos,
+                'preventedContinuation': prevented,
+                'timestamp': ts,
+                'duration_ms': duration,
+            })
+            detail_parts = []
+            if errors:
+                detail_parts.append(f"errors={len(errors)}")
+            if infos:
+                cmds = [i.get('command', '')[:40] for i in infos]
+                detail_parts.append(f"hooks=[{', '.join(cmds)}]")
+            if prevented:
+                detail_parts.append("PREVENTED")
+            self._event(ts, f'hook:{subtype}', '', ' '.join(detail_parts))
+        elif subtype == 'turn_duration':
+            duration = entry.get('durationMs')
+            if duration:
+                self.data['turn_durations'].append(duration)
+                self._event(ts, 'turn_duration', '', f"{duration / 1000:.1f}s")
+                self._close_turn(duration)
+        elif subtype == 'api_error':
+            self._event(ts, 'api_error', '', str(entry.get('message', ''))[:100])
+
+    def _feed_progress(self, entry: dict):
+        # Written when hooks of an event start; nothing marks when they end
+        progress = entry.get('data')
+        if not isinstance(progress, dict) or progress.get('type') != 'hook_progress':
+            return
+        event = progress.get('hookEvent')
+        if not event or not isinstance(event, str) or event == 'Stop':
+            return  # Cannot be attributed, or counted and timed from the stop hook summary
+        command = next((value for value in (progress.get('command'), progress.get('hookName'))
+                        if value and isinstance(value, str)), '(unknown)')
+        self.data['hook_runs'][(sys.intern(event), command)] += 1
+
+    def _track_usage(self, message_id: str, usage: dict, ts: str, content):
+        """Record the token usage of one API message.
+
+        A message is written as one entry per content block, each repeating
+        the message's usage, so entries are merged by message id: the last
+        usage wins (output tokens grow while streaming) and the tool calls of
+        all its entries are collected.
+        """
+        record = self._usage_by_id.get(message_id) if message_id else None
+        if record is None:
+            record = {'message_id': message_id, 'timestamp': ts, 'tools': []}
+            self.data['usage'].append(record)
+            if message_id:
+                self._usage_by_id[message_id] = record
+        for key in USAGE_FIELDS:
+            record[key] = usage.get(key) or 0
+        if isinstance(content, list):
+            record['tools'] += [b.get('name', 'unknown') for b in content
+                                if isinstance(b, dict) and b.get('type') == 'tool_use']
+
+    def trim_usage(self):
+        """Stop merging into usage records but the latest (its blocks may still arrive).
+
+        For --follow, which hands out and drops the data of every poll.
+        """
+        if self.data['usage']:
+            latest = self.data['usage'][-1]
+            self._usage_by_id = {latest['message_id']: latest} if latest['message_id'] else {}
+
+    def _start_turn(self, ts: str, prompt: str):
+        """A user prompt starts a turn; one still open ends at its last entry."""
+        self._close_turn()
+        self.data['open_turn'] = {
+            'start': ts,
+            'last_ts': ts,
+            'hook_ms': 0,
+            'first_call': len(self.data['tool_calls']),
+            'prompt': prompt[:80].replace('\n', ' '),
+        }
+
+    def _close_turn(self, duration_ms: int = None):
+        turn = self.data['open_turn']
+        if turn is None:
+            return
+        self.data['turns'].append(turn_breakdown(turn, self.data['tool_calls'], duration_ms))
+        self.data['open_turn'] = None
+
+
+def turn_breakdown(turn: dict, tool_calls: list, duration_ms: int = None) -> dict:
+    """Split a turn's duration into model, tool, permission and stop-hook time.
+
+    Tool and permission time are the union of the turn's tool call intervals
+    (tool_use to result), so parallel calls are not counted twice; calls the
+    user rejected count as permission time. Hook time runs from the entry
+    before a stop hook summary to the summary. The rest is model time; the
+    parts are capped in that order (tools, permission, hooks) so they never
+    add up to more than the duration. Without a turn_duration entry the turn
+    ends at its last entry.
+    """
+    if duration_ms is None:
+        duration_ms = _duration_ms(turn['start'], turn['last_ts']) or 0
+
+    tool_spans, permission_spans = [], []
+    calls = tool_calls[turn['first_call']:]
+    for tc in calls:
+        start = _parse_ts(tc['timestamp'])
+        if start is None or tc['duration_ms'] is None:
+            continue
+        start_ms = start.timestamp() * 1000
+        spans = permission_spans if tc['result_class'] == 'user_rejected' else tool_spans
+        spans.append((start_ms, start_ms + tc['duration_ms']))
+
+    # Permission time is what rejected calls add to the tool spans
+    tool_ms = min(_union_ms(tool_spans), duration_ms)
+    permission_ms = min(_union_ms(tool_spans + permission_spans) - _union_ms(tool_spans),
+                        duration_ms - tool_ms)
+    hook_ms = min(turn['hook_ms'], duration_ms - tool_ms - permission_ms)
+    return {
+        'start': turn['start'],
+        'duration_ms': duration_ms,
+        'model_ms': duration_ms - tool_ms - permission_ms - hook_ms,
+        'tool_ms': tool_ms,
+        'permission_ms': permission_ms,
+        'hook_ms': hook_ms,
+        'tool_calls': len(calls),
+        'prompt': turn['prompt'],
+    }
+
+
+def _union_ms(spans: list) -> int:
+    """Total length of possibly overlapping (start, end) spans."""
+    total = 0
+    end = None
+    for span_start, span_end in sorted(spans):
+        if end is None or span_start > end:
+            total += span_end - span_start
+            end = span_end
+        elif span_end > end:
+            total += span_end - end
+            end = span_end
+    return round(total)
+
+
+def _tool_result_block(msg):
+    """tool_result content block of a user result entry, None if absent."""
+    content = msg.get('content') if isinstance(msg, dict) else None
+    if isinstance(content, list):
+        for block in content:
+            if isinstance(block, dict) and block.get('type') == 'tool_result':
+                return block
+    return None
+
+
+def _result_size(content) -> int:
+    """Serialized size in bytes of a tool result (text as UTF-8, other blocks as JSON)."""
+    if content is None:
+        return 0
+    if isinstance(content, str):
+        return len(content.encode('utf-8'))
+    if isinstance(content, list):
+        return sum(len(block['text'].encode('utf-8'))
+                   if isinstance(block, dict) and isinstance(block.get('text'), str)
+                   else _result_size(block) for block in content)
+    return len(json.dumps(content, ensure_ascii=False).encode('utf-8'))
+
+
+def extract_tool_calls(entries, keep_results: bool = False) -> list:
+    """Extract all tool calls with their results from an iterable of entries.
+
+    Inputs and results are reduced to a preview (results also to their size,
+    result_bytes) unless `keep_results` asks for the full payloads.
+    """
+    scanner = SessionScanner(keep_results=keep_results)
+    for entry in entries:
+        scanner.feed(entry)
+    return scanner.data['tool_calls']
+
+
+class Classifier:
+    """Ordered result classification rules, compiled for one pass per result.
+
+    First match wins. A single str.startswith(tuple) call tests all prefixes
+    (one anchored alternation then picks the first matching prefix rule): that
+    rule bounds the search, so only substring and regex rules ranked above it
+    are tried, and rules gated by a prefix are skipped outright for results
+    starting with none of them.
+    """
+
+    def __init__(self, rules: list, sources: list = None):
+        self.rules = rules
+        self.sources = sources or [f'built-in #{i + 1}' for i in range(len(rules))]
+        self.fingerprint = hashlib.sha1(
+            json.dumps(rules, sort_keys=True).encode()).hexdigest()[:16]
+        self._outcomes = [(sys.intern(r.get('category', 'error')), sys.intern(r['class']))
+                          for r in rules]
+
+        # One (prefix gate, literal, regex) test per rule, see explain()
+        self._tests = []
+        for rule in rules:
+            flags = re.IGNORECASE if rule.get('ignore_case') else 0
+            gate = rule.get('prefix') if 'substring' in rule or 'regex' in rule else None
+            if 'regex' in rule:
+                self._tests.append((gate, None, re.compile(rule['regex'], flags)))
+            elif 'substring' in rule and not flags:
+                self._tests.append((gate, rule['substring'], None))
+            elif 'substring' in rule:
+                self._tests.append((gate, None, re.compile(re.escape(rule['substring']), flags)))
+            elif flags:
+                self._tests.append((None, None, re.compile(r'\A' + re.escape(rule['prefix']),
+                                                           flags)))
+            else:
+                self._tests.append((None, rule['prefix'], None))  # Plain prefix
+
+        self._prefix_rules = []
+        self._scans = []  # (rule index, gate, literal, regex) of the other rules
+        for i, (gate, literal, rx) in enumerate(self._tests):
+            if literal is not None and 'substring' not in rules[i]:
+                self._prefix_rules.append((i, literal))
+            else:
+                self._scans.append((i, gate, literal, rx))
+        self._prefixes = tuple(prefix for _, prefix in self._prefix_rules)
+        self._starts = self._prefixes + tuple(scan[1] for scan in self._scans if scan[1])
+        # The first alternative to match is the first matching prefix rule
+        self._prefix_rx = re.compile(r'\A(?:' + '|'.join(
+            f'({re.escape(prefix)})' for _, prefix in self._prefix_rules) + ')')
+        self._prefix_index = (None,) + tuple(i for i, _ in self._prefix_rules)
+        # Scans ranked above every prefix rule need no bound: they run first
+        first_prefix = self._prefix_rules[0][0] if self._prefix_rules else len(rules)
+        self._head = [scan for scan in self._scans if scan[0] < first_prefix]
+        self._tail = self._scans[len(self._head):]
+        self._ungated_tail = [scan for scan in self._tail if not scan[1]]
+
+    def match(self, text: str) -> int:
+        """Index of the first rule matching a string, -1 if none does."""
+        i = self._search(self._head, text, len(self.rules))
+        if i >= 0:
+            return i
+        if not text.startswith(self._starts):
+            return self._search(self._ungated_tail, text, len(self.rules))
+        best = len(self.rules)
+        if text.startswith(self._prefixes):
+            best = self._prefix_index[self._prefix_rx.match(text).lastindex]
+        i = self._search(self._tail, text, best)
+        return i if i >= 0 or best == len(self.rules) else best
+
+    @staticmethod
+    def _search(scans: list, text: str, bound: int) -> int:
+        """First scan (ranked above bound) matching the text, -1 if none."""
+        for i, gate, literal, rx in scans:
+            if i >= bound:
+                break
+            if gate and not text.startswith(gate):
+                continue
+            if literal is not None:
+                if literal in text:
+                    return i
+            elif rx.search(text):
+                return i
+        return -1
+
+    def classify(self, result) -> tuple:
+        """(category, class) of a toolUseResult; class is None without a matching rule."""
+        if result is None:
+            return 'pending', None
+        # Dict results = tool output = success
+        if not isinstance(result, str):
+            return 'success', None
+        i = self.match(result)
+        return self._outcomes[i] if i >= 0 else ('success', None)
+
+    def explain(self, text: str) -> list:
+        """Match span of every rule on its own (None: no match), in rule order."""
+        spans = []
+        for rule, (gate, literal, rx) in zip(self.rules, self._tests):
+            span = None
+            if gate and not text.startswith(gate):
+                pass
+            elif rx is not None:
+                m = rx.search(text)
+                span = m.span() if m else None
+            elif 'substring' in rule:
+                start = text.find(literal)
+                span = (start, start + len(literal)) if start >= 0 else None
+            elif text.startswith(literal):
+                span = (0, len(literal))
+            spans.append(span)
+        return spans
+
+
+def load_classify_rules(path: Path = None) -> tuple:
+    """(rules, sources) from a rules file followed by the built-in rules.
+
+    The file holds {"rules": [...], "builtin": true}. A rule has a "class", a
+    "substring", "prefix" or "regex" (a prefix may gate a substring or regex:
+    both must match), and optionally "category" (one of RESULT_CATEGORIES,
+    default error) and "ignore_case" (for the substring/regex, or a lone
+    prefix). Without an explicit path, a missing default file means built-in
+    rules only.
+    """
+    rules, sources = [], []
+    file = path or DEFAULT_CLASSIFY_RULES_PATH
+    if path or file.exists():
+        try:
+            config = json.loads(file.read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            raise ValueError(f"{file}: {e}")
+        if not isinstance(config, dict) or not isinstance(config.get('rules', []), list):
+            raise ValueError(f'{file}: expected {{"rules": [...]}}')
+        for n, rule in enumerate(config.get('rules', []), 1):
+            problem = _rule_problem(rule)
+            if problem:
+                raise ValueError(f"{file}: rule {n}: {problem}")
+            rules.append(rule)
+            sources.append(f"{file.name} #{n}")
+        if not config.get('builtin', True):
+            return rules, sources
+    rules += CLASSIFY_RULES
+    sources += [f'built-in #{n}' for n in range(1, len(CLASSIFY_RULES) + 1)]
+    return rules, sources
+
+
+def _rule_problem(rule) -> str:
+    """Why a classification rule is invalid, or '' if it is fine."""
+    if not isinstance(rule, dict):
+        return 'not an object'
+    if not isinstance(rule.get('class'), str) or not rule['class']:
+        return 'missing "class"'
+    if rule.get('category', 'error') not in RESULT_CATEGORIES:
+        return f"category must be one of {', '.join(RESULT_CATEGORIES)}"
+    for key in ('substring', 'prefix', 'regex'):
+        if key in rule and (not isinstance(rule[key], str) or not rule[key]):
+            return f'"{key}" must be a non-empty string'
+    if 'substring' in rule and 'regex' in rule:
+        return 'use either "substring" or "regex"'
+    if not any(key in rule for key in ('substring', 'prefix', 'regex')):
+        return 'needs a "substring", "prefix" or "regex"'
+    if 'regex' in rule:
+        try:
+            re.compile(rule['regex'])
+        except re.error as e:
+            return f"invalid regex ({e})"
+    return ''
+
+
+_classifier = None
+
+
+def set_classify_rules(path: Path = None):
+    """Load the classification rules (see load_classify_rules) used by classify_result."""
+    global _classifier
+    _classifier = Classifier(*load_classify_rules(path))
+
+
+def get_classifier() -> Classifier:
+    """The active Classifier (the default rules unless set_classify_rules was called)."""
+    if _classifier is None:
+        set_classify_rules()
+    return _classifier
+
+
+def classify_result(result) -> tuple:
+    """Classify a toolUseResult: (category, named class) with the active rules.
+
+    The category is success / user_rejected / dcg_blocked / error (pending for
+    no result); the class names the matching rule (e.g. timeout), or is None.
+
+    IMPORTANT: Only string results indicate errors/rejections.
+    Dict results contain tool output (file content, command output) and are always success.
+    Searching dict content would cause false positives (e.g. file containing 'BLOCKED by dcg').
+    """
+    return (_classifier or get_classifier()).classify(result)
+
+
+# Reserved words skipped at the start of a command; loop headers are dropped whole
+SHELL_KEYWORDS = {'if', 'then', 'else', 'elif', 'fi', 'do', 'done', 'while', 'until',
+                  'esac', '{', '}', '!', 'function'}
+SHELL_HEADERS = {'for', 'select', 'case'}
+
+# Runs of characters without shell meaning, and the operators (longest first)
+_SHELL_PLAIN = re.compile(r"[^\s'\"\\`$|&;()<>]+")
+_SHELL_OPERATOR = re.compile(r'&&|\|\||;;|\|&|&>>?|<<<|<<-?|>>|>&|<&|>\||[|&;()<>\n]')
+_SHELL_REDIRECTS = {'<', '>', '>>', '>&', '<&', '>|', '&>', '&>>', '<<<'}
+_ENV_ASSIGNMENT = re.compile(r'[A-Za-z_][A-Za-z0-9_]*(?:\[[^]]*\])?\+?=')
+
+
+def _shell_tokens(command: str) -> tuple:
+    """(tokens, substitutions) of a shell command line.
+
+    Tokens are ('word', text) with quotes removed, or ('op', operator) for
+    control operators (newlines included). Redirections and their targets,
+    comments and heredoc bodies are dropped. Substitutions are the command
+    lines inside $(...) and backticks, whose words stay as written.
+    """
+    tokens, substitutions, heredocs = [], [], []
+    word, in_word = [], False
+    i, n = 0, len(command)
+
+    def end_word():
+        nonlocal word, in_word
+        if in_word:
+            tokens.append(('word', ''.join(word)))
+        word, in_word = [], False
+
+    while i < n:
+        c = command[i]
+        m = _SHELL_PLAIN.match(command, i)
+        if m and not (c == '#' and not in_word):
+            word.append(m.group())
+            in_word = True
+            i = m.end()
+        elif c == '#':
+            i = command.find('\n', i)
+            i = n if i < 0 else i
+        elif c.isspace() and c != '\n':
+            end_word()  # Any blank, pasted ones (NBSP, form feed) included
+            i += 1
+        elif c == '\\':
+            if command.startswith('\n', i + 1):
+                i += 2  # Line continuation
+                continue
+            word.append(command[i + 1:i + 2])
+            in_word = True
+            i += 2
+        elif c == "'":
+            end = command.find("'", i + 1)
+            end = n if end < 0 else end
+            word.append(command[i + 1:end])
+            in_word = True
+            i = end + 1
+        elif c == '"':
+            i += 1
+            while i < n and command[i] != '"':
+                if command[i] == '\\' and i + 1 < n:
+                    word.append(command[i + 1] if command[i + 1] in '"\\$`\n' else command[i:i + 2])
+                    i += 2
+                elif command.startswith('$(', i) or command[i] == '`':
+                    end = _substitution_end(command, i)
+                    word.append(command[i:end])
+                    substitutions.append(_substitution_body(command[i:end]))
+                    i = end
+                else:
+                    word.append(command[i])
+                    i += 1
+            in_word = True
+            i += 1
+        elif c == '`' or command.startswith('$(', i):
+            end = _substitution_end(command, i)
+            word.append(command[i:end])
+            substitutions.append(_substitution_body(command[i:end]))
+            in_word = True
+            i = end
+        elif c == '$':
+            word.append(c)
+            in_word = True
+            i += 1
+        else:
+            m = _SHELL_OPERATOR.match(command, i)
+            if m is None:
+                word.append(c)  # Nothing the shell would treat specially
+                in_word = True
+                i += 1
+                continue
+            op = m.group()
+            if op[0] in '<>' and in_word and ''.join(word).isdigit():
+                word, in_word = [], False  # File descriptor of a redirection (2>)
+            end_word()
+            i += len(op)
+            if op == '\n' and heredocs:
+                i = _skip_heredocs(command, i, heredocs)
+                heredocs = []
+            if op in _SHELL_REDIRECTS or op.startswith('<<'):
+                # The target (or heredoc delimiter) is the next word
+                target, i = _next_shell_word(command, i)
+                if op.startswith('<<') and op != '<<<':
+                    heredocs.append((target, op == '<<-'))
+            else:
+                tokens.append(('op', op))
+    end_word()
+    return tokens, substitutions
+
+
+def _substitution_end(command: str, i: int) -> int:
+    """Index after the $(...) or `...` starting at i (end of text if unclosed)."""
+    if command[i] == '`':
+        end = command.find('`', i + 1)
+        return len(command) if end < 0 else end + 1
+    depth, i, quote = 0, i + 1, None
+    while i < len(command):
+        c = command[i]
+        if quote:
+            if c == quote:
+                quote = None
+            elif c == '\\' and quote == '"':
+                i += 1
+        elif c in '\'"':
+            quote = c
+        elif c == '\\':
+            i += 1
+        elif c == '(':
+            depth += 1
+        elif c == ')':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return len(command)
+
+
+def _substitution_body(text: str) -> str:
+    if text.startswith('$(('):
+        return ''  # Arithmetic, not a command
+    return text[1:-1] if text.startswith('`') else text[2:-1]
+
+
+def _next_shell_word(command: str, i: int) -> tuple:
+    """(word, index after it) of the word following a redirection operator."""
+    while i < len(command) and command[i].isspace() and command[i] != '\n':
+        i += 1
+    tokens, _ = _shell_tokens(_SHELL_WORD.match(command, i).group())
+    return (tokens[0][1] if tokens and tokens[0][0] == 'word' else '',
+            _SHELL_WORD.match(command, i).end())
+
+
+# One word as written (quoted parts included), for redirection targets
+_SHELL_WORD = re.compile(r"""(?:[^\s'"|&;()<>]|'[^']*'?|"(?:[^"\\]|\\.)*"?)*""")
+
+
+def _skip_heredocs(command: str, i: int, heredocs: list) -> int:
+    """Index after the bodies of the heredocs started on the previous line."""
+    for delimiter, strip_tabs in heredocs:
+        while i < len(command):
+            end = command.find('\n', i)
+            end = len(command) if end < 0 else end
+            line = command[i:end]
+            i = end + 1
+            if (line.lstrip('\t') if strip_tabs else line) == delimiter:
+                break
+    return min(i, len(command))
+
+
+def bash_commands(command: str) -> tuple:
+    """Argument lists of every simple command in a shell command line.
+
+    Splits pipelines, lists (&&, ||, ;, &, newlines), subshells and groups,
+    and adds the commands of $(...) and backtick substitutions. Leading
+    VAR=value assignments, reserved words and wrappers like sudo, timeout
+    or xargs are stripped (sudo -u x systemctl restart y -> systemctl ...).
+    """
+    return _bash_segments(command, True)
+
+
+def shell_segments(command: str) -> tuple:
+    """Words of every simple command in a shell command line, as permission rules see them.
+
+    Split like bash_commands(), but assignments and wrappers are kept
+    (sudo systemctl restart y stays whole); only reserved words are dropped.
+    """
+    return _bash_segments(command, False)
+
+
+def _bash_segments(command: str, unwrap: bool) -> tuple:
+    if len(command) > BASH_PARSE_CACHE_CHARS:
+        return _parse_bash_segments(command, unwrap)
+    return _cached_bash_segments(command, unwrap)
+
+
+def _parse_bash_segments(command: str, unwrap: bool) -> tuple:
+    tokens, substitutions = _shell_tokens(command)
+    commands, argv = [], []
+    for kind, text in tokens + [('op', ';')]:
+        if kind == 'word':
+            argv.append(text)
+            continue
+        argv = _command_argv(argv, unwrap)
+        if argv:
+            commands.append(tuple(argv))
+        argv = []
+    for substitution in substitutions:
+        commands.extend(_bash_segments(substitution, unwrap))
+    return tuple(commands)
+
+
+_cached_bash_segments = functools.lru_cache(maxsize=BASH_PARSE_CACHE)(_parse_bash_segments)
+
+
+def _command_argv(words: list, unwrap: bool = True) -> list:
+    """A simple command's words minus reserved words (and with unwrap, assignments and wrappers)."""
+    i = 0
+    while i < len(words):
+        word = words[i]
+        if word in SHELL_HEADERS:
+            return []
+        if word in SHELL_KEYWORDS or (unwrap and _ENV_ASSIGNMENT.match(word)):
+            i += 1
+        elif unwrap and os.path.basename(word) in COMMAND_WRAPPERS:
+            name, start = os.path.basename(word), i
+            value_options, positionals = COMMAND_WRAPPERS[name]
+            i += 1
+            while i < len(words) and words[i].startswith('-') and words[i] != '-':
+                if (name == 'command' and not words[i].startswith('--')
+                        and {'v', 'V'} & set(words[i])):
+                    return words[start:]  # A lookup: nothing runs
+                if words[i] == '--':
+                    i += 1
+                    break
+                i += 2 if words[i] in value_options else 1
+            while i < len(words) and _ENV_ASSIGNMENT.match(words[i]):
+                i += 1  # env FOO=1 cmd
+            i += positionals
+        else:
+            break
+    return words[i:]
+
+
+def get_bash_cmd_name(command: str) -> str:
+    """Name of the main command of a bash command line (see bash_commands).
+
+    That is the first command that does more than prepare the shell (cd, export,
+    source, ...); a line of setup commands only is keyed by its first one.
+    """
+    names = bash_command_names(command)
+    return next((name for name in names if name not in SETUP_COMMANDS),
+                names[0] if names else '')
+
+
+def bash_command_names(command: str) -> tuple:
+    """Command names (basenames) of every command in a bash command line, in order."""
+    return tuple(os.path.basename(argv[0]) for argv in bash_commands(command or ''))
+
+
+# === Permission Rules ===
+
+def permission_paths(tc: dict) -> tuple:
+    """What permission rules match of a tool call, as paths from the tool down.
+
+    Bash: a path per command of the line, ('Bash', 'npm', 'test') (see
+    shell_segments); file tools: ('Edit', *components of the absolute path);
+    WebFetch: ('WebFetch', host); MCP tools: ('mcp__server', tool). A call
+    whose input is unknown gets the tool alone; tools that never ask, nothing.
+    """
+    tool = tc['tool']
+    if tool == 'Bash':
+        commands = dict.fromkeys(shell_segments(tc['command'] or ''))
+        return tuple(('Bash',) + words for words in commands) or (('Bash',),)
+    if tool in EDIT_TOOLS:
+        path = tc['file_path'] or _tool_input_value(tc, 'notebook_path')
+        if path and path.startswith('/'):
+            return (('Edit',) + tuple(part for part in os.path.normpath(path).split('/') if part),)
+        return (('Edit',),)
+    if tool == 'WebFetch':
+        host = _url_host(_tool_input_value(tc, 'url'))
+        return (('WebFetch', host) if host else ('WebFetch',),)
+    if tool.startswith('mcp__'):
+        server, _, name = tool[5:].partition('__')
+        return (('mcp__' + server, name) if name else (tool,),)
+    if tool in PERMISSION_TOOLS:
+        return ((tool,),)
+    return ()
+
+
+def _tool_input_value(tc: dict, key: str) -> str:
+    """A string field of a tool call's input (a dict, or the repr() preview the index keeps)."""
+    tool_input = tc['input']
+    if isinstance(tool_input, dict):
+        value = tool_input.get(key)
+        return value if isinstance(value, str) else None
+    m = re.search(rf"""'{key}': (?:'((?:[^'\\]|\\.)*)'|"((?:[^"\\]|\\.)*)")""",
+                  tool_input or '')
+    return None if m is None else m.group(1) if m.group(1) is not None else m.group(2)
+
+
+def _url_host(url: str) -> str:
+    try:
+        return urlsplit(url).hostname if url else None
+    except ValueError:
+        return None
+
+
+def parse_permission_rule(rule: str):
+    """(path, prefix) of a rule in settings.json syntax, or None if not understood.
+
+    The path is the permission_paths() path of the calls the rule allows: the
+    path and everything below it when prefix is true (Bash(npm test:*),
+    Edit(//src/**), mcp__server), the path only otherwise (Bash(git status)).
+    Relative and glob file patterns are not understood.
+    """
+    m = re.fullmatch(r'([\w.*-]+)(?:\((.*)\))?', rule.strip(), re.S)
+    if m is None:
+        return None
+    tool, spec = m.groups()
+    if tool.startswith('mcp__'):
+        server, _, name = tool[5:].partition('__')
+        if name in ('', '*'):
+            return ('mcp__' + server,), True
+        return ('mcp__' + server, name), False
+    root = 'Edit' if tool in EDIT_TOOLS else tool
+    if not spec or spec == '*':
+        return (root,), True
+
+    if tool == 'Bash':
+        prefix = spec.endswith(':*')
+        commands = shell_segments(spec[:-2] if prefix else spec)
+        return (('Bash',) + commands[0], prefix) if len(commands) == 1 else None
+    if root == 'Edit':
+        if spec.startswith('~/'):
+            spec = os.path.expanduser('~') + spec[1:]
+        elif spec.startswith('//'):
+            spec = spec[1:]
+        else:
+            return None  # Relative to a project or settings file
+        prefix = spec.endswith('/**')
+        spec = spec[:-3] if prefix else spec
+        if any(c in spec for c in '*?['):
+            return None
+        return ('Edit',) + tuple(part for part in spec.split('/') if part), prefix
+    if tool == 'WebFetch' and spec.startswith('domain:'):
+        return ('WebFetch', spec[len('domain:'):]), True
+    return None
+
+
+def format_permission_rule(path: tuple, prefix: bool) -> str:
+    """The settings.json rule for a path (inverse of parse_permission_rule)."""
+    root, parts = path[0], path[1:]
+    if not parts or root.startswith('mcp__'):
+        return '__'.join(path)
+    if root == 'Bash':
+        return f"Bash({' '.join(parts)}{':*' if prefix else ''})"
+    if root == 'Edit':
+        return f"Edit(//{'/'.join(parts)}{'/**' if prefix else ''})"
+    return f"{root}(domain:{parts[0]})"  # WebFetch
+
+
+def _path_text(path: tuple) -> str:
+    """A permission path as the command, file, host or tool it stands for."""
+    root, parts = path[0], path[1:]
+    if root == 'Bash' and parts:
+        return ' '.join(parts)
+    if root == 'Edit' and parts:
+        return '/' + '/'.join(parts)
+    return '__'.join(path) if root.startswith('mcp__') else parts[0] if parts else root
+
+
+def rule_keys(path: tuple):
+    """The (path, prefix) rules matching a permission path, most specific first.
+
+    The path itself, then every prefix rule ending at a part boundary: like
+    Claude Code, Bash(npm test:*) matches `npm test` and `npm test -v`, but not
+    `npm test-all`, and Bash(ls:*) not `lsof`.
+    """
+    yield path, False
+    for i in range(len(path), 0, -1):
+        yield path[:i], True
+
+
+class PermissionRules:
+    """Rules of one kind, indexed by the permission path they match on.
+
+    A path is matched by dict lookups of its rule_keys(), so the cost does not
+    grow with the number of rules, and each distinct path is looked up once.
+    """
+
+    def __init__(self, rules=()):
+        self.rules = []
+        self.unparsed = []  # Rules parse_permission_rule() does not understand
+        self._prefixes = {}
+        self._exact = {}
+        self._matched = {}  # Path -> match(), histories repeat the same commands
+        for rule in rules:
+            self.add(rule)
+
+    def add(self, rule: str):
+        parsed = parse_permission_rule(rule)
+        if parsed is None:
+            self.unparsed.append(rule)
+            return
+        path, prefix = parsed
+        (self._prefixes if prefix else self._exact).setdefault(path, rule)
+        self.rules.append(rule)
+        self._matched.clear()
+
+    def match(self, path: tuple) -> str:
+        """The rule matching a path (the most specific one), or None."""
+        try:
+            return self._matched[path]
+        except KeyError:
+            pass
+        for key, prefix in rule_keys(path):
+            rule = (self._prefixes if prefix else self._exact).get(key)
+            if rule is not None:
+                break
+        self._matched[path] = rule
+        return rule
+
+
+class Ruleset:
+    """A permission ruleset: allow, ask and deny rules plus DCG block patterns.
+
+    Like Claude Code, each path of a call (every command of a Bash line) is
+    checked on its own: deny wins over ask, ask over allow, and a path no
+    rule matches asks. A call is blocked if a path is denied or a DCG pattern
+    is found in its Bash command line, and allowed only if every path is.
+    """
+
+    def __init__(self, rules: dict):
+        self.kinds = {kind: PermissionRules(rules.get(kind, ())) for kind in PERMISSION_RULE_KINDS}
+        self.dcg = [(pattern, re.compile(pattern)) for pattern in rules.get('dcg', ())]
+
+    def decide(self, tc: dict) -> tuple:
+        """(outcome, deciding rules) of a tool call, outcome 'allow', 'prompt' or 'block'.
+
+        The outcome is None for tools that never ask. A DCG pattern is named
+        as 'dcg:PATTERN'.
+        """
+        paths = permission_paths(tc)
+        if not paths:
+            return None, ()
+        if tc['tool'] == 'Bash':
+            for pattern, rx in self.dcg:
+                if rx.search(tc['command'] or ''):
+                    return 'block', (f"dcg:{pattern}",)
+
+        allow, ask, deny = (self.kinds[kind] for kind in PERMISSION_RULE_KINDS)
+        allowed, asked, unmatched = [], [], False
+        for path in paths:
+            rule = deny.match(path)
+            if rule is not None:
+                return 'block', (rule,)
+            rule = ask.match(path)
+            if rule is not None:
+                asked.append(rule)
+                continue
+            rule = allow.match(path)
+            if rule is None:
+                unmatched = True
+            else:
+                allowed.append(rule)
+        if asked or unmatched:
+            return 'prompt', tuple(dict.fromkeys(asked))
+        return 'allow', tuple(dict.fromkeys(allowed))
+
+
+def load_permission_rules(paths: list) -> dict:
+    """allow/ask/deny rules of settings.json files, and the "dcg" patterns of
+    ruleset files, each merged in file order.
+
+    Rules may sit under "permissions" (settings.json) or at the top level.
+    Raises ValueError for malformed files or patterns.
+    """
+    merged = {kind: [] for kind in PERMISSION_RULE_KINDS + ('dcg',)}
+    for path in paths:
+        with open(path) as f:
+            settings = json.load(f)
+        if not isinstance(settings, dict):
+            raise ValueError(f"{path}: not a JSON object")
+        permissions = settings.get('permissions', settings)
+        for kind in merged:
+            rules = (settings if kind == 'dcg' else permissions).get(kind, [])
+            if not isinstance(rules, list) or not all(isinstance(r, str) for r in rules):
+                raise ValueError(f"{path}: {kind} must be a list of strings")
+            merged[kind].extend(rules)
+    for pattern in merged['dcg']:
+        try:
+            re.compile(pattern)
+        except re.error as e:
+            raise ValueError(f"dcg pattern {pattern!r}: {e}")
+    return merged
+
+
+# === Session Index ===
+
+INDEX_SCHEMA = """
+CREATE TABLE sessions (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    offset INTEGER NOT NULL,
+    user_messages INTEGER NOT NULL,
+    assistant_turns INTEGER NOT NULL,
+    first_ts TEXT NOT NULL,
+    last_ts TEXT NOT NULL,
+    open_turn TEXT,
+    rules TEXT NOT NULL,
+    texts_offset INTEGER NOT NULL
+);
+CREATE TABLE tool_calls (
+    session_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    tool TEXT NOT NULL,
+    command TEXT,
+    input TEXT NOT NULL,
+    tool_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    assistant_uuid TEXT NOT NULL,
+    file_path TEXT,
+    result TEXT,
+    result_class TEXT NOT NULL,
+    result_kind TEXT,
+    duration_ms INTEGER,
+    result_bytes INTEGER,
+    PRIMARY KEY (session_id, seq)
+);
+CREATE TABLE events (
+    session_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    event TEXT NOT NULL,
+    tool TEXT NOT NULL,
+    detail TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+CREATE TABLE hook_events (
+    session_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    hook_count INTEGER NOT NULL,
+    hook_errors TEXT NOT NULL,
+    hook_infos TEXT NOT NULL,
+    prevented INTEGER NOT NULL,
+    duration_ms INTEGER,
+    PRIMARY KEY (session_id, seq)
+);
+CREATE TABLE hook_runs (
+    session_id INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    command TEXT NOT NULL,
+    runs INTEGER NOT NULL,
+    PRIMARY KEY (session_id, event, command)
+);
+CREATE TABLE turn_durations (
+    session_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    duration_ms INTEGER NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+CREATE TABLE turns (
+    session_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    start_ts TEXT NOT NULL,
+    duration_ms INTEGER NOT NULL,
+    model_ms INTEGER NOT NULL,
+    tool_ms INTEGER NOT NULL,
+    permission_ms INTEGER NOT NULL,
+    hook_ms INTEGER NOT NULL,
+    tool_calls INTEGER NOT NULL,
+    prompt TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+CREATE TABLE usage (
+    session_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    message_id TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    input_tokens INTEGER NOT NULL,
+    cache_read_input_tokens INTEGER NOT NULL,
+    cache_creation_input_tokens INTEGER NOT NULL,
+    output_tokens INTEGER NOT NULL,
+    tools TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+CREATE TABLE search_docs (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    kind TEXT NOT NULL
+);
+CREATE INDEX search_docs_session ON search_docs (session_id);
+CREATE VIRTUAL TABLE search_text USING fts5(
+    text, tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE catalog_dirs (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE catalog (
+    path TEXT PRIMARY KEY,
+    project TEXT NOT NULL,
+    session TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    start_ts TEXT
+);
+CREATE INDEX catalog_project ON catalog (project);
+"""
+
+# Bump when the schema or the extracted fields change: the index is rebuilt.
+INDEX_SCHEMA_VERSION = 12
+
+TURN_FIELDS = ('start', 'duration_ms', 'model_ms', 'tool_ms', 'permission_ms',
+               'hook_ms', 'tool_calls', 'prompt')
+
+INDEX_TABLES = ('tool_calls', 'events', 'hook_events', 'hook_runs', 'turn_durations', 'turns',
+                'usage', 'search_docs')
+
+
+class SessionIndex:
+    """On-disk cache of extracted session data (SQLite).
+
+    Sessions are keyed by path and validated by size + mtime + inode. When a
+    file has only grown, parsing resumes at the stored byte offset, so each run
+    only decodes newly appended entries.
+
+    The catalog tables keep the session files per project directory (name,
+    mtime, size, start time) for discovery with --catalog.
+
+    search_text is an FTS5 inverted index over the texts collected with
+    keep_texts; search_docs holds where each text (same rowid) came from.
+    Texts are only parsed for search (load(texts=True)): texts_offset is the
+    byte offset up to which a session's texts are in search_text.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path), timeout=30)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self._start_times = {}  # Catalog start times, see session_start()
+        self._new_start_times = []
+        version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+        if version != INDEX_SCHEMA_VERSION:
+            self._create_schema()
+
+    def _create_schema(self):
+        with self.conn:
+            for (name,) in self.conn.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+                # FTS5 shadow tables go with their virtual table
+                self.conn.execute(f'DROP TABLE IF EXISTS {name}')
+            self.conn.executescript(INDEX_SCHEMA)
+            self.conn.execute(f'PRAGMA user_version = {INDEX_SCHEMA_VERSION}')
+
+    def close(self):
+        if self._new_start_times:
+            with self.conn:
+                self.conn.executemany(
+                    'UPDATE catalog SET start_ts = ? WHERE path = ?',
+                    [(self._start_times[path], path) for path in self._new_start_times])
+        self.conn.close()
+
+    def forget(self, session_file: Path):
+        """Drop a session from the index."""
+        row = self.conn.execute('SELECT id FROM sessions WHERE path = ?',
+                                (str(session_file),)).fetchone()
+        if not row:
+            return
+        with self.conn:
+            self.conn.execute('DELETE FROM search_text WHERE rowid IN '
+                              '(SELECT id FROM search_docs WHERE session_id = ?)', row)
+            for table in INDEX_TABLES:
+                self.conn.execute(f'DELETE FROM {table} WHERE session_id = ?', row)
+            self.conn.execute('DELETE FROM sessions WHERE id = ?', row)
+
+    def scan_catalog(self, base_path: Path, project: str = None, session_id: str = None,
+                     project_dir: Path = None) -> list:
+        """(project dir, path, mtime_ns) tuples like _scan_session_files.
+
+        Project directories whose mtime is unchanged are not listed again.
+        Files are still stat-ed (appends do not touch the directory); only rows
+        whose mtime or size changed are written back.
+        """
+        dirs = dict(self.conn.execute('SELECT path, mtime_ns FROM catalog_dirs'))
+        known = defaultdict(dict)
+        for path, proj_name, name, mtime_ns, size, start_ts in self.conn.execute(
+                'SELECT path, project, session, mtime_ns, size, start_ts FROM catalog'):
+            known[proj_name][path] = (name, mtime_ns, size)
+            if start_ts is not None:
+                self._start_times[path] = start_ts
+
+        found = []
+        changed_dirs, upserts, removed = [], [], []
+        with os.scandir(base_path) as proj_dirs:
+            for proj_dir in proj_dirs:
+                if not proj_dir.is_dir():
+                    continue
+                if project and project.lower() not in proj_dir.name.lower():
+                    continue
+                if project_dir is not None and proj_dir.name != project_dir.name:
+                    continue
+                cached = known.get(proj_dir.name, {})
+                dir_mtime_ns = proj_dir.stat().st_mtime_ns
+                if dirs.get(proj_dir.path) == dir_mtime_ns:
+                    listing = [(row[0], path) for path, row in cached.items()]
+                else:
+                    listing = [(name[:-len('.jsonl')], path)
+                               for name, path in _list_session_files(proj_dir.path)]
+                    removed += cached.keys() - {path for _, path in listing}
+                    changed_dirs.append((proj_dir.path, dir_mtime_ns))
+
+                for name, path in listing:
+                    if session_id and not name.startswith(session_id):
+                        continue
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        removed.append(path)
+                        continue
+                    if cached.get(path) != (name, st.st_mtime_ns, st.st_size):
+                        if path in cached and st.st_size < cached[path][2]:
+                            # Shrank: replaced, its start time is re-read
+                            self._start_times.pop(path, None)
+                        upserts.append((path, proj_dir.name, name, st.st_mtime_ns, st.st_size))
+                    found.append((proj_dir.name, path, st.st_mtime_ns))
+
+        if changed_dirs or upserts or removed:
+            with self.conn:
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO catalog_dirs VALUES (?, ?)', changed_dirs)
+                self.conn.executemany(
+                    'INSERT INTO catalog (path, project, session, mtime_ns, size) '
+                    'VALUES (?, ?, ?, ?, ?) ON CONFLICT(path) DO UPDATE SET '
+                    'mtime_ns = excluded.mtime_ns, size = excluded.size, '
+                    'start_ts = CASE WHEN excluded.size >= catalog.size '
+                    'THEN catalog.start_ts END', upserts)
+                self.conn.executemany('DELETE FROM catalog WHERE path = ?',
+                                      [(path,) for path in removed])
+        return found
+
+    def session_start(self, path: str) -> str:
+        """Cached session_start() of a catalogued file (stored on close)."""
+        if path not in self._start_times:
+            self._start_times[path] = session_start(path)
+            self._new_start_times.append(path)
+        return self._start_times[path]
+
+    def offset(self, session_file: Path) -> int:
+        """Byte offset up to which a session is indexed (0 if it is not)."""
+        row = self.conn.execute('SELECT offset FROM sessions WHERE path = ?',
+                                (str(session_file),)).fetchone()
+        return row[0] if row else 0
+
+    def summary(self, session_file: Path) -> dict:
+        """SummaryReport counts of an indexed session, aggregated in SQL (None if not indexed).
+
+        Unlike _read() no row is read back, so the cost hardly grows with the session.
+        """
+        row = self.conn.execute(
+            'SELECT id, user_messages, assistant_turns, first_ts, last_ts FROM sessions '
+            'WHERE path = ?', (str(session_file),)).fetchone()
+        if not row:
+            return None
+        session_id = row[0]
+        summary = dict(zip(('user_messages', 'assistant_turns', 'start', 'end'), row[1:]))
+        # Ordered like a Counter over the tool calls: by first occurrence
+        results = self.conn.execute(
+            'SELECT result_class, COUNT(*) FROM tool_calls WHERE session_id = ? '
+            'GROUP BY result_class ORDER BY MIN(seq)', (session_id,)).fetchall()
+        summary['tool_calls'] = sum(count for _, count in results)
+        summary['results'] = dict(results)
+        summary['top_tools'] = self.conn.execute(
+            'SELECT tool, COUNT(*) FROM tool_calls WHERE session_id = ? '
+            'GROUP BY tool ORDER BY COUNT(*) DESC, MIN(seq) LIMIT 10', (session_id,)).fetchall()
+        summary['turn_durations'] = [d for (d,) in self.conn.execute(
+            'SELECT duration_ms FROM turn_durations WHERE session_id = ? ORDER BY seq',
+            (session_id,))]
+        summary['hook_events'], summary['hook_errors'] = self.conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(json_array_length(hook_errors)), 0) '
+            'FROM hook_events WHERE session_id = ?', (session_id,)).fetchone()
+        return summary
+
+    def load(self, session_file: Path, proj_name: str, read: bool = True,
+             texts: bool = False) -> dict:
+        """Session data for a file, parsing only what the index does not cover yet.
+
+        With read=False an up-to-date session is not read back (returns None):
+        the index is only brought up to date. With texts, the search texts of
+        the session are indexed as well (only search needs them).
+        """
+        st = session_file.stat()
+        rules = get_classifier().fingerprint
+        row = self.conn.execute(
+            'SELECT id, size, mtime_ns, inode, offset, rules, texts_offset FROM sessions '
+            'WHERE path = ?', (str(session_file),)).fetchone()
+        texts_offset = 0
+
+        if row:
+            session_id, size, mtime_ns, inode, offset, session_rules, texts_offset = row
+            if session_rules != rules:
+                # Results were classified with other rules: start over
+                self.forget(session_file)
+                row, texts_offset = None, 0
+            elif size == st.st_size and mtime_ns == st.st_mtime_ns:
+                if texts and texts_offset < offset:
+                    self._add_texts(session_id, session_file, texts_offset, offset)
+                if not read:
+                    return None
+                with profile_phase('index-read'):
+                    return self._read(session_id, session_file, proj_name)
+            elif inode != st.st_ino or st.st_size < offset:
+                # Replaced or truncated: start over
+                self.forget(session_file)
+                row, texts_offset = None, 0
+
+        if row:
+            with profile_phase('index-read'):
+                data = self._read(session_id, session_file, proj_name)
+        else:
+            data, offset = new_session_data(session_file, proj_name), 0
+
+        known = {table: len(data[key]) for table, key in (
+            ('tool_calls', 'tool_calls'), ('events', 'events'),
+            ('hook_events', 'hook_events'), ('turn_durations', 'turn_durations'),
+            ('turns', 'turns'), ('usage', 'usage'))}
+        pending = [i for i, tc in enumerate(data['tool_calls'])
+                   if tc['result_class'] == 'pending']
+
+        # Texts of the new entries go with them when the earlier ones are indexed
+        keep_texts = texts and texts_offset == offset
+        scanner = SessionScanner(data, keep_texts=keep_texts)
+        reader = SessionReader(session_file, offset)
+        scan_session(scanner, reader)
+        if texts and not keep_texts:
+            data['texts'] = self._parse_texts(session_file, texts_offset, reader.offset)
+        if texts:
+            texts_offset = reader.offset
+
+        with profile_phase('index-write'):
+            self._write(data, st, reader.offset, known, pending, rules, texts_offset)
+        return data
+
+    def _parse_texts(self, session_file: Path, start: int, end: int) -> list:
+        """Search texts of the entries between two byte offsets of a session."""
+        scanner = SessionScanner(new_session_data(session_file), keep_texts=True)
+        scan_session(scanner, SessionReader(session_file, start, end=end))
+        return scanner.data['texts']
+
+    def _add_texts(self, session_id: int, session_file: Path, start: int, end: int):
+        """Index the search texts of an indexed session from start up to end."""
+        texts = self._parse_texts(session_file, start, end)
+        with profile_phase('index-write'), self.conn:
+            self._insert_texts(session_id, texts)
+            self.conn.execute('UPDATE sessions SET texts_offset = ? WHERE id = ?',
+                              (end, session_id))
+
+    def _insert_texts(self, session_id: int, texts: list):
+        for t in texts:
+            doc_id = self.conn.execute(
+                'INSERT INTO search_docs (session_id, timestamp, kind) VALUES (?, ?, ?)',
+                (session_id, t['timestamp'], t['kind'])).lastrowid
+            self.conn.execute('INSERT INTO search_text (rowid, text) VALUES (?, ?)',
+                              (doc_id, t['text']))
+
+    def _read(self, session_id: int, session_file: Path, proj_name: str) -> dict:
+        data = new_session_data(session_file, proj_name)
+        (data['user_messages'], data['assistant_turns'],
+         data['first_ts'], data['last_ts'], open_turn) = self.conn.execute(
+            'SELECT user_messages, assistant_turns, first_ts, last_ts, open_turn '
+            'FROM sessions WHERE id = ?', (session_id,)).fetchone()
+        data['open_turn'] = json.loads(open_turn) if open_turn else None
+
+        for (tool, command, tool_input, tool_id, ts, assistant_uuid, file_path,
+             result, result_class, result_kind, duration_ms, result_bytes) in self.conn.execute(
+                'SELECT tool, command, input, tool_id, timestamp, assistant_uuid, file_path, '
+                'result, result_class, result_kind, duration_ms, result_bytes FROM tool_calls '
+                'WHERE session_id = ? ORDER BY seq', (session_id,)):
+            data['tool_calls'].append(ToolCall(
+                tool=_intern(tool),
+                command=command,
+                input=tool_input,
+                tool_id=tool_id,
+                timestamp=ts,
+                assistant_uuid=assistant_uuid,
+                file_path=file_path,
+                result=result,
+                result_class=_intern(result_class),
+                result_kind=_intern(result_kind) if result_kind else None,
+                duration_ms=duration_ms,
+                result_bytes=result_bytes,
+            ))
+
+        for ts, event, tool, detail in self.conn.execute(
+                'SELECT timestamp, event, tool, detail FROM events '
+                'WHERE session_id = ? ORDER BY seq', (session_id,)):
+            data['events'].append(Event(
+                timestamp=ts, event=_intern(event), tool=_intern(tool),
+                detail=detail, project=data['project']))
+
+        for ts, hook_count, hook_errors, hook_infos, prevented, duration in self.conn.execute(
+                'SELECT timestamp, hook_count, hook_errors, hook_infos, prevented, duration_ms '
+                'FROM hook_events WHERE session_id = ? ORDER BY seq', (session_id,)):
+            data['hook_events'].append({
+                'subtype': 'stop_hook_summary',
+                'hookCount': hook_count,
+                'hookErrors': json.loads(hook_errors),
+                'hookInfos': json.loads(hook_infos),
+                'preventedContinuation': bool(prevented),
+                'timestamp': ts,
+                'duration_ms': duration,
+            })
+
+        for event, command, runs in self.conn.execute(
+                'SELECT event, command, runs FROM hook_runs WHERE session_id = ?', (session_id,)):
+            data['hook_runs'][(sys.intern(event), command)] = runs
+
+        data['turn_durations'] = [d for (d,) in self.conn.execute(
+            'SELECT duration_ms FROM turn_durations WHERE session_id = ? ORDER BY seq',
+            (session_id,))]
+
+        for row in self.conn.execute(
+                'SELECT start_ts, duration_ms, model_ms, tool_ms, permission_ms, hook_ms, '
+                'tool_calls, prompt FROM turns WHERE session_id = ? ORDER BY seq',
+                (session_id,)):
+            data['turns'].append(dict(zip(TURN_FIELDS, row)))
+
+        for row in self.conn.execute(
+                'SELECT message_id, timestamp, input_tokens, cache_read_input_tokens, '
+                'cache_creation_input_tokens, output_tokens, tools FROM usage '
+                'WHERE session_id = ? ORDER BY seq', (session_id,)):
+            record = dict(zip(('message_id', 'timestamp') + USAGE_FIELDS, row))
+            record['tools'] = json.loads(row[-1])
+            data['usage'].append(record)
+        return data
+
+    def _write(self, data: dict, st: os.stat_result, offset: int, known: dict, pending: list,
+               rules: str, texts_offset: int):
+        path = str(data['file'])
+        with self.conn:
+            self.conn.execute(
+                'INSERT INTO sessions (path, size, mtime_ns, inode, offset, user_messages, '
+                'assistant_turns, first_ts, last_ts, open_turn, rules, texts_offset) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(path) DO UPDATE SET size = excluded.size, '
+                'mtime_ns = excluded.mtime_ns, inode = excluded.inode, '
+                'offset = excluded.offset, user_messages = excluded.user_messages, '
+                'assistant_turns = excluded.assistant_turns, '
+                'first_ts = excluded.first_ts, last_ts = excluded.last_ts, '
+                'open_turn = excluded.open_turn, rules = excluded.rules, '
+                'texts_offset = excluded.texts_offset',
+                (path, st.st_size, st.st_mtime_ns, st.st_ino, offset,
+                 data['user_messages'], data['assistant_turns'],
+                 data['first_ts'], data['last_ts'],
+                 json.dumps(data['open_turn']) if data['open_turn'] else None, rules,
+                 texts_offset))
+            session_id = self.conn.execute('SELECT id FROM sessions WHERE path = ?',
+                                           (path,)).fetchone()[0]
+
+            tool_calls = data['tool_calls']
+            self.conn.executemany(
+                'INSERT INTO tool_calls VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(session_id, seq) + _tool_call_row(tool_calls[seq])
+                 for seq in range(known['tool_calls'], len(tool_calls))])
+            self.conn.executemany(
+                'UPDATE tool_calls SET result = ?, result_class = ?, result_kind = ?, '
+                'duration_ms = ?, result_bytes = ? WHERE session_id = ? AND seq = ?',
+                [_tool_call_row(tool_calls[seq])[-5:] + (session_id, seq)
+                 for seq in pending if tool_calls[seq]['result_class'] != 'pending'])
+
+            events = data['events']
+            self.conn.executemany(
+                'INSERT INTO events VALUES (?, ?, ?, ?, ?, ?)',
+                [(session_id, seq, e['timestamp'], e['event'], e['tool'], e['detail'])
+                 for seq, e in enumerate(events[known['events']:], known['events'])])
+
+            hooks = data['hook_events']
+            self.conn.executemany(
+                'INSERT INTO hook_events VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(session_id, seq, h['timestamp'], h['hookCount'],
+                  json.dumps(h['hookErrors']), json.dumps(h['hookInfos']),
+                  int(bool(h['preventedContinuation'])), h['duration_ms'])
+                 for seq, h in enumerate(hooks[known['hook_events']:], known['hook_events'])])
+
+            # A few rows per session, holding the totals: written again whole
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO hook_runs VALUES (?, ?, ?, ?)',
+                [(session_id, event, command, runs)
+                 for (event, command), runs in data['hook_runs'].items()])
+
+            durations = data['turn_durations']
+            self.conn.executemany(
+                'INSERT INTO turn_durations VALUES (?, ?, ?)',
+                [(session_id, seq, d)
+                 for seq, d in enumerate(durations[known['turn_durations']:],
+                                         known['turn_durations'])])
+
+            turns = data['turns']
+            self.conn.executemany(
+                'INSERT INTO turns VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(session_id, seq) + tuple(t[field] for field in TURN_FIELDS)
+                 for seq, t in enumerate(turns[known['turns']:], known['turns'])])
+
+            # The last known message may have gained entries: write it again
+            usage = data['usage']
+            first = max(0, known['usage'] - 1)
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(session_id, seq, u['message_id'], u['timestamp'])
+                 + tuple(u[field] for field in USAGE_FIELDS) + (json.dumps(u['tools']),)
+                 for seq, u in enumerate(usage[first:], first)])
+
+            # Texts are never read back: data only holds the ones parsed now
+            self._insert_texts(session_id, data['texts'])
+
+    def search(self, query: str, session_files: list, kinds: list = None,
+               since: str = None, until: str = None, limit: int = SEARCH_RESULTS) -> list:
+        """Best matching texts of the given sessions, best first (FTS5 bm25 rank).
+
+        Rows are (path, timestamp, kind, snippet, score); matches are marked
+        with ** in the snippet.
+        """
+        self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS search_scope '
+                          '(id INTEGER PRIMARY KEY)')
+        self.conn.execute('DELETE FROM search_scope')
+        self.conn.executemany(
+            'INSERT OR IGNORE INTO search_scope SELECT id FROM sessions WHERE path = ?',
+            [(str(f),) for f in session_files])
+
+        sql = ("SELECT s.path, d.timestamp, d.kind, "
+               "snippet(search_text, 0, '**', '**', '...', 16), bm25(search_text) "
+               "FROM search_text JOIN search_docs d ON d.id = search_text.rowid "
+               "JOIN sessions s ON s.id = d.session_id "
+               "WHERE search_text MATCH ? AND d.session_id IN (SELECT id FROM search_scope)")
+        params = [query]
+        if kinds:
+            sql += f" AND d.kind IN ({', '.join('?' * len(kinds))})"
+            params += kinds
+        if since:
+            sql += ' AND d.timestamp >= ?'
+            params.append(since)
+        if until:
+            sql += ' AND d.timestamp < ?'
+            params.append(until)
+        sql += ' ORDER BY bm25(search_text), d.timestamp DESC LIMIT ?'
+        params.append(limit)
+        return self.conn.execute(sql, params).fetchall()
+
+
+def _tool_call_row(tc: dict) -> tuple:
+    """Index columns of a tool call (session_id and seq excluded)."""
+    result = tc['result'] if isinstance(tc['result'], str) else None
+    return (tc['tool'], tc['command'], tc['input'], tc['tool_id'],
+            tc['timestamp'], tc['assistant_uuid'], tc['file_path'], result,
+            tc['result_class'], tc['result_kind'], tc['duration_ms'], tc['result_bytes'])
+
+
+def open_index(args):
+    """Open the session index, or None when caching is disabled or unavailable."""
+    if args.no_cache:
+        return None
+    try:
+        return SessionIndex(args.index)
+    except Exception as e:
+        print(f"Warning: session index unavailable ({e}), parsing without cache",
+              file=sys.stderr)
+        return None
+
+
+def scan_session(scanner: SessionScanner, reader: SessionReader):
+    """Feed the entries of a reader to a scanner, timing the phases with --profile."""
+    profiler = _profiler
+    if profiler is None:
+        for entry in reader:
+            scanner.feed(entry)
+        return
+
+    start = reader.offset
+    extract = 0.0
+    clock, feed = time.perf_counter, scanner.feed
+    with profiler.phase('parse') as parse:
+        for entry in reader:
+            feed(entry)
+            extract += clock() - reader.decoded_at
+        parse.update(bytes=reader.offset - start, lines=reader.lines, decoded=reader.decoded)
+    profiler.split(parse, reader.decode_seconds, extract)
+
+
+def load_session(session_file: Path, proj_name: str, index: SessionIndex = None,
+                 kinds: int = LINE_ALL) -> dict:
+    """Extracted data for one session, from the index when available.
+
+    Without the index, only lines of the given LINE_* kinds are decoded; the
+    data then only covers what the requesting reports need. In a serve process
+    sessions come from its in-memory cache.
+    """
+    if _session_cache is not None:
+        return _session_cache.load(session_file, proj_name, index)
+    if index is not None:
+        try:
+            return index.load(session_file, proj_name)
+        except Exception as e:
+            print(f"Warning: index lookup failed for {session_file.name} ({e})",
+                  file=sys.stderr)
+
+    scanner = SessionScanner(new_session_data(session_file, proj_name))
+    scan_session(scanner, SessionReader(session_file, kinds=kinds))
+    return scanner.data
+
+
+def load_session_offset(session_file: Path, proj_name: str,
+                        index: SessionIndex = None) -> tuple:
+    """(data, offset): a whole session, from the index when available, and the
+    byte offset up to which it was read (the end of its last complete line).
+    """
+    if index is not None:
+        try:
+            return index.load(session_file, proj_name), index.offset(session_file)
+        except Exception as e:
+            print(f"Warning: index lookup failed for {session_file.name} ({e})",
+                  file=sys.stderr)
+    scanner = SessionScanner(new_session_data(session_file, proj_name))
+    reader = SessionReader(session_file)
+    scan_session(scanner, reader)
+    return scanner.data, reader.offset
+
+
+def load_session_range(session_file: Path, proj_name: str, kinds: int = LINE_ALL,
+                       since: str = None, until: str = None, start: int = None) -> dict:
+    """Extracted data for the entries of one session between two timestamps.
+
+    Only the byte range found by seek_timestamp() is decoded. `start` (an
+    offset, resynced to the next line) replaces `since` for tail reads.
+    """
+    with open(session_file, 'rb') as f:
+        begin = _next_line_start(f, start) if start is not None else (
+            seek_timestamp(f, since) if since else 0)
+        end = seek_timestamp(f, until) if until else None
+    scanner = SessionScanner(new_session_data(session_file, proj_name))
+    scan_session(scanner, SessionReader(session_file, begin, kinds, end))
+    return scanner.data
+
+
+def load_session_tail(session_file: Path, proj_name: str, kinds: int, enough) -> dict:
+    """Extracted data for the end of a session, read backwards in growing windows.
+
+    The window doubles until `enough(data)` holds or the whole file was read.
+    """
+    window = TAIL_READ_BYTES
+    size = session_file.stat().st_size
+    while True:
+        start = max(0, size - window)
+        data = load_session_range(session_file, proj_name, kinds, start=start)
+        if start == 0 or enough(data):
+            return data
+        window *= 2
+
+
+def iter_session_data(sessions: list, args, kinds: int = LINE_ALL):
+    """Yield extracted data for each (mtime, file, project) session tuple.
+
+    With --since/--until, sessions that cross a bound are cut to the entries
+    in the range (see load_session_range); the others come from the index.
+    """
+    since, until = _utc_iso(args.since), _utc_iso(args.until)
+    index = open_index(args)
+    try:
+        for mtime, session_file, proj_name in sessions:
+            if (since or until) and not _session_within(session_file, mtime, args):
+                yield load_session_range(session_file, proj_name, kinds, since, until)
+            else:
+                yield load_session(session_file, proj_name, index, kinds)
+    finally:
+        if index is not None:
+            index.close()
+
+
+def _session_within(session_file: Path, mtime: float, args) -> bool:
+    """Whether a session lies entirely inside --since/--until."""
+    if args.until and mtime > args.until.timestamp():
+        return False
+    if args.since:
+        started = _parse_ts(session_start(session_file))
+        return started is not None and started >= args.since
+    return True
+
+
+# === Reports ===
+
+class Report:
+    """Accumulator for one report.
+
+    Reports are fed the extracted data of every session in a single shared
+    pass (`add`), then rendered once as text or JSON. This lets `all` produce
+    several reports from one load of each session.
+
+    With --jobs, worker processes fill partial reports for consecutive chunks
+    of sessions; `merge` folds them together in session order, so the result
+    is identical to a serial run.
+    """
+
+    name = ''
+    title = ''
+    needs = LINE_ALL  # Line kinds the report reads (see classify_line)
+    ensure_ascii = True  # JSON output escaping, kept per report for stable output
+    from_index = False  # Sessions can be added from index aggregates (add_indexed)
+
+    def __init__(self, args):
+        self.args = args
+        self.sessions = 0
+
+    def add(self, data: dict):
+        self.sessions += 1
+
+    def merge(self, other: 'Report'):
+        self.sessions += other.sessions
+
+    def as_json(self):
+        raise NotImplementedError
+
+    def render(self):
+        raise NotImplementedError
+
+    def new_rows(self, data: dict, resolved: list) -> list:
+        """Rows for entries that arrived while following (--follow).
+
+        `data` only holds what was extracted since the last poll; `resolved`
+        are earlier pending tool calls whose result has arrived since.
+        """
+        raise NotImplementedError
+
+    def print_row(self, row: dict):
+        """Print one row of new_rows() as text."""
+        raise NotImplementedError
+
+    def tail_rows(self, data: dict):
+        """Rows `data` adds to the output, for reports that print the last N.
+
+        With --current --last N such reports read the session backwards from
+        its end until N rows are found. None: the whole session is needed.
+        """
+        return None
+
+    def add_indexed(self, index: 'SessionIndex', session_file: Path, proj_name: str):
+        """Add a session from aggregates over its index rows (reports with from_index).
+
+        The index is brought up to date first, parsing only what was appended;
+        the session's rows are not read back.
+        """
+        raise NotImplementedError
+
+    def print_json(self):
+        print(json.dumps(self.as_json(), indent=2, ensure_ascii=self.ensure_ascii))
+
+
+def _new_permission_stats() -> dict:
+    return {'total': 0, 'success': 0, 'user_rejected': 0,
+            'dcg_blocked': 0, 'error': 0, 'examples': []}
+
+
+class PermissionsReport(Report):
+    """Analyze permission requests (approve/reject/block).
+
+    Bash calls are keyed by their main command (see get_bash_cmd_name), or
+    with --segments under every command of the line: `cd x && npm test | tee
+    log` counts once for cd, npm and tee each.
+    """
+
+    name = 'permissions'
+    title = 'PERMISSIONS'
+    needs = LINE_TOOL_USE | LINE_TOOL_RESULT
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.aggregated = defaultdict(_new_permission_stats)
+        self.total_calls = 0
+        self.results = Counter()  # Per call: keys overlap with --segments
+        self.segments = getattr(args, 'segments', False)
+
+    def add(self, data: dict):
+        super().add(data)
+        for tc in data['tool_calls']:
+            if tc['result_class'] == 'pending':
+                continue  # No result recorded
+
+            tool = tc['tool']
+            if tool == 'Bash' and tc['command'] and self.segments:
+                keys = [f"Bash:{name}"
+                        for name in dict.fromkeys(bash_command_names(tc['command']))] or ['Bash']
+            elif tool == 'Bash' and tc['command']:
+                keys = [f"Bash:{get_bash_cmd_name(tc['command'])}"]
+            else:
+                keys = [tool]
+            self.total_calls += 1
+            rc = tc['result_class']
+            self.results[rc] += 1
+
+            for key in keys:
+                agg = self.aggregated[key]
+                agg['total'] += 1
+                if rc in agg:
+                    agg[rc] += 1
+
+                # Keep rejection examples
+                if rc in ('user_rejected', 'dcg_blocked') and len(agg['examples']) < 3:
+                    example = tc['command'][:80] if tc['command'] else str(tc['input'])[:80]
+                    agg['examples'].append({'class': rc, 'detail': example})
+
+    def merge(self, other: 'Report'):
+        super().merge(other)
+        self.total_calls += other.total_calls
+        self.results.update(other.results)
+        for key, stats in other.aggregated.items():
+            agg = self.aggregated[key]
+            for field in ('total', 'success', 'user_rejected', 'dcg_blocked', 'error'):
+                agg[field] += stats[field]
+            agg['examples'].extend(stats['examples'][:3 - len(agg['examples'])])
+
+    def _items(self) -> list:
+        return sorted(self.aggregated.items(), key=lambda x: x[1]['total'], reverse=True)
+
+    def as_json(self):
+        return {k: {kk: vv for kk, vv in v.items() if kk != 'examples'}
+                for k, v in self._items()}
+
+    def render(self):
+        items = self._items()
+
+        print(f"Sessions analyzed: {self.sessions}")
+        print(f"Total tool calls:  {self.total_calls}")
+        print(f"  Success:         {self.results['success']}")
+        print(f"  User rejected:   {self.results['user_rejected']}")
+        print(f"  DCG blocked:     {self.results['dcg_blocked']}")
+        print(f"  Tool errors:     {self.results['error']}")
+        if self.segments:
+            print("  (Bash calls counted under every command of their line)")
+        print()
+
+        # DCG blocked commands
+        dcg_items = [(k, d) for k, d in items if d['dcg_blocked'] > 0]
+        if dcg_items:
+            print("--- DCG BLOCKED ---")
+            print(f"{'Tool/Command':<40} {'Blocked':>8} {'Total':>8}")
+            print("-" * 58)
+            for key, data in dcg_items:
+                print(f"{key:<40} {data['dcg_blocked']:>8} {data['total']:>8}")
+                for ex in data['examples']:
+                    if ex['class'] == 'dcg_blocked':
+                        print(f"  -> {ex['detail']}")
+            print()
+
+        # User rejected commands
+        rejected_items = [(k, d) for k, d in items if d['user_rejected'] > 0]
+        if rejected_items:
+            print("--- USER REJECTED ---")
+            print(f"{'Tool/Command':<40} {'Rejected':>8} {'Total':>8} {'Rate':>8}")
+            print("-" * 66)
+            for key, data in rejected_items:
+                rate = 100 * data['success'] / data['total'] if data['total'] > 0 else 0
+                print(f"{key:<40} {data['user_rejected']:>8} {data['total']:>8} {rate:>7.0f}%")
+            print()
+
+        # Auto-approve candidates (100% success, no rejections/blocks)
+        candidates = [(k, d) for k, d in items
+                      if d['user_rejected'] == 0 and d['dcg_blocked'] == 0 and d['total'] >= 3]
+        if candidates:
+            print("--- AUTO-APPROVE CANDIDATES (100% success, 3+ calls) ---")
+            print(f"{'Tool/Command':<40} {'Count':>8}")
+            print("-" * 50)
+            for key, data in candidates:
+                print(f"{key:<40} {data['total']:>8}")
+            print()
+
+        # Full table
+        if not self.args.brief:
+            print("--- ALL TOOL CALLS ---")
+            print(f"{'Tool/Command':<35} {'Total':>6} {'OK':>6} {'Reject':>7} "
+                  f"{'DCG':>5} {'Error':>6}")
+            print("-" * 67)
+            for key, data in items:
+                print(f"{key:<35} {data['total']:>6} {data['success']:>6} "
+                      f"{data['user_rejected']:>7} {data['dcg_blocked']:>5} {data['error']:>6}")
+
+
+class ToolsReport(Report):
+    """Tool call frequency overview."""
+
+    name = 'tools'
+    title = 'TOOLS'
+    needs = LINE_TOOL_USE | LINE_TOOL_RESULT
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.tool_counts = Counter()
+        self.tool_duration = Counter()
+        self.tool_timed = Counter()
+
+    def add(self, data: dict):
+        super().add(data)
+        for tc in data['tool_calls']:
+            tool = tc['tool']
+            self.tool_counts[tool] += 1
+            if tc['duration_ms'] is not None:
+                self.tool_duration[tool] += tc['duration_ms']
+                self.tool_timed[tool] += 1
+
+    def merge(self, other: 'Report'):
+        super().merge(other)
+        self.tool_counts.update(other.tool_counts)
+        self.tool_duration.update(other.tool_duration)
+        self.tool_timed.update(other.tool_timed)
+
+    def as_json(self):
+        return dict(self.tool_counts.most_common())
+
+    def render(self):
+        print(f"Sessions analyzed: {self.sessions}")
+        print()
+        print(f"{'Tool':<40} {'Count':>8} {'%':>7} {'Avg time':>9}")
+        print("-" * 67)
+        total = sum(self.tool_counts.values())
+        for tool, count in self.tool_counts.most_common():
+            pct = 100 * count / total if total else 0
+            timed = self.tool_timed[tool]
+            avg = f"{self.tool_duration[tool] / timed / 1000:.1f}s" if timed else '-'
+            print(f"{tool:<40} {count:>8} {pct:>6.1f}% {avg:>9}")
+        print("-" * 67)
+        print(f"{'TOTAL':<40} {total:>8}")
+
+
+class LatencyReport(Report):
+    """Tool call latency (tool_use to result) per tool, Bash command and MCP server."""
+
+    name = 'latency'
+    title = 'LATENCY'
+    needs = LINE_TOOL_USE | LINE_TOOL_RESULT
+    ensure_ascii = False
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.by_tool = defaultdict(list)
+        self.by_bash = defaultdict(list)
+        self.by_mcp = defaultdict(list)
+        self.untimed = 0
+        self.slowest = []  # See _keep_top()
+
+    def add(self, data: dict):
+        super().add(data)
+        tool_filter = (getattr(self.args, 'tool', None) or '').lower()
+        limit = self.args.last or SLOWEST_ROWS
+        session = data['file'].stem[:20]
+        for tc in data['tool_calls']:
+            tool = tc['tool']
+            if tool_filter and tool_filter not in tool.lower():
+                continue
+            duration = tc['duration_ms']
+            if duration is None:
+                self.untimed += 1
+                continue
+            self.by_tool[tool].append(duration)
+            if tool == 'Bash' and tc['command']:
+                self.by_bash[get_bash_cmd_name(tc['command'])].append(duration)
+            elif tool.startswith('mcp__'):
+                self.by_mcp[tool.split('__')[1]].append(duration)
+
+            key = (duration, tc['timestamp'], session, tc['tool_id'])
+            if _is_slowest(self.slowest, limit, key):
+                _keep_top(self.slowest, limit, key, {
+                    'timestamp': tc['timestamp'],
+                    'duration_ms': duration,
+                    'tool': tool,
+                    'detail': (tc['command'] or tc['input'])[:120],
+                    'result_class': tc['result_class'],
+                    'project': data['project'],
+                    'session': session,
+                })
+
+    def merge(self, other: 'Report'):
+        super().merge(other)
+        for mine, theirs in ((self.by_tool, other.by_tool), (self.by_bash, other.by_bash),
+                             (self.by_mcp, other.by_mcp)):
+            for key, durations in theirs.items():
+                mine[key].extend(durations)
+        self.untimed += other.untimed
+        self.slowest = _merge_top(self.slowest, other.slowest,
+                                  self.args.last or SLOWEST_ROWS)
+
+    def _histogram(self) -> list:
+        counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        for durations in self.by_tool.values():
+            for d in durations:
+                counts[bisect.bisect_left(LATENCY_BUCKETS_MS, d)] += 1
+        return [{'upper_ms': upper, 'count': count}
+                for upper, count in zip(LATENCY_BUCKETS_MS + [None], counts)]
+
+    def as_json(self):
+        return {
+            'timed_calls': sum(len(d) for d in self.by_tool.values()),
+            'untimed_calls': self.untimed,
+            'tools': _latency_table(self.by_tool),
+            'bash_commands': _latency_table(self.by_bash),
+            'mcp_servers': _latency_table(self.by_mcp),
+            'histogram': self._histogram(),
+            'slowest': _top_rows(self.slowest),
+        }
+
+    def render(self):
+        timed = sum(len(d) for d in self.by_tool.values())
+        print(f"Sessions analyzed: {self.sessions}")
+        print(f"Timed tool calls:  {timed} ({self.untimed} without result)")
+        print()
+
+        sections = [('BY TOOL', 'Tool', self.by_tool)]
+        if not self.args.brief:
+            sections += [('BY BASH COMMAND', 'Command', self.by_bash),
+                         ('BY MCP SERVER', 'Server', self.by_mcp)]
+        for label, column, groups in sections:
+            if not groups:
+                continue
+            print(f"--- {label} ---")
+            print(f"{column:<32} {'Count':>6} {'Mean':>7} {'p50':>7} {'p90':>7} "
+                  f"{'p99':>7} {'Max':>7} {'Total':>8}")
+            print("-" * 88)
+            for key, st in _latency_table(groups).items():
+                print(f"{key[:32]:<32} {st['count']:>6} {_format_ms(st['mean_ms']):>7} "
+                      f"{_format_ms(st['p50_ms']):>7} {_format_ms(st['p90_ms']):>7} "
+                      f"{_format_ms(st['p99_ms']):>7} {_format_ms(st['max_ms']):>7} "
+                      f"{_format_ms(st['total_ms']):>8}")
+            print()
+
+        if self.args.brief or not timed:
+            return
+
+        print("--- HISTOGRAM ---")
+        histogram = self._histogram()
+        peak = max(b['count'] for b in histogram) or 1
+        for bucket in histogram:
+            upper = bucket['upper_ms']
+            label = f"< {_format_ms(upper)}" if upper is not None else \
+                f">= {_format_ms(LATENCY_BUCKETS_MS[-1])}"
+            bar = '#' * round(40 * bucket['count'] / peak)
+            print(f"{label:>10} {bucket['count']:>7}  {bar}")
+        print()
+
+        rows = _top_rows(self.slowest)
+        print(f"--- SLOWEST CALLS ({len(rows)}) ---")
+        print(f"{'Time':<12} {'Duration':>8}  {'Tool':<30} {'Detail'}")
+        print("-" * 88)
+        for row in rows:
+            detail = row['detail'].replace('\n', ' ')
+            print(f"{_format_time(row['timestamp']):<12} {_format_ms(row['duration_ms']):>8}  "
+                  f"{row['tool'][:30]:<30} {detail[:50]}")
+
+
+def _is_slowest(heap: list, limit: int, key: tuple) -> bool:
+    """Whether an item with this sort key belongs in a bounded slowest-N heap."""
+    return len(heap) < limit or key > heap[0][0]
+
+
+def _keep_top(heap: list, limit: int, key: tuple, row: dict):
+    """Push (key, row) onto a min-heap of the `limit` items with the largest keys.
+
+    Keys start with what is ranked (a duration, a size, a timestamp) and end
+    with identifying fields, so ties are broken the same way in every run and
+    partial reports merge exactly.
+    """
+    if len(heap) < limit:
+        heapq.heappush(heap, (key, row))
+    elif key > heap[0][0]:
+        heapq.heapreplace(heap, (key, row))
+
+
+def _merge_top(heap: list, other: list, limit: int) -> list:
+    merged = heapq.nlargest(limit, heap + other, key=lambda item: item[0])
+    heapq.heapify(merged)
+    return merged
+
+
+def _top_rows(heap: list) -> list:
+    """Rows of a _keep_top() heap, largest key first."""
+    return [row for _, row in sorted(heap, key=lambda item: item[0], reverse=True)]
+
+
+def _latency_table(groups: dict) -> dict:
+    """Latency stats per key, slowest total first."""
+    table = {key: _latency_stats(durations) for key, durations in groups.items()}
+    return dict(sorted(table.items(), key=lambda item: (-item[1]['total_ms'], item[0])))
+
+
+def _latency_stats(durations: list) -> dict:
+    """Count, mean, nearest-rank percentiles and max of durations in ms."""
+    values = sorted(durations)
+    n = len(values)
+
+    def percentile(p):
+        return values[max(0, -(-p * n // 100) - 1)]
+
+    total = sum(values)
+    return {
+        'count': n,
+        'mean_ms': round(total / n),
+        'p50_ms': percentile(50),
+        'p90_ms': percentile(90),
+        'p99_ms': percentile(99),
+        'max_ms': values[-1],
+        'total_ms': total,
+    }
+
+
+class TokensReport(Report):
+    """Token usage and prompt-cache efficiency from message.usage."""
+
+    name = 'tokens'
+    title = 'TOKENS'
+    needs = LINE_TOOL_USE | LINE_OTHER
+    ensure_ascii = False
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.session_rows = []
+        self.by_bucket = defaultdict(Counter)
+        self.by_tool = defaultdict(Counter)
+
+    def add(self, data: dict):
+        super().add(data)
+        bucket = getattr(self.args, 'bucket', None) or 'day'
+        row = Counter()
+        for i, u in enumerate(data['usage']):
+            counts = Counter({key: u[key] for key in USAGE_FIELDS})
+            counts['calls'] = 1
+            if i and _is_cache_rebuild(u):
+                counts['rebuilds'] = 1
+            row.update(counts)
+            self.by_bucket[_time_bucket(u['timestamp'], bucket)].update(counts)
+
+            # Split the message's tokens across the tool calls it made
+            context = u['input_tokens'] + u['cache_read_input_tokens'] + \
+                u['cache_creation_input_tokens']
+            for tool in u['tools']:
+                self.by_tool[tool].update({
+                    'calls': 1,
+                    'context_tokens': context / len(u['tools']),
+                    'output_tokens': u['output_tokens'] / len(u['tools']),
+                })
+        if not row:
+            return
+        row['tool_calls'] = sum(len(u['tools']) for u in data['usage'])
+        self.session_rows.append(dict(row, session=data['file'].stem[:20],
+                                      project=data['project'], start=data['first_ts']))
+
+    def merge(self, other: 'Report'):
+        super().merge(other)
+        self.session_rows.extend(other.session_rows)
+        for mine, theirs in ((self.by_bucket, other.by_bucket), (self.by_tool, other.by_tool)):
+            for key, counts in theirs.items():
+                mine[key].update(counts)
+
+    def _by_project(self) -> dict:
+        projects = defaultdict(Counter)
+        for row in self.session_rows:
+            projects[row['project']].update({key: row.get(key, 0) for key in
+                                             USAGE_FIELDS + ('calls', 'rebuilds', 'tool_calls')})
+        return dict(sorted(projects.items(), key=lambda item: -_total_tokens(item[1])))
+
+    def _low_hit_sessions(self) -> list:
+        return [row for row in self.session_rows
+                if row['calls'] >= CACHE_HIT_WARN_MIN_CALLS
+                and _cache_hit_ratio(row) < CACHE_HIT_WARN_RATIO]
+
+    def as_json(self):
+        def summary(counts):
+            return dict({key: int(counts.get(key, 0)) for key in
+                         USAGE_FIELDS + ('calls', 'rebuilds')},
+                        cache_hit_ratio=round(_cache_hit_ratio(counts), 4))
+
+        totals = Counter()
+        for row in self.session_rows:
+            totals.update({key: row.get(key, 0) for key in USAGE_FIELDS + ('calls', 'rebuilds')})
+        return {
+            'total': summary(totals),
+            'projects': {name: summary(c) for name, c in self._by_project().items()},
+            'buckets': {key: summary(c) for key, c in sorted(self.by_bucket.items())},
+            'tools': {tool: {'calls': c['calls'],
+                             'context_tokens_per_call': round(c['context_tokens'] / c['calls']),
+                             'output_tokens_per_call': round(c['output_tokens'] / c['calls'])}
+                      for tool, c in sorted(self.by_tool.items(),
+                                            key=lambda item: -item[1]['calls'])},
+            'sessions': [dict(summary(row), session=row['session'], project=row['project'],
+                              start=row['start'], tool_calls=row['tool_calls'])
+                         for row in self.session_rows],
+            'low_cache_hit_sessions': [row['session'] for row in self._low_hit_sessions()],
+        }
+
+    def render(self):
+        totals = Counter()
+        for row in self.session_rows:
+            totals.update({key: row.get(key, 0) for key in USAGE_FIELDS + ('calls', 'rebuilds')})
+        print(f"Sessions analyzed: {self.sessions}")
+        print(f"API calls:         {totals['calls']} (deduplicated by message id)")
+        if not totals['calls']:
+            return
+        print()
+        print(f"Input (uncached):  {_format_tokens(totals['input_tokens']):>8}")
+        print(f"Cache read:        {_format_tokens(totals['cache_read_input_tokens']):>8}")
+        print(f"Cache creation:    {_format_tokens(totals['cache_creation_input_tokens']):>8}")
+        print(f"Output:            {_format_tokens(totals['output_tokens']):>8}")
+        print(f"Cache hit ratio:   {100 * _cache_hit_ratio(totals):>7.1f}%")
+        print(f"Cache rebuilds:    {totals['rebuilds']:>8}")
+        print()
+
+        groups = [('BY PROJECT', 'Project', self._by_project())]
+        if not self.args.brief:
+            bucket = (getattr(self.args, 'bucket', None) or 'day').upper()
+            groups.append((f'BY {bucket}', bucket.title(), dict(sorted(self.by_bucket.items()))))
+        for label, column, rows in groups:
+            print(f"--- {label} ---")
+            print(f"{column:<24} {'Calls':>6} {'Input':>8} {'Cache rd':>9} {'Cache wr':>9} "
+                  f"{'Output':>8} {'Hit':>6} {'Rebuilds':>8}")
+            print("-" * 86)
+            for key, c in rows.items():
+                print(f"{key[:24]:<24} {c['calls']:>6} {_format_tokens(c['input_tokens']):>8} "
+                      f"{_format_tokens(c['cache_read_input_tokens']):>9} "
+                      f"{_format_tokens(c['cache_creation_input_tokens']):>9} "
+                      f"{_format_tokens(c['output_tokens']):>8} "
+                      f"{100 * _cache_hit_ratio(c):>5.1f}% {c['rebuilds']:>8}")
+            print()
+
+        if not self.args.brief and self.by_tool:
+            print("--- TOKENS PER TOOL CALL ---")
+            print(f"{'Tool':<32} {'Calls':>6} {'Context/call':>13} {'Output/call':>12}")
+            print("-" * 66)
+            for tool, c in sorted(self.by_tool.items(), key=lambda item: -item[1]['calls']):
+                print(f"{tool[:32]:<32} {c['calls']:>6} "
+                      f"{_format_tokens(c['context_tokens'] / c['calls']):>13} "
+                      f"{_format_tokens(c['output_tokens'] / c['calls']):>12}")
+            print()
+
+        low = self._low_hit_sessions()
+        if low:
+            print(f"--- LOW CACHE HIT SESSIONS (< {CACHE_HIT_WARN_RATIO:.0%}) ---")
+            print(f"{'Session':<22} {'Project':<20} {'Start':<20} {'Calls':>6} "
+                  f"{'Hit':>6} {'Rebuilds':>8}")
+            print("-" * 86)
+            for row in low:
+                print(f"{row['session']:<22} {row['project'][:20]:<20} "
+                      f"{_format_datetime(row['start']):<20} {row['calls']:>6} "
+                      f"{100 * _cache_hit_ratio(row):>5.1f}% {row['rebuilds']:>8}")
+
+
+def _is_cache_rebuild(u: dict) -> bool:
+    """Whether an API call re-created the prompt cache instead of reading it."""
+    created = u['cache_creation_input_tokens']
+    return created >= CACHE_REBUILD_MIN_TOKENS and created > u['cache_read_input_tokens']
+
+
+def _total_tokens(counts) -> int:
+    return sum(counts.get(key, 0) for key in USAGE_FIELDS)
+
+
+def _cache_hit_ratio(counts) -> float:
+    """Share of prompt tokens read from cache."""
+    prompt = (counts.get('input_tokens', 0) + counts.get('cache_read_input_tokens', 0)
+              + counts.get('cache_creation_input_tokens', 0))
+    return counts.get('cache_read_input_tokens', 0) / prompt if prompt else 0.0
+
+
+def _time_bucket(ts: str, bucket: str) -> str:
+    """Local hour, day or ISO week of a timestamp."""
+    dt = _parse_ts(ts)
+    if dt is None:
+        return 'unknown'
+    local = dt.astimezone()
+    if bucket == 'hour':
+        return local.strftime('%Y-%m-%d %H:00')
+    if bucket == 'week':
+        year, week, _ = local.isocalendar()
+        return f"{year}-W{week:02d}"
+    return local.strftime('%Y-%m-%d')
+
+
+class ContextReport(Report):
+    """Context growth by tool result size per tool, Bash command and Read file."""
+
+    name = 'context'
+    title = 'CONTEXT'
+    ensure_ascii = False
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.by_tool = defaultdict(Counter)
+        self.by_bash = defaultdict(Counter)
+        self.by_file = defaultdict(Counter)
+        self.largest = []  # See _keep_top()
+        self.curves = []
+
+    def add(self, data: dict):
+        super().add(data)
+        limit = self.args.last or CONTEXT_TOP_ROWS
+        session = data['file'].stem[:20]
+        for tc in data['tool_calls']:
+            size = tc['result_bytes']
+            if size is None:
+                continue
+            counts = {'calls': 1, 'bytes': size}
+            self.by_tool[tc['tool']].update(counts)
+            if tc['tool'] == 'Bash' and tc['command']:
+                self.by_bash[get_bash_cmd_name(tc['command'])].update(counts)
+            elif tc['tool'] == 'Read' and tc['file_path']:
+                self.by_file[tc['file_path']].update(counts)
+
+            key = (size, tc['timestamp'], session, tc['tool_id'])
+            if _is_slowest(self.largest, limit, key):
+                _keep_top(self.largest, limit, key, {
+                    'timestamp': tc['timestamp'],
+                    'bytes': size,
+                    'tool': tc['tool'],
+                    'detail': tc['command'] or tc['file_path'] or tc['input'][:120],
+                    'project': data['project'],
+                    'session': session,
+                })
+
+        points = context_curve(data)
+        if points:
+            self.curves.append({'session': session, 'project': data['project'],
+                                'points': points})
+
+    def merge(self, other: 'Report'):
+        super().merge(other)
+        for mine, theirs in ((self.by_tool, other.by_tool), (self.by_bash, other.by_bash),
+                             (self.by_file, other.by_file)):
+            for key, counts in theirs.items():
+                mine[key].update(counts)
+        self.largest = _merge_top(self.largest, other.largest,
+                                  self.args.last or CONTEXT_TOP_ROWS)
+        self.curves.extend(other.curves)
+
+    def _top(self, groups: dict) -> dict:
+        rows = sorted(groups.items(), key=lambda item: (-item[1]['bytes'], item[0]))
+        return dict(rows[:self.args.last or CONTEXT_TOP_ROWS])
+
+    def as_json(self):
+        def table(groups):
+            return {key: {'calls': c['calls'], 'bytes': c['bytes'],
+                          'approx_tokens': c['bytes'] // BYTES_PER_TOKEN}
+                    for key, c in self._top(groups).items()}
+
+        total = sum(c['bytes'] for c in self.by_tool.values())
+        return {
+            'results': sum(c['calls'] for c in self.by_tool.values()),
+            'bytes': total,
+            'approx_tokens': total // BYTES_PER_TOKEN,
+            'tools': table(self.by_tool),
+            'bash_commands': table(self.by_bash),
+            'files': table(self.by_file),
+            'largest': _top_rows(self.largest),
+            'curves': self.curves,
+        }
+
+    def render(self):
+        total = sum(c['bytes'] for c in self.by_tool.values())
+        results = sum(c['calls'] for c in self.by_tool.values())
+        print(f"Sessions analyzed: {self.sessions}")
+        print(f"Tool results:      {results}, {_format_bytes(total)} "
+              f"(~{_format_tokens(total / BYTES_PER_TOKEN)} tokens)")
+        print()
+
+        sections = [('BY TOOL', 'Tool', self.by_tool)]
+        if not self.args.brief:
+            sections += [('BY BASH COMMAND', 'Command', self.by_bash),
+                         ('BY FILE (Read)', 'File', self.by_file)]
+        for label, column, groups in sections:
+            if not groups:
+                continue
+            print(f"--- {label} ---")
+            print(f"{column:<40} {'Calls':>6} {'Size':>9} {'~Tokens':>8} {'Share':>7} "
+                  f"{'Avg/call':>9}")
+            print("-" * 84)
+            for key, c in self._top(groups).items():
+                share = 100 * c['bytes'] / total if total else 0
+                name = key if len(key) <= 40 else '...' + key[-37:]
+                print(f"{name:<40} {c['calls']:>6} {_format_bytes(c['bytes']):>9} "
+                      f"{_format_tokens(c['bytes'] / BYTES_PER_TOKEN):>8} {share:>6.1f}% "
+                      f"{_format_bytes(c['bytes'] // c['calls']):>9}")
+            print()
+
+        if self.args.brief:
+            return
+
+        rows = _top_rows(self.largest)
+        print(f"--- LARGEST RESULTS ({len(rows)}) ---")
+        print(f"{'Time':<12} {'Size':>9}  {'Tool':<20} {'Detail'}")
+        print("-" * 84)
+        for row in rows:
+            detail = row['detail'].replace('\n', ' ')
+            print(f"{_format_time(row['timestamp']):<12} {_format_bytes(row['bytes']):>9}  "
+                  f"{row['tool'][:20]:<20} {detail[:40]}")
+
+        for curve in self.curves[:CONTEXT_CURVES]:
+            points = curve['points']
+            if len(points) > CONTEXT_CURVE_ROWS:
+                step = len(points) / CONTEXT_CURVE_ROWS
+                points = [points[int(i * step)] for i in range(CONTEXT_CURVE_ROWS - 1)] + \
+                    [points[-1]]
+            peak = max(p['context_tokens'] for p in points) or 1
+            print()
+            print(f"--- CONTEXT CURVE: {curve['session']} ({curve['project']}) ---")
+            print(f"{'Turn':>5} {'Time':<10} {'Context':>8} {'Results':>9}  (cumulative)")
+            print("-" * 84)
+            for p in points:
+                bar = '#' * round(40 * p['context_tokens'] / peak)
+                print(f"{p['turn']:>5} {_format_time(p['start']):<10} "
+                      f"{_format_tokens(p['context_tokens']):>8} "
+                      f"{_format_bytes(p['result_bytes']):>9}  {bar}")
+
+
+def context_curve(data: dict) -> list:
+    """Context size and cumulative tool result bytes at the end of each turn.
+
+    The context size is the prompt of the turn's last API call (input plus
+    cache read and creation tokens); turns without a call keep the previous
+    size. A drop shows a compaction.
+    """
+    starts = [t['start'] for t in data['turns']]
+    if data['open_turn'] is not None:
+        starts.append(data['open_turn']['start'])
+    if not starts:
+        return []
+    points = [{'turn': i + 1, 'start': start, 'context_tokens': 0, 'result_bytes': 0}
+              for i, start in enumerate(starts)]
+
+    for u in data['usage']:
+        i = bisect.bisect_right(starts, u['timestamp']) - 1
+        if i >= 0:
+            points[i]['context_tokens'] = (u['input_tokens'] + u['cache_read_input_tokens']
+                                           + u['cache_creation_input_tokens'])
+    for tc in data['tool_calls']:
+        i = bisect.bisect_right(starts, tc['timestamp']) - 1
+        if i >= 0 and tc['result_bytes']:
+            points[i]['result_bytes'] += tc['result_bytes']
+
+    context = cumulative = 0
+    for p in points:
+        context = p['context_tokens'] = p['context_tokens'] or context
+        cumulative = p['result_bytes'] = p['result_bytes'] + cumulative
+    return points
+
+
+TURN_COMPONENTS = {
+    'model_ms': 'Model',
+    'tool_ms': 'Tools',
+    'permission_ms': 'Permission',
+    'hook_ms': 'Stop hooks',
+}
+
+
+class TurnsReport(Report):
+    """Turn durations split into model, tool, permission and stop-hook time."""
+
+    name = 'turns'
+    title = 'TURNS'
+    ensure_ascii = False
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.turns = 0
+        self.totals = Counter()
+        self.slowest = []  # See _keep_top()
+
+    def add(self, data: dict):
+        super().add(data)
+        turns = data['turns']
+        if data['open_turn'] is not None:
+            # Still running, or the session ended without a turn_duration entry
+            turns = turns + [dict(turn_breakdown(data['open_turn'], data['tool_calls']),
+                                  in_progress=True)]
+        limit = self.args.last or SLOWEST_ROWS
+        session = data['file'].stem[:20]
+        for turn in turns:
+            self.turns += 1
+            self.totals['duration_ms'] += turn['duration_ms']
+            for component in TURN_COMPONENTS:
+                self.totals[component] += turn[component]
+            key = (turn['duration_ms'], turn['start'], session)
+            if _is_slowest(self.slowest, limit, key):
+                _keep_top(self.slowest, limit, key,
+                          dict(turn, project=data['project'], session=session))
+
+    def merge(self, other: 'Report'):
+        super().merge(other)
+        self.turns += other.turns
+        self.totals.update(other.totals)
+        self.slowest = _merge_top(self.slowest, other.slowest,
+                                  self.args.last or SLOWEST_ROWS)
+
+    def as_json(self):
+        return {
+            'turns': self.turns,
+            'total_ms': self.totals['duration_ms'],
+            'breakdown': {component: self.totals[component] for component in TURN_COMPONENTS},
+            'slowest': _top_rows(self.slowest),
+        }
+
+    def render(self):
+        total = self.totals['duration_ms']
+        print(f"Sessions analyzed: {self.sessions}")
+        if not self.turns:
+            print("Turns:             0")
+            return
+        print(f"Turns:             {self.turns} (avg {_format_ms(round(total / self.turns))}, "
+              f"total {_format_ms(total)})")
+        print()
+
+        print("--- BREAKDOWN ---")
+        print(f"{'Component':<14} {'Total':>9} {'Share':>7} {'Avg/turn':>9}")
+        print("-" * 42)
+        for component, label in TURN_COMPONENTS.items():
+            value = self.totals[component]
+            share = 100 * value / total if total else 0
+            print(f"{label:<14} {_format_ms(value):>9} {share:>6.1f}% "
+                  f"{_format_ms(round(value / self.turns)):>9}")
+        print()
+
+        if self.args.brief:
+            return
+
+        rows = _top_rows(self.slowest)
+        print(f"--- SLOWEST TURNS ({len(rows)}) ---")
+        print(f"{'Time':<12} {'Total':>7} {'Model':>7} {'Tools':>7} {'Perm.':>7} "
+              f"{'Hooks':>7} {'Calls':>5}  {'Prompt'}")
+        print("-" * 90)
+        for row in rows:
+            marker = '*' if row.get('in_progress') else ' '
+            print(f"{_format_time(row['start']):<12}{marker}{_format_ms(row['duration_ms']):>7} "
+                  f"{_format_ms(row['model_ms']):>7} {_format_ms(row['tool_ms']):>7} "
+                  f"{_format_ms(row['permission_ms']):>7} {_format_ms(row['hook_ms']):>7} "
+                  f"{row['tool_calls']:>5}  {row['prompt'][:30]}")
+        if any(row.get('in_progress') for row in rows):
+            print()
+            print("* no turn_duration entry (yet): ends at the last entry")
+
+
+class HooksReport(Report):
+    """Hook runs, errors and added latency from stop hook summaries and hook logs.
+
+    Stop hooks come from `stop_hook_summary` entries; their latency is the time
+    from the entry before the summary to it. PreToolUse runs come from the
+    hook-debug logs of log-hook-input.js, paired with the tool call of the same
+    session and tool that precedes the log line; the delay between the two is
+    the time PreToolUse hooks took to start before the tool could run.
+
+    Hooks of every other event (UserPromptSubmit, PostToolUse, Notification,
+    PermissionRequest, SessionEnd, ...) are counted from the transcript's
+    `hook_progress` entries. Those mark when hooks start, not when they end,
+    so their time is not measured.
+    """
+
+    name = 'hooks'
+    title = 'HOOKS'
+    ensure_ascii = False
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.log_path = Path(getattr(args, 'hook_logs', None) or DEFAULT_HOOK_LOG_PATH)
+        self.hooks = defaultdict(Counter)  # (event, command) -> runs/error_runs/prevented/...
+        self.hook_errors = Counter()
+        self.stop_ms = []
+        self.pre_ms = []
+        self.added_ms = []  # Per turn: stop hook time + PreToolUse delays
+        self.counts = Counter()
+        self.log_errors = set()
+        self.untimed_events = set()  # Events only seen in hook_progress entries
+
+    def add(self, data: dict):
+        super().add(data)
+        for hook in data['hook_events']:
+            duration = hook.get('duration_ms')
+            if duration is not None:
+                self.stop_ms.append(duration)
+            errors = hook['hookErrors']
+            for error in errors:
+                self.hook_errors[str(error).strip().split('\n')[0][:100]] += 1
+            commands = [i.get('command', '') for i in hook['hookInfos']] or ['(unknown)']
+            for command in commands:
+                stats = self.hooks[('Stop', command)]
+                stats['runs'] += 1
+                stats['error_runs'] += bool(errors)
+                stats['prevented'] += bool(hook['preventedContinuation'])
+                if duration is not None:
+                    stats['timed'] += 1
+                    stats['total_ms'] += duration
+
+        for (event, command), runs in data['hook_runs'].items():
+            self.hooks[(event, command)]['runs'] += runs
+            self.untimed_events.add(event)
+
+        delays = self._pre_tool_use_delays(data)
+        self.pre_ms.extend(delay for _, delay in delays)
+
+        turns = data['turns']
+        if data['open_turn'] is not None:
+            turns = turns + [turn_breakdown(data['open_turn'], data['tool_calls'])]
+        starts = [turn['start'] for turn in turns]
+        added = [turn['hook_ms'] for turn in turns]
+        for ts, delay in delays:
+            i = bisect.bisect_right(starts, ts) - 1
+            if i >= 0:
+                added[i] += delay
+        self.added_ms.extend(added)
+        self.counts['turns'] += len(turns)
+        self.counts['turn_ms'] += sum(turn['duration_ms'] for turn in turns)
+
+    def _pre_tool_use_delays(self, data: dict) -> list:
+        """(tool_use timestamp, delay ms) of every hook log line paired with a call."""
+        if not data['first_ts']:
+            return []
+        entries, errors = [], []
+        for log_file in _hook_log_files(self.log_path, data['first_ts'], data['last_ts']):
+            log = read_hook_log(log_file)
+            entries.extend(log['runs'].get(data['file'].stem, ()))
+            errors.extend(e for e in log['errors']
+                          if data['first_ts'] <= e[0] <= data['last_ts'])
+        # Concurrent sessions share the log, a set keeps each error once
+        self.log_errors.update(errors)
+
+        calls = defaultdict(list)
+        for tc in data['tool_calls']:
+            if tc['timestamp']:
+                calls[_hook_log_key(tc['tool'], tc['command'])].append(tc['timestamp'])
+        for timestamps in calls.values():
+            timestamps.sort()
+
+        stats = self.hooks[('PreToolUse', HOOK_LOG_HOOK)]
+        delays = []
+        for ts, tool, command in entries:
+            stats['runs'] += 1
+            timestamps = calls.get(_hook_log_key(tool, command), [])
+            i = bisect.bisect_right(timestamps, ts) - 1
+            delay = _duration_ms(timestamps[i], ts) if i >= 0 else None
+            if delay is None or delay > HOOK_LOG_MATCH_MS:
+                self.counts['unmatched'] += 1
+                continue
+            stats['timed'] += 1
+            stats['total_ms'] += delay
+            delays.append((timestamps[i], delay))
+        self.counts['tool_calls'] += len(data['tool_calls'])
+        return delays
+
+    def merge(self, other: 'Report'):
+        super().merge(other)
+        for key, stats in other.hooks.items():
+            self.hooks[key].update(stats)
+        self.hook_errors.update(other.hook_errors)
+        self.stop_ms.extend(other.stop_ms)
+        self.pre_ms.extend(other.pre_ms)
+        self.added_ms.extend(other.added_ms)
+        self.counts.update(other.counts)
+        self.log_errors |= other.log_errors
+        self.untimed_events |= other.untimed_events
+
+    def _hook_rows(self) -> list:
+        rows = [{'event': event, 'command': command, 'runs': stats['runs'],
+                 'error_runs': stats['error_runs'], 'prevented': stats['prevented'],
+                 'avg_ms': round(stats['total_ms'] / stats['timed']) if stats['timed'] else None}
+                for (event, command), stats in self.hooks.items() if stats['runs']]
+        return sorted(rows, key=lambda row: (-row['runs'], row['event'], row['command']))
+
+    def as_json(self):
+        return {
+            'hooks': self._hook_rows(),
+            'stop_hooks': _latency_stats(self.stop_ms) if self.stop_ms else None,
+            'untimed_events': sorted(self.untimed_events),
+            'pre_tool_use': {
+                'log_path': str(self.log_path),
+                'tool_calls': self.counts['tool_calls'],
+                'matched': len(self.pre_ms),
+                'unmatched': self.counts['unmatched'],
+                'delay': _latency_stats(self.pre_ms) if self.pre_ms else None,
+                'log_errors': len(self.log_errors),
+            },
+            'turns': {
+                'count': self.counts['turns'],
+                'total_ms': self.counts['turn_ms'],
+                'added': _latency_stats(self.added_ms) if self.added_ms else None,
+            },
+            'errors': [{'error': error, 'count': count}
+                       for error, count in sorted(self.hook_errors.items(),
+                                                  key=lambda item: (-item[1], item[0]))],
+        }
+
+    def render(self):
+        print(f"Sessions analyzed: {self.sessions}")
+        rows = self._hook_rows()
+        if not rows:
+            print("No hook runs found (stop hook summaries, hook progress entries or "
+                  "hook-debug logs).")
+            return
+        print()
+
+        print("--- HOOKS ---")
+        print(f"{'Event':<17} {'Runs':>6} {'Errors':>6} {'Prev.':>5} {'Avg':>7}  {'Command'}")
+        print("-" * 96)
+        for row in rows:
+            avg = _format_ms(row['avg_ms']) if row['avg_ms'] is not None else '-'
+            print(f"{row['event'][:17]:<17} {row['runs']:>6} {row['error_runs']:>6} "
+                  f"{row['prevented']:>5} {avg:>7}  {row['command'][-50:]}")
+        print()
+        print("Errors/Prev.: runs whose stop hook summary had errors / prevented continuation")
+        if self.untimed_events:
+            print(f"Not timed:    {', '.join(sorted(self.untimed_events))}")
+            print("              (the transcript marks when their hooks start, not when they end)")
+        print()
+
+        print("--- ADDED LATENCY ---")
+        print(f"{'Source':<22} {'Count':>6} {'Mean':>7} {'p50':>7} {'p90':>7} "
+              f"{'Max':>7} {'Total':>8}")
+        print("-" * 70)
+        for label, values in (('Stop hooks', self.stop_ms),
+                              ('PreToolUse (per call)', self.pre_ms),
+                              ('Per turn', self.added_ms)):
+            if not values:
+                print(f"{label:<22} {0:>6}")
+                continue
+            st = _latency_stats(values)
+            print(f"{label:<22} {st['count']:>6} {_format_ms(st['mean_ms']):>7} "
+                  f"{_format_ms(st['p50_ms']):>7} {_format_ms(st['p90_ms']):>7} "
+                  f"{_format_ms(st['max_ms']):>7} {_format_ms(st['total_ms']):>8}")
+        turn_ms = self.counts['turn_ms']
+        if turn_ms and self.added_ms:
+            print(f"Share of turn time:    {100 * sum(self.added_ms) / turn_ms:.1f}%")
+        matched = len(self.pre_ms)
+        print(f"Hook log:              {matched}/{self.counts['tool_calls']} tool calls paired"
+              f" ({self.counts['unmatched']} unpaired lines, {len(self.log_errors)} errors)"
+              f" in {self.log_path}")
+
+        if self.args.brief or not self.hook_errors:
+            return
+        print()
+        print("--- HOOK ERRORS ---")
+        for error, count in sorted(self.hook_errors.items(),
+                                   key=lambda item: (-item[1], item[0]))[:self.args.last or 10]:
+            print(f"{count:>5}  {error}")
+
+
+_hook_logs = {}  # Parsed hook-debug logs by path, per process (see read_hook_log)
+
+
+def read_hook_log(path: Path) -> dict:
+    """Parse a hook-debug log: PreToolUse runs by session id, and errors.
+
+    Runs are (timestamp, tool, command) tuples; errors (timestamp, message).
+    Parsed logs are kept per process and checked against the file's inode,
+    size and mtime on every call: a log that grew (a serve process outlives
+    many of its writes) is parsed from its last complete line on, a replaced
+    or truncated one again from the start.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return {'runs': defaultdict(list), 'errors': []}
+    log = _hook_logs.get(path)
+    if log is None or log['inode'] != st.st_ino or st.st_size < log['offset']:
+        log = {'inode': st.st_ino, 'size': None, 'mtime_ns': None, 'offset': 0,
+               'runs': defaultdict(list), 'errors': []}
+        _hook_logs[path] = log
+    if (log['size'], log['mtime_ns']) == (st.st_size, st.st_mtime_ns):
+        return log
+
+    runs, errors = log['runs'], log['errors']
+    try:
+        with open(path, 'rb') as f:
+            f.seek(log['offset'])
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Still being written: parsed once complete
+                log['offset'] += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(entry, dict):
+                    continue
+                ts = entry.get('timestamp', '')
+                if entry.get('event') == 'error':
+                    errors.append((ts, str(entry.get('error', ''))))
+                elif entry.get('hook') == HOOK_LOG_HOOK and entry.get('session_id'):
+                    runs[entry['session_id']].append(
+                        (ts, entry.get('tool_name') or '', entry.get('command') or ''))
+    except OSError:
+        return log
+    log.update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+    return log
+
+
+def _hook_log_files(log_path: Path, first_ts: str, last_ts: str) -> list:
+    """Existing hook-debug-YYYY-MM-DD.log files for the UTC days first_ts..last_ts."""
+    start, end = _parse_ts(first_ts), _parse_ts(last_ts or first_ts)
+    if start is None or end is None:
+        return []
+    files = []
+    day = start.astimezone(timezone.utc).date()
+    while day <= end.astimezone(timezone.utc).date():
+        path = log_path / f"hook-debug-{day.isoformat()}.log"
+        if path.is_file():
+            files.append(path)
+        day += timedelta(days=1)
+    return files
+
+
+def _hook_log_key(tool: str, command: str) -> tuple:
+    # The hook logs the first 500 characters of Bash commands
+    return (tool, (command or '')[:500] if tool == 'Bash' else '')
+
+
+class TimelineReport(Report):
+    """Chronological event timeline."""
+
+    name = 'timeline'
+    title = 'TIMELINE'
+    ensure_ascii = False
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.events = []  # Matching events; with --last a heap of the latest N
+        # (see _keep_top), keyed by (timestamp, session, position)
+
+    def add(self, data: dict):
+        events = [e for e in data['events'] if self._matches(e)]
+        if self.args.last:
+            for i, e in enumerate(events):
+                key = (e['timestamp'], self.sessions, i)
+                if _is_slowest(self.events, self.args.last, key):
+                    _keep_top(self.events, self.args.last, key, e)
+        else:
+            self.events.extend(events)
+        super().add(data)
+
+    def merge(self, other: 'Report'):
+        if self.args.last:
+            offset = self.sessions
+            self.events = _merge_top(
+                self.events, [((ts, session + offset, i), e)
+                              for (ts, session, i), e in other.events], self.args.last)
+        else:
+            self.events.extend(other.events)
+        super().merge(other)
+
+    def _selected(self) -> list:
+        if self.args.last:
+            return _top_rows(self.events)[::-1]
+        return sorted(self.events, key=lambda e: e['timestamp'])
+
+    def _matches(self, e: dict) -> bool:
+        event_filter = getattr(self.args, 'filter', None)
+        if not event_filter:
+            return True
+        filter_lower = event_filter.lower()
+        return (filter_lower in e['event'].lower()
+                or filter_lower in e.get('tool', '').lower()
+                or filter_lower in e.get('detail', '').lower())
+
+    def as_json(self):
+        return [e.as_dict() for e in self._selected()]
+
+    def render(self):
+        events = self._selected()
+        print(f"Events: {len(events)}")
+        print()
+        print(f"{'Time':<12} {'Event':<25} {'Tool':<15} {'Detail'}")
+        print("-" * 90)
+        for e in events:
+            self.print_row(e)
+
+    def new_rows(self, data: dict, resolved: list) -> list:
+        return [e.as_dict() for e in sorted((e for e in data['events'] if self._matches(e)),
+                                            key=lambda e: e['timestamp'])]
+
+    def tail_rows(self, data: dict):
+        return sum(1 for e in data['events'] if self._matches(e))
+
+    def print_row(self, e: dict):
+        ts = _format_time(e['timestamp'])
+        event_display = e['event']
+        # Color-code via markers
+        if 'rejected' in event_display or 'blocked' in event_display:
+            event_display = f"[!] {event_display}"
+        elif 'error' in event_display:
+            event_display = f"[E] {event_display}"
+        print(f"{ts:<12} {event_display:<25} {e.get('tool', ''):<15} {e.get('detail', '')[:50]}")
+
+
+ERROR_LABELS = {
+    'dcg_blocked': 'DCG BLOCKED',
+    'user_rejected': 'USER REJECTED',
+    'error': 'TOOL ERRORS',
+}
+
+
+class ErrorsReport(Report):
+    """Extract only errors, rejections, and failures."""
+
+    name = 'errors'
+    title = 'ERRORS'
+    needs = LINE_TOOL_USE | LINE_TOOL_RESULT
+    ensure_ascii = False
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.errors = []
+
+    def add(self, data: dict):
+        super().add(data)
+        self.errors.extend(self._error_rows(data['tool_calls'], data))
+
+    def _error_rows(self, tool_calls: list, data: dict) -> list:
+        rows = []
+        for tc in tool_calls:
+            if tc['result_class'] not in ERROR_LABELS:
+                continue
+            tool = tc['tool']
+            if tool == 'Bash' and tc['command']:
+                tool = f"Bash:{get_bash_cmd_name(tc['command'])}"
+
+            detail = ''
+            if tc['result_class'] == 'dcg_blocked':
+                result_str = tc['result'] if isinstance(tc['result'], str) else ''
+                detail = result_str[:120]
+            elif tc['result_class'] == 'user_rejected':
+                detail = tc['command'][:80] if tc['command'] else str(tc['input'])[:80]
+            elif tc['result_class'] == 'error':
+                result_str = tc['result'] if isinstance(tc['result'], str) else ''
+                detail = result_str[:120]
+
+            rows.append({
+                'timestamp': tc['timestamp'],
+                'tool': tool,
+                'class': tc['result_class'],
+                'kind': tc['result_kind'],
+                'command': tc['command'][:80] if tc['command'] else '',
+                'detail': detail,
+                'project': data['project'],
+                'session': data['file'].stem[:20],
+            })
+        return rows
+
+    def merge(self, other: 'Report'):
+        super().merge(other)
+        self.errors.extend(other.errors)
+
+    def _selected(self) -> list:
+        errors = sorted(self.errors, key=lambda e: e.get('timestamp', ''))
+        if self.args.last:
+            errors = errors[-self.args.last:]
+        return errors
+
+    def as_json(self):
+        return self._selected()
+
+    def render(self):
+        errors = self._selected()
+        print(f"Errors/Rejections: {len(errors)}")
+        print()
+
+        # Group by class
+        by_class = defaultdict(list)
+        for e in errors:
+            by_class[e['class']].append(e)
+
+        for cls, label in ERROR_LABELS.items():
+            items = by_class.get(cls, [])
+            if not items:
+                continue
+            print(f"--- {label} ({len(items)}) ---")
+            kinds = Counter(e['kind'] or '-' for e in items)
+            if set(kinds) != {cls}:
+                print("Classes: " + ', '.join(f"{kind} {n}" for kind, n in kinds.most_common()))
+            print(f"{'Time':<12} {'Tool':<30} {'Detail'}")
+            print("-" * 80)
+            for e in items:
+                ts = _format_time(e['timestamp'])
+                detail = e['command'] if e['command'] else e['detail']
+                print(f"{ts:<12} {e['tool']:<30} {detail[:50]}")
+            print()
+
+    def new_rows(self, data: dict, resolved: list) -> list:
+        return sorted(self._error_rows(resolved + data['tool_calls'], data),
+                      key=lambda e: e.get('timestamp', ''))
+
+    def tail_rows(self, data: dict):
+        return sum(1 for tc in data['tool_calls'] if tc['result_class'] in ERROR_LABELS)
+
+    def print_row(self, e: dict):
+        ts = _format_time(e['timestamp'])
+        detail = e['command'] if e['command'] else e['detail']
+        print(f"{ts:<12} {ERROR_LABELS[e['class']]:<15} {e['tool']:<30} {detail[:50]}")
+
+
+class SummaryReport(Report):
+    """Quick session summary."""
+
+    name = 'summary'
+    title = 'SUMMARY'
+    from_index = True
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.summaries = []
+
+    def add(self, data: dict):
+        super().add(data)
+        tool_calls = data['tool_calls']
+        hook_entries = data['hook_events']
+        self.summaries.append({
+            'session': data['file'].stem,
+            'project': data['project'],
+            'start': data['first_ts'],
+            'end': data['last_ts'],
+            'user_messages': data['user_messages'],
+            'assistant_turns': data['assistant_turns'],
+            'tool_calls': len(tool_calls),
+            'results': dict(Counter(tc['result_class'] for tc in tool_calls)),
+            'turn_durations': list(data['turn_durations']),
+            'hook_events': len(hook_entries),
+            'hook_errors': sum(len(e.get('hookErrors', [])) for e in hook_entries),
+            'top_tools': Counter(tc['tool'] for tc in tool_calls).most_common(10),
+        })
+
+    def add_indexed(self, index: 'SessionIndex', session_file: Path, proj_name: str):
+        data = index.load(session_file, proj_name, read=False)
+        if data is not None:
+            self.add(data)  # Parsed just now (new, grown or reclassified)
+            return
+        with profile_phase('index-read'):
+            counts = index.summary(session_file)
+        self.sessions += 1
+        self.summaries.append({
+            'session': session_file.stem,
+            'project': decode_project_name(proj_name),
+            'start': counts['start'],
+            'end': counts['end'],
+            'user_messages': counts['user_messages'],
+            'assistant_turns': counts['assistant_turns'],
+            'tool_calls': counts['tool_calls'],
+            'results': counts['results'],
+            'turn_durations': counts['turn_durations'],
+            'hook_events': counts['hook_events'],
+            'hook_errors': counts['hook_errors'],
+            'top_tools': counts['top_tools'],
+        })
+
+    def merge(self, other: 'Report'):
+        super().merge(other)
+        self.summaries.extend(other.summaries)
+
+    def as_json(self):
+        return [{k: v for k, v in s.items() if k != 'top_tools'} for s in self.summaries]
+
+    def print_json(self):
+        # One JSON document per session
+        for summary in self.as_json():
+            print(json.dumps(summary, indent=2))
+
+    def render(self):
+        for s in self.summaries:
+            result_counts = s['results']
+            turn_durations = s['turn_durations']
+
+            print(f"Session:  {s['session']}")
+            print(f"Project:  {s['project']}")
+            print(f"Start:    {_format_datetime(s['start'])}")
+            print(f"End:      {_format_datetime(s['end'])}")
+            print(f"Duration: {_format_duration(s['start'], s['end'])}")
+            print()
+            print(f"User messages:    {s['user_messages']}")
+            print(f"Assistant turns:  {s['assistant_turns']}")
+            print(f"Tool calls:       {s['tool_calls']}")
+            print(f"  Success:        {result_counts.get('success', 0)}")
+            print(f"  User rejected:  {result_counts.get('user_rejected', 0)}")
+            print(f"  DCG blocked:    {result_counts.get('dcg_blocked', 0)}")
+            print(f"  Errors:         {result_counts.get('error', 0)}")
+            print(f"  Pending:        {result_counts.get('pending', 0)}")
+            print()
+            if turn_durations:
+                avg = sum(turn_durations) / len(turn_durations)
+                print(f"Turn durations:   {len(turn_durations)} turns, avg {avg/1000:.1f}s")
+            print(f"Hook events:      {s['hook_events']}")
+            if s['hook_errors']:
+                print(f"Hook errors:      {s['hook_errors']}")
+
+            # Top tools
+            print()
+            print("Top tools:")
+            for tool, count in s['top_tools']:
+                print(f"  {tool:<30} {count:>5}")
+            print()
+
+
+class RuleSuggestionsReport(Report):
+    """Allow rules that would have saved the most permission prompts.
+
+    Approved calls (success or error) fill a prefix trie of their permission
+    paths (see permission_paths). Every node whose subtree holds nothing that
+    was rejected or DCG-blocked can become one prefix rule; the shallowest
+    such nodes cover the approved calls with the fewest rules. A rejected
+    command line blames the commands in it that were never approved on their
+    own (all of them if each was). Calls the --settings rules already allow
+    never prompted and are left out. Rules that save fewer than --min-prompts
+    calls are dropped (a compound line needs a rule for each command).
+
+    Not registered in REPORTS: it needs the --settings rules.
+    """
+
+    name = 'suggest-rules'
+    title = 'SUGGESTED RULES'
+    needs = LINE_TOOL_USE | LINE_TOOL_RESULT
+    ensure_ascii = False
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.allowed = PermissionRules(getattr(args, 'allow_rules', ()))
+        self.approved = Counter()  # Paths still asking -> calls
+        self.denied = Counter()    # Paths -> rejected or blocked calls
+        self.already_allowed = 0
+        self.first_ts = self.last_ts = ''
+
+    def add(self, data: dict):
+        super().add(data)
+        for tc in data['tool_calls']:
+            rc = tc['result_class']
+            paths = permission_paths(tc) if rc != 'pending' else ()
+            if not paths:
+                continue
+            ts = tc['timestamp']
+            if ts and (not self.first_ts or ts < self.first_ts):
+                self.first_ts = ts
+            if ts > self.last_ts:
+                self.last_ts = ts
+            if rc in ('user_rejected', 'dcg_blocked'):
+                self.denied[paths] += 1
+                continue
+            asking = tuple(path for path in paths if self.allowed.match(path) is None)
+            if asking:
+                self.approved[asking] += 1
+            else:
+                self.already_allowed += 1
+
+    def merge(self, other: 'Report'):
+        super().merge(other)
+        self.approved.update(other.approved)
+        self.denied.update(other.denied)
+        self.already_allowed += other.already_allowed
+        if other.first_ts and (not self.first_ts or other.first_ts < self.first_ts):
+            self.first_ts = other.first_ts
+        self.last_ts = max(self.last_ts, other.last_ts)
+
+    def _suggest(self) -> tuple:
+        """(rules, saved calls): rules as (path, prefix, saved, paths Counter)."""
+        approved_paths = Counter()
+        for paths, n in self.approved.items():
+            for path in paths:
+                approved_paths[path] += n
+        bad = set()
+        for paths in self.denied:
+            bad.update([path for path in paths if path not in approved_paths] or paths)
+        bad_rules = {key for path in bad for key in rule_keys(path)}  # Rules allowing one
+
+        trie = {}
+        for path, n in approved_paths.items():
+            kids = trie
+            for part in path:
+                node = kids.setdefault(part, [0, {}])
+                kids = node[1]
+            node[0] += n
+
+        candidates = []
+
+        def walk(path, node):
+            calls, kids = node
+            if _may_prefix(path, calls) and (path, True) not in bad_rules:
+                candidates.append((path, True))
+                return
+            if calls and _may_exact(path) and (path, False) not in bad_rules:
+                candidates.append((path, False))
+            for part, kid in kids.items():
+                walk(path + (part,), kid)
+
+        for part, node in trie.items():
+            walk((part,), node)
+
+        # Drop rules saving too few calls until the rest is stable
+        min_prompts = getattr(self.args, 'min_prompts', SUGGEST_MIN_PROMPTS)
+        max_rules = getattr(self.args, 'max_rules', None)
+        while True:
+            saved, rules = self._saved(candidates)
+            keep = sorted((rule for rule in rules if rule[2] >= min_prompts),
+                          key=lambda rule: -rule[2])[:max_rules]
+            if len(keep) == len(candidates):
+                return rules, saved
+            candidates = [(path, prefix) for path, prefix, _, _ in keep]
+
+    def _saved(self, candidates: list) -> tuple:
+        """Calls whose every path one of the candidates covers, in total and per rule."""
+        exact = {path: i for i, (path, prefix) in enumerate(candidates) if not prefix}
+        prefixes = {path: i for i, (path, prefix) in enumerate(candidates) if prefix}
+        per_rule = [0] * len(candidates)
+        examples = [Counter() for _ in candidates]
+        total = 0
+        for paths, n in self.approved.items():
+            covering = []
+            for path in paths:
+                i = exact.get(path)
+                if i is None:
+                    i = next((prefixes[path[:j]] for j in range(1, len(path) + 1)
+                              if path[:j] in prefixes), None)
+                if i is None:
+                    break
+                covering.append(i)
+            else:
+                total += n
+                for i in set(covering):
+                    per_rule[i] += n
+                for path, i in zip(paths, covering):
+                    examples[i][path] += n
+        rules = [(path, prefix, per_rule[i], examples[i])
+                 for i, (path, prefix) in enumerate(candidates)]
+        return total, sorted(rules, key=lambda rule: (-rule[2], format_permission_rule(*rule[:2])))
+
+    def _days(self) -> float:
+        first, last = _parse_ts(self.first_ts), _parse_ts(self.last_ts)
+        if first is None or last is None:
+            return 1.0
+        return max((last - first).total_seconds() / 86400, 1.0)
+
+    def as_json(self):
+        rules, saved = self._suggest()
+        prompts = sum(self.approved.values()) + sum(self.denied.values())
+        weeks = self._days() / 7
+        allow = [format_permission_rule(path, prefix) for path, prefix, _, _ in rules]
+        return {
+            'sessions': self.sessions,
+            'period': {'start': self.first_ts, 'end': self.last_ts,
+                       'days': round(self._days(), 1)},
+            'prompts': prompts,
+            'rejected_or_blocked': sum(self.denied.values()),
+            'already_allowed': self.already_allowed,
+            'settings_rules': len(self.allowed.rules),
+            'saved': saved,
+            'saved_per_week': round(saved / weeks, 1),
+            'rules': [{'rule': rule, 'prompts': n, 'per_week': round(n / weeks, 1),
+                       'examples': [_path_text(path) for path, _ in examples.most_common(3)]}
+                      for rule, (_, _, n, examples) in zip(allow, rules)],
+            'settings': {'permissions': {'allow': allow}},
+        }
+
+    def render(self):
+        output = self.as_json()
+        prompts, saved = output['prompts'], output['saved']
+        print(f"Sessions analyzed:   {self.sessions}")
+        if self.first_ts:
+            print(f"Period:              {_format_datetime(self.first_ts)} .. "
+                  f"{_format_datetime(self.last_ts)} ({output['period']['days']:g} days)")
+        print(f"Permission prompts:  {prompts}")
+        print(f"  Rejected/blocked:  {output['rejected_or_blocked']}")
+        print(f"  Already allowed:   {self.already_allowed} calls "
+              f"({output['settings_rules']} rules in settings)")
+        if self.allowed.unparsed:
+            print(f"  (not understood, ignored: {', '.join(self.allowed.unparsed)})")
+        pct = 100 * saved / prompts if prompts else 0
+        print(f"Suggested rules:     {len(output['rules'])}, saving {saved} prompts "
+              f"({pct:.0f}%), ~{output['saved_per_week']:g} per week")
+        print()
+        if not output['rules']:
+            return
+
+        print(f"{'Rule':<48} {'Prompts':>8} {'/week':>7}  {'Examples'}")
+        print("-" * 100)
+        for rule in output['rules']:
+            examples = ', '.join(' '.join(example.split()) for example in rule['examples'])
+            print(f"{rule['rule']:<48} {rule['prompts']:>8} {rule['per_week']:>7g}  "
+                  f"{examples[:60]}")
+        print()
+        print("settings.json:")
+        print(json.dumps(output['settings'], indent=2, ensure_ascii=False))
+
+
+def _may_prefix(path: tuple, calls: int) -> bool:
+    """Whether a trie node may become a prefix rule (see RuleSuggestionsReport)."""
+    root, depth = path[0], len(path) - 1
+    if root == 'Bash':
+        if depth != 1:
+            return depth > 1
+        name = os.path.basename(path[1])
+        return not (_ENV_ASSIGNMENT.match(path[1]) or name in CODE_RUNNERS
+                    or name in COMMAND_WRAPPERS)
+    if root == 'Edit':
+        return depth >= SUGGEST_MIN_PATH_DEPTH and not calls  # Directories only
+    if root == 'WebFetch':
+        return depth == 1
+    return depth == 0
+
+
+def _may_exact(path: tuple) -> bool:
+    """Whether a trie node may become an exact rule: not a tool whose input is unknown."""
+    return len(path) > 1 or path[0] not in ('Bash', 'Edit', 'WebFetch')
+
+
+# Replay: what changes against the actual results, by actual class and outcome
+REPLAY_CHANGES = {
+    'newly_blocked': ('WOULD BLOCK CALLS THAT RAN', ('success', 'error'), ('block',)),
+    'unblocked': ('NO LONGER BLOCKED (DCG-blocked before)', ('dcg_blocked',), ('allow', 'prompt')),
+    'approves_rejected': ('WOULD AUTO-APPROVE REJECTED CALLS', ('user_rejected',), ('allow',)),
+}
+REPLAY_OUTCOMES = ('allow', 'prompt', 'block')
+
+
+class ReplayReport(Report):
+    """Outcomes a candidate ruleset would have had on the recorded tool calls.
+
+    Every call with a result is decided by the ruleset (see Ruleset.decide)
+    and counted by its actual class (classify_result) and simulated outcome.
+    Calls whose outcome contradicts what happened are listed by tool/command
+    (REPLAY_CHANGES), and every rule gets the number of calls it decided.
+    Whether a successful call had prompted is not recorded, so prompts are
+    only compared as counts.
+
+    Not registered in REPORTS: it needs the ruleset.
+    """
+
+    name = 'replay'
+    title = 'REPLAY'
+    needs = LINE_TOOL_USE | LINE_TOOL_RESULT
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.ruleset = Ruleset(getattr(args, 'ruleset_rules', {}))
+        self.matrix = defaultdict(Counter)  # Actual class -> outcome -> calls
+        self.no_permission = 0
+        self.rule_hits = Counter()
+        self.changes = {change: defaultdict(_new_replay_change) for change in REPLAY_CHANGES}
+
+    def add(self, data: dict):
+        super().add(data)
+        for tc in data['tool_calls']:
+            rc = tc['result_class']
+            if rc == 'pending':
+                continue  # No result recorded
+            outcome, rules = self.ruleset.decide(tc)
+            if outcome is None:
+                self.no_permission += 1
+                continue
+            self.matrix[rc][outcome] += 1
+            self.rule_hits.update(rules)
+            for change, (_, classes, outcomes) in REPLAY_CHANGES.items():
+                if rc in classes and outcome in outcomes:
+                    key = (f"Bash:{get_bash_cmd_name(tc['command'])}"
+                           if tc['tool'] == 'Bash' and tc['command'] else tc['tool'])
+                    stats = self.changes[change][key]
+                    stats['calls'] += 1
+                    detail = ' '.join((tc['command'] or str(tc['input'])).split())[:80]
+                    if (len(stats['examples']) < 3
+                            and all(ex['detail'] != detail for ex in stats['examples'])):
+                        stats['examples'].append({'detail': detail, 'rules': list(rules)})
+
+    def merge(self, other: 'Report'):
+        super().merge(other)
+        for rc, outcomes in other.matrix.items():
+            self.matrix[rc].update(outcomes)
+        self.no_permission += other.no_permission
+        self.rule_hits.update(other.rule_hits)
+        for change, keys in other.changes.items():
+            for key, stats in keys.items():
+                agg = self.changes[change][key]
+                agg['calls'] += stats['calls']
+                for ex in stats['examples']:
+                    if (len(agg['examples']) < 3
+                            and all(e['detail'] != ex['detail'] for e in agg['examples'])):
+                        agg['examples'].append(ex)
+
+    def _rules(self) -> list:
+        rows = [{'kind': kind, 'rule': rule, 'calls': self.rule_hits[rule]}
+                for kind, rules in self.ruleset.kinds.items() for rule in rules.rules]
+        rows += [{'kind': 'dcg', 'rule': pattern, 'calls': self.rule_hits[f"dcg:{pattern}"]}
+                 for pattern, _ in self.ruleset.dcg]
+        return rows
+
+    def as_json(self):
+        outcomes = Counter()
+        for counts in self.matrix.values():
+            outcomes.update(counts)
+        return {
+            'sessions': self.sessions,
+            'tool_calls': sum(outcomes.values()),
+            'no_permission': self.no_permission,
+            'outcomes': {outcome: outcomes[outcome] for outcome in REPLAY_OUTCOMES},
+            'actual': {rc: {outcome: self.matrix[rc][outcome] for outcome in REPLAY_OUTCOMES}
+                       for rc in RESULT_CATEGORIES},
+            'changes': {change: {'calls': sum(s['calls'] for s in keys.values()),
+                                 'by_key': dict(sorted(keys.items(),
+                                                       key=lambda x: -x[1]['calls']))}
+                        for change, keys in self.changes.items()},
+            'rules': self._rules(),
+            'unparsed': [rule for rules in self.ruleset.kinds.values() for rule in rules.unparsed],
+        }
+
+    def render(self):
+        output = self.as_json()
+        outcomes = output['outcomes']
+        print(f"Sessions analyzed:    {self.sessions}")
+        print(f"Tool calls replayed:  {output['tool_calls']} "
+              f"({self.no_permission} more need no permission)")
+        print(f"  Would allow:        {outcomes['allow']}")
+        print(f"  Would prompt:       {outcomes['prompt']}")
+        print(f"  Would block:        {outcomes['block']}")
+        print()
+        print(f"{'Actual class':<16} {'Allow':>8} {'Prompt':>8} {'Block':>8} {'Total':>8}")
+        print("-" * 52)
+        for rc, counts in output['actual'].items():
+            print(f"{rc:<16} {counts['allow']:>8} {counts['prompt']:>8} {counts['block']:>8} "
+                  f"{sum(counts.values()):>8}")
+        print()
+
+        for change, (title, _, _) in REPLAY_CHANGES.items():
+            found = output['changes'][change]
+            if not found['calls']:
+                continue
+            print(f"--- {title}: {found['calls']} ---")
+            print(f"{'Tool/Command':<40} {'Calls':>8}")
+            print("-" * 50)
+            for key, stats in found['by_key'].items():
+                print(f"{key:<40} {stats['calls']:>8}")
+                for ex in stats['examples']:
+                    rules = f"  [{', '.join(ex['rules'])}]" if ex['rules'] else ''
+                    print(f"  -> {ex['detail']}{rules}")
+            print()
+
+        if output['unparsed']:
+            print(f"Not understood, ignored: {', '.join(output['unparsed'])}")
+            print()
+        if not self.args.brief and output['rules']:
+            print("--- RULES ---")
+            print(f"{'Kind':<6} {'Rule':<60} {'Calls':>8}")
+            print("-" * 76)
+            for row in output['rules']:
+                print(f"{row['kind']:<6} {row['rule']:<60} {row['calls']:>8}")
+
+
+def _new_replay_change() -> dict:
+    return {'calls': 0, 'examples': []}
+
+
+# Registered reports, in `all` output order
+REPORTS = {report.name: report for report in (
+    SummaryReport, PermissionsReport, ToolsReport, LatencyReport, TurnsReport,
+    HooksReport, TokensReport, ContextReport, ErrorsReport, TimelineReport,
+)}
+
+
+def run_reports(report_classes: list, sessions: list, args) -> list:
+    """Feed every session once to all reports, return the filled reports.
+
+    With more than one job, consecutive chunks of sessions are aggregated in
+    worker processes and the partial reports merged back in chunk order.
+    """
+    jobs = min(args.jobs or os.cpu_count() or 1, len(sessions))
+    if jobs <= 1 or len(sessions) < PARALLEL_MIN_SESSIONS:
+        return _aggregate_chunk(report_classes, sessions, args)
+
+    # Several chunks per worker keep the pool busy when session sizes differ
+    chunk_size = max(1, -(-len(sessions) // (jobs * 4)))
+    chunks = [sessions[i:i + chunk_size] for i in range(0, len(sessions), chunk_size)]
+
+    import multiprocessing  # Only needed here: worker processes
+    with multiprocessing.Pool(jobs) as pool:
+        partials = pool.starmap(_aggregate_worker,
+                                [(report_classes, chunk, args) for chunk in chunks])
+
+    reports = partials[0][0]
+    with profile_phase('aggregate'):
+        for partial, _ in partials[1:]:
+            for report, other in zip(reports, partial):
+                report.merge(other)
+    if _profiler is not None:
+        for _, profiler in partials:
+            _profiler.merge(profiler)
+    return reports
+
+
+def _aggregate_chunk(report_classes: list, sessions: list, args) -> list:
+    """Fill fresh reports from a list of sessions (runs in workers too)."""
+    set_json_decoder(args.json_decoder)
+    set_classify_rules(args.classify_rules)
+    reports = [cls(args) for cls in report_classes]
+    kinds = 0
+    for cls in report_classes:
+        kinds |= cls.needs
+    for data in iter_session_data(sessions, args, kinds):
+        with profile_phase('aggregate'):
+            for report in reports:
+                report.add(data)
+    return reports
+
+
+def _aggregate_worker(report_classes: list, sessions: list, args) -> tuple:
+    """_aggregate_chunk in a pool worker: the reports and the worker's profile."""
+    set_profiler(Profiler() if args.profile or args.profile_json else None)
+    return _aggregate_chunk(report_classes, sessions, args), _profiler
+
+
+def run_single_report(name: str, sessions: list, args):
+    """Run one registered report and print it as text or JSON.
+
+    --current --last N without a time range reads only the end of the
+    session for reports that support it (see Report.tail_rows). A few
+    sessions without a time range are added from index aggregates for
+    reports that support it (see Report.add_indexed).
+    """
+    report = REPORTS[name](args)
+    tail = (args.current and args.last and not (args.since or args.until)
+            and report.tail_rows(new_session_data()) is not None)
+    indexed = (report.from_index and not (args.since or args.until)
+               and len(sessions) < PARALLEL_MIN_SESSIONS and _session_cache is None)
+    if tail:
+        set_json_decoder(args.json_decoder)
+        _, session_file, proj_name = sessions[0]
+        report.add(load_session_tail(session_file, proj_name, report.needs,
+                                     lambda data: report.tail_rows(data) >= args.last))
+    elif not (indexed and add_from_index(report, sessions, args)):
+        report, = run_reports([REPORTS[name]], sessions, args)
+    with profile_phase('render'):
+        if args.json:
+            report.print_json()
+        else:
+            report.render()
+
+
+def add_from_index(report: Report, sessions: list, args) -> bool:
+    """Add sessions to a from_index report; False if the index is unavailable or fails.
+
+    After a failure the report is incomplete and has to be filled again.
+    """
+    index = open_index(args)
+    if index is None:
+        return False
+    try:
+        for _, session_file, proj_name in sessions:
+            report.add_indexed(index, session_file, proj_name)
+        return True
+    except Exception as e:
+        print(f"Warning: index lookup failed ({e})", file=sys.stderr)
+        return False
+    finally:
+        index.close()
+
+
+# === Follow Mode ===
+
+class SessionFollower:
+    """Tail session files for --follow.
+
+    Every followed file stays open; a poll reads only the bytes appended since
+    the previous one and feeds complete lines to the file's scanner, a partial
+    last line waits in a buffer. A file whose inode changed or that shrank was
+    replaced and is read again from the start. Project directories in
+    `watch_dirs` are re-listed when their mtime changes, and session files that
+    appear there are followed from their first line.
+    """
+
+    def __init__(self, sessions: list, kinds: int = LINE_ALL, watch_dirs=()):
+        self.kinds = kinds
+        self.files = {}
+        self.seen = set()
+        self.watch_dirs = dict.fromkeys(str(d) for d in watch_dirs)
+        for _, session_file, proj_name in sessions:
+            self._add(str(session_file), proj_name)
+        self._check_dirs(add_new=False)
+
+    def _add(self, path: str, proj_name: str):
+        self.seen.add(path)
+        self.files[path] = {'project': proj_name, 'file': None, 'inode': None,
+                            'offset': 0, 'buffer': b'', 'scanner': None, 'pending': []}
+
+    def _check_dirs(self, add_new: bool = True):
+        for proj_dir, mtime_ns in self.watch_dirs.items():
+            try:
+                current = os.stat(proj_dir).st_mtime_ns
+            except FileNotFoundError:
+                continue
+            if current == mtime_ns:
+                continue
+            self.watch_dirs[proj_dir] = current
+            for _, path in _list_session_files(proj_dir):
+                if path in self.seen:
+                    continue
+                if add_new:
+                    self._add(path, os.path.basename(proj_dir))
+                else:
+                    self.seen.add(path)  # Existing, not selected
+
+    def close(self):
+        for state in self.files.values():
+            if state['file'] is not None:
+                state['file'].close()
+
+    def poll(self) -> list:
+        """(data, resolved) for every file with new entries since the last poll.
+
+        `data` only holds what this poll extracted (tool calls, events, hook
+        events, turns, usage); `resolved` are tool calls of earlier polls whose
+        result arrived in this one. Nothing accumulates across polls.
+        """
+        self._check_dirs()
+        updates = []
+        for path, state in self.files.items():
+            if self._read(path, state):
+                updates.append(self._take(state))
+        return updates
+
+    def _read(self, path: str, state: dict) -> bool:
+        """Feed appended complete lines of one file, True if any were decoded."""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return False  # Moved away: wait for a replacement
+        if state['file'] is not None and (st.st_ino != state['inode']
+                                          or st.st_size < state['offset']):
+            state['file'].close()  # Replaced or truncated: start over
+            state['file'] = None
+        if state['file'] is None:
+            try:
+                f = open(path, 'rb')
+            except OSError:
+                return False
+            state.update(file=f, inode=os.fstat(f.fileno()).st_ino, offset=0, buffer=b'',
+                         scanner=SessionScanner(new_session_data(Path(path), state['project'])),
+                         pending=[])
+        if st.st_size <= state['offset']:
+            return False
+
+        f, scanner, kinds = state['file'], state['scanner'], self.kinds
+        fed = False
+        f.seek(state['offset'])
+        while True:
+            chunk = f.read(FOLLOW_READ_BYTES)
+            if not chunk:
+                break
+            state['offset'] += len(chunk)
+            lines = (state['buffer'] + chunk).split(b'\n')
+            state['buffer'] = lines.pop()
+            for line in lines:
+                if kinds != LINE_ALL and not classify_line(line, kinds):
+                    continue
+                entry = _decode_line(line)
+                if entry is not None:
+                    scanner.feed(entry)
+                    fed = True
+        return fed
+
+    def _take(self, state: dict) -> tuple:
+        """Hand out what the scanner extracted and start fresh lists."""
+        data = state['scanner'].data
+        resolved = [tc for tc in state['pending'] if tc['result_class'] != 'pending']
+        state['pending'] = [tc for tc in state['pending'] + data['tool_calls']
+                            if tc['result_class'] == 'pending']
+        snapshot = dict(data)
+        state['scanner'].trim_usage()
+        for key in ('tool_calls', 'events', 'hook_events', 'turn_durations', 'turns',
+                    'usage', 'texts'):
+            data[key] = []
+        data['hook_runs'] = Counter()
+        return snapshot, resolved
+
+
+def follow_report(name: str, sessions: list, args):
+    """Print a report, then keep printing rows for entries as they are appended."""
+    report = REPORTS[name](args)
+    watch_dirs = set() if args.session else {f.parent for _, f, _ in sessions}
+    follower = SessionFollower(sessions, report.needs, watch_dirs)
+    try:
+        for data, _ in follower.poll():
+            report.add(data)
+        if args.json:
+            for row in report.as_json():
+                print(json.dumps(row, ensure_ascii=report.ensure_ascii))
+        else:
+            report.render()
+        print(f"[following {len(follower.files)} session(s), Ctrl-C to stop]",
+              file=sys.stderr)
+        sys.stdout.flush()
+
+        while True:
+            time.sleep(FOLLOW_INTERVAL)
+            for data, resolved in follower.poll():
+                for row in report.new_rows(data, resolved):
+                    if args.json:
+                        print(json.dumps(row, ensure_ascii=report.ensure_ascii))
+                    else:
+                        report.print_row(row)
+            sys.stdout.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        follower.close()
+
+
+# === Export ===
+
+# Columns of the exported tables; rows are keyed by session (+ seq)
+EXPORT_TABLES = {
+    'sessions': ('session', 'project', 'path', 'first_ts', 'last_ts',
+                 'user_messages', 'assistant_turns', 'tool_calls'),
+    'turns': ('session', 'seq') + TURN_FIELDS,
+    'tool_calls': ('session', 'seq', 'tool_id', 'timestamp', 'tool', 'bash_command',
+                   'command', 'file_path', 'input'),
+    'results': ('session', 'seq', 'result_class', 'result_kind', 'duration_ms',
+                'result_bytes', 'result'),
+    'hook_events': ('session', 'seq', 'timestamp', 'hook_count', 'commands', 'errors',
+                    'prevented', 'duration_ms'),
+    'usage': ('session', 'seq', 'message_id', 'timestamp') + USAGE_FIELDS + ('tools',),
+}
+
+# Bump when exported columns or how they are derived change: the next export
+# starts over.
+EXPORT_VERSION = 3
+
+
+def export_rows(data: dict, state: dict) -> dict:
+    """Rows per export table that one session adds since its last export.
+
+    `state` records what earlier runs exported (row counts, calls still
+    waiting for their result, the last usage record) and is updated in place.
+    Tool calls are written once; their result goes to `results` when it
+    arrives. The sessions row and the last usage record can change while a
+    session grows and are written again then.
+    """
+    session = data['file'].stem
+    tool_calls = data['tool_calls']
+    rows = {'sessions': [(session, data['project'], str(data['file']),
+                          data['first_ts'], data['last_ts'], data['user_messages'],
+                          data['assistant_turns'], len(tool_calls))]}
+
+    known = state.get('tool_calls', 0)
+    rows['tool_calls'] = [
+        (session, seq, tc['tool_id'], tc['timestamp'], tc['tool'],
+         get_bash_cmd_name(tc['command']) if tc['command'] else None,
+         tc['command'], tc['file_path'], str(tc['input']))
+        for seq, tc in enumerate(tool_calls[known:], known)]
+    rows['results'], pending = [], []
+    for seq in state.get('pending', []) + list(range(known, len(tool_calls))):
+        tc = tool_calls[seq]
+        if tc['result_class'] == 'pending':
+            pending.append(seq)
+            continue
+        rows['results'].append(
+            (session, seq, tc['result_class'], tc['result_kind'], tc['duration_ms'],
+             tc['result_bytes'], tc['result'] if isinstance(tc['result'], str) else None))
+
+    known_turns = state.get('turns', 0)
+    rows['turns'] = [(session, seq) + tuple(t[field] for field in TURN_FIELDS)
+                     for seq, t in enumerate(data['turns'][known_turns:], known_turns)]
+
+    known_hooks = state.get('hook_events', 0)
+    rows['hook_events'] = [
+        (session, seq, h['timestamp'], h['hookCount'],
+         [i.get('command', '') for i in h['hookInfos']], h['hookErrors'],
+         bool(h['preventedContinuation']), h['duration_ms'])
+        for seq, h in enumerate(data['hook_events'][known_hooks:], known_hooks)]
+
+    usage = [(session, seq, u['message_id'], u['timestamp'])
+             + tuple(u[field] for field in USAGE_FIELDS) + (u['tools'],)
+             for seq, u in enumerate(data['usage'])]
+    first = state.get('usage', 0)
+    if first and json.dumps(usage[first - 1]) != state.get('usage_last'):
+        first -= 1  # The last exported message gained entries
+    rows['usage'] = usage[first:]
+
+    state.update(tool_calls=len(tool_calls), pending=pending, turns=len(data['turns']),
+                 hook_events=len(data['hook_events']), usage=len(usage),
+                 usage_last=json.dumps(usage[-1]) if usage else None)
+    return rows
+
+
+class SQLiteExport:
+    """Export target: one SQLite table per export table, written in one transaction."""
+
+    append_only = False
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(path))
+        if self.conn.execute('PRAGMA user_version').fetchone()[0] != EXPORT_VERSION:
+            for table in list(EXPORT_TABLES) + ['export_state']:
+                self.conn.execute(f'DROP TABLE IF EXISTS {table}')
+            for table, columns in EXPORT_TABLES.items():
+                key = 'session' if table == 'sessions' else 'session, seq'
+                self.conn.execute(f"CREATE TABLE {table} ({', '.join(columns)}, "
+                                  f"PRIMARY KEY ({key}))")
+            self.conn.execute('CREATE TABLE export_state (path TEXT PRIMARY KEY, '
+                              'state TEXT NOT NULL)')
+            self.conn.execute(f'PRAGMA user_version = {EXPORT_VERSION}')
+        self.conn.execute('BEGIN')
+
+    def load_state(self) -> dict:
+        return {path: json.loads(state)
+                for path, state in self.conn.execute('SELECT path, state FROM export_state')}
+
+    def drop(self, session: str):
+        for table in EXPORT_TABLES:
+            self.conn.execute(f'DELETE FROM {table} WHERE session = ?', (session,))
+
+    def write(self, rows: dict):
+        for table, table_rows in rows.items():
+            if table_rows:
+                marks = ', '.join('?' * len(EXPORT_TABLES[table]))
+                self.conn.executemany(
+                    f'INSERT OR REPLACE INTO {table} VALUES ({marks})',
+                    [tuple(json.dumps(v) if isinstance(v, list) else v for v in row)
+                     for row in table_rows])
+
+    def close(self, states: dict):
+        self.conn.executemany('INSERT OR REPLACE INTO export_state VALUES (?, ?)',
+                              [(path, json.dumps(state)) for path, state in states.items()])
+        self.conn.commit()
+        self.conn.close()
+
+
+class NDJSONExport:
+    """Export target: a directory with one <table>.ndjson file per export table.
+
+    Files are only appended to. A rewritten sessions row or usage record is
+    appended again: per key (session, seq) the last line wins. State is kept
+    in export-state.json; without it (or after a replaced session) the
+    export starts over.
+    """
+
+    append_only = True
+
+    def __init__(self, path: Path):
+        path.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.state_file = path / 'export-state.json'
+        self.files = {}
+
+    def load_state(self) -> dict:
+        try:
+            state = json.loads(self.state_file.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            state = {}
+        if state.get('version') != EXPORT_VERSION:
+            self.reset()
+            return {}
+        return state['sessions']
+
+    def reset(self):
+        """Truncate all table files (start over)."""
+        for f in self.files.values():
+            f.close()
+        self.files = {table: open(self.path / f'{table}.ndjson', 'w', encoding='utf-8')
+                      for table in EXPORT_TABLES}
+
+    def write(self, rows: dict):
+        if not self.files:
+            self.files = {table: open(self.path / f'{table}.ndjson', 'a', encoding='utf-8')
+                          for table in EXPORT_TABLES}
+        for table, table_rows in rows.items():
+            columns = EXPORT_TABLES[table]
+            self.files[table].writelines(
+                json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n'
+                for row in table_rows)
+
+    def close(self, states: dict):
+        for f in self.files.values():
+            f.close()
+        tmp = self.state_file.with_suffix('.tmp')
+        tmp.write_text(json.dumps({'version': EXPORT_VERSION, 'sessions': states}),
+                       encoding='utf-8')
+        os.replace(tmp, self.state_file)
+
+
+EXPORT_FORMATS = {'sqlite': SQLiteExport, 'ndjson': NDJSONExport}
+
+
+def export_sessions(sessions: list, args, target) -> tuple:
+    """Export what changed in the given sessions since the last run.
+
+    Returns (sessions exported, rows per table, whether an append-only
+    export had to start over).
+    """
+    states = target.load_state()
+    changed, replaced = [], []
+    for session in sessions:
+        path = str(session[1])
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        state = states.get(path)
+        if state is None:
+            changed.append(session)
+        elif (state['size'], state['mtime_ns']) != (st.st_size, st.st_mtime_ns):
+            if state['inode'] != st.st_ino or st.st_size < state['size']:
+                replaced.append(session)
+            changed.append(session)
+
+    restarted = bool(replaced) and target.append_only
+    if restarted:
+        # Rows of a replaced session cannot be taken back from append-only files
+        target.reset()
+        states, changed = {}, list(sessions)
+    else:
+        for _, session_file, _ in replaced:
+            target.drop(session_file.stem)
+            del states[str(session_file)]
+
+    exported, counts = 0, Counter()
+    index = open_index(args)
+    # Whole sessions: --since/--until only select which sessions are exported
+    for _, session_file, proj_name in changed:
+        try:
+            st = session_file.stat()
+        except FileNotFoundError:
+            continue
+        data, offset = load_session_offset(session_file, proj_name, index)
+        state = states.setdefault(str(session_file), {})
+        rows = export_rows(data, state)
+        # The bytes actually exported and the stat from before reading: lines
+        # appended meanwhile (or an unfinished last line) make the next run look
+        state.update(size=offset, mtime_ns=st.st_mtime_ns, inode=st.st_ino)
+        target.write(rows)
+        exported += 1
+        for table, table_rows in rows.items():
+            counts[table] += len(table_rows)
+    if index is not None:
+        index.close()
+    target.close(states)
+    return exported, counts, restarted
+
+
+# === Server ===
+
+_session_cache = None  # Sessions kept in memory by a serve process (see set_session_cache)
+
+
+def set_session_cache(cache):
+    """Load sessions through an in-memory SessionCache (None: index or files)."""
+    global _session_cache
+    _session_cache = cache
+
+
+class SessionCache:
+    """Extracted session data kept in memory by a serve process.
+
+    Every lookup stats the file, like the index: unchanged sessions are
+    returned as they are, appended ones only parse the new bytes on top of the
+    cached data, replaced or truncated ones (or ones classified with other
+    rules) are loaded again. Beyond `limit` sessions the least recently used
+    are dropped. Sessions are always extracted in full, for any report.
+    """
+
+    def __init__(self, limit: int = SERVE_CACHE_SESSIONS):
+        self.limit = limit
+        self.sessions = OrderedDict()  # path -> stat, offset, rules and data
+
+    def load(self, session_file: Path, proj_name: str, index: SessionIndex = None) -> dict:
+        key = str(session_file)
+        st = session_file.stat()
+        rules = get_classifier().fingerprint
+        entry = self.sessions.get(key)
+        if (entry is not None and entry['rules'] == rules and entry['inode'] == st.st_ino
+                and st.st_size >= entry['offset']):
+            self.sessions.move_to_end(key)
+            if (entry['size'], entry['mtime_ns']) != (st.st_size, st.st_mtime_ns):
+                reader = SessionReader(session_file, entry['offset'])
+                scan_session(SessionScanner(entry['data']), reader)
+                entry.update(size=st.st_size, mtime_ns=st.st_mtime_ns, offset=reader.offset)
+            return entry['data']
+
+        data, offset = load_session_offset(session_file, proj_name, index)
+        # The stat from before loading: if the file grew meanwhile, the next
+        # lookup sees the change and resumes at the loaded offset
+        self.sessions[key] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                              'inode': st.st_ino, 'offset': offset, 'rules': rules,
+                              'data': data}
+        self.sessions.move_to_end(key)
+        while len(self.sessions) > self.limit:
+            self.sessions.popitem(last=False)
+        return data
+
+
+class InspectorServer:
+    """Answers command lines sent over a Unix socket, one at a time.
+
+    A request is a client's argv, working directory and SERVE_ENV variables
+    (JSON). The response is a JSON header line with the exit status and the
+    lengths of what the command wrote to stdout and stderr, in order, followed
+    by that output as UTF-8.
+    Commands run in this process on the SessionCache, so repeated questions
+    skip interpreter startup and parsing of unchanged sessions.
+    """
+
+    def __init__(self, path: Path, idle_timeout: float):
+        self.path = path
+        self.idle_timeout = idle_timeout
+        self.parser = build_parser()
+        self.version = _script_version()
+        self.stopping = False
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.is_socket():
+            path.unlink()  # Left behind by a process that is gone (see cmd_serve)
+        import socket  # Only needed by serve and its clients
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o077)  # Only this user may connect
+        try:
+            self.listener.bind(str(path))
+        finally:
+            os.umask(umask)
+        self.listener.listen(32)
+        self.listener.settimeout(SERVE_POLL_INTERVAL)
+
+    def serve(self):
+        """Answer requests until stopped or idle for longer than idle_timeout."""
+        import socket
+        set_session_cache(SessionCache())
+        last = time.monotonic()
+        try:
+            while not self.stopping:
+                try:
+                    conn, _ = self.listener.accept()
+                except socket.timeout:
+                    if self.idle_timeout and time.monotonic() - last > self.idle_timeout:
+                        break
+                    continue
+                with conn:
+                    try:
+                        conn.settimeout(SERVE_READ_TIMEOUT)
+                        request = json.loads(_recv_all(conn))
+                        conn.settimeout(None)
+                        header, output = self.answer(request)
+                        conn.sendall(json.dumps(header).encode() + b'\n' + output)
+                    except (OSError, ValueError):
+                        pass  # Client went away or sent garbage
+                last = time.monotonic()
+        finally:
+            self.listener.close()
+            if self.path.is_socket():
+                self.path.unlink()
+
+    def answer(self, request: dict) -> tuple:
+        """The response header and output bytes for one request."""
+        if request.get('ping'):
+            return {'pid': os.getpid()}, b''
+        if request.get('stop'):
+            self.stopping = True
+            return {'stopped': os.getpid()}, b''
+        if request.get('version') != self.version:
+            # The script changed since this process started: the client runs it
+            self.stopping = True
+            return {'stale': True}, b''
+
+        output, status = [], 0
+        cwd = os.getcwd()
+        saved_env = {name: os.environ.get(name) for name in SERVE_ENV}
+        with contextlib.redirect_stdout(_Capture('stdout', output)), \
+                contextlib.redirect_stderr(_Capture('stderr', output)):
+            try:
+                os.chdir(request['cwd'])
+                _set_environ(request.get('env', {}))
+                args = self.parser.parse_args(request['argv'])
+                args.jobs = 1  # Pool workers would not share the cache
+                run(args)
+            except SystemExit as e:
+                if isinstance(e.code, str):
+                    print(e.code, file=sys.stderr)
+                status = e.code if isinstance(e.code, int) else int(e.code is not None)
+            except Exception:
+                import traceback  # Only needed here
+                traceback.print_exc()
+                status = 1
+            finally:
+                os.chdir(cwd)
+                _set_environ(saved_env)
+        chunks = [(stream, ''.join(parts).encode('utf-8', 'surrogateescape'))
+                  for stream, parts in output]
+        return ({'status': status, 'output': [(stream, len(data)) for stream, data in chunks]},
+                b''.join(data for _, data in chunks))
+
+
+def _set_environ(values: dict):
+    """Set the SERVE_ENV variables to `values` (unset where missing or None)."""
+    for name in SERVE_ENV:
+        if values.get(name) is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = values[name]
+
+
+class _Capture:
+    """Stream replacement recording what a served command writes, in order."""
+
+    def __init__(self, stream: str, output: list):
+        self.stream = stream
+        self.output = output  # [stream, [texts]] runs, shared by stdout and stderr
+
+    def write(self, text: str) -> int:
+        if not self.output or self.output[-1][0] != self.stream:
+            self.output.append((self.stream, []))
+        self.output[-1][1].append(text)
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def query_server(args, argv: list) -> bool:
+    """Run a command line in the serve process on --socket, if one listens.
+
+    Returns False when the command has to run here instead: no process
+    listens, it reads stdin, follows sessions or bypasses caches (--no-cache),
+    or the serve process runs an older version of this script.
+    """
+    if (args.no_server or args.no_cache or getattr(args, 'follow', False)
+            or (args.command == 'classify' and '-' in args.text)
+            or not os.path.exists(args.socket)):
+        return False
+    response = _send_request(args.socket, {
+        'argv': argv, 'cwd': os.getcwd(), 'version': _script_version(),
+        'env': {name: os.environ.get(name) for name in SERVE_ENV}})
+    if response is None or response[0].get('stale'):
+        return False
+    header, output = response
+    start = 0
+    for stream, size in header['output']:
+        out = sys.stdout if stream == 'stdout' else sys.stderr
+        out.write(output[start:start + size].decode('utf-8', 'surrogateescape'))
+        out.flush()
+        start += size
+    if header['status']:
+        sys.exit(header['status'])
+    return True
+
+
+def _send_request(path: Path, request: dict):
+    """(header, output bytes) from the serve process on `path`, None if none answers."""
+    import socket
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    with sock:
+        try:
+            sock.connect(str(path))
+            sock.sendall(json.dumps(request).encode())
+            sock.shutdown(socket.SHUT_WR)
+            response = _recv_all(sock)
+        except OSError:
+            return None
+    if not response:
+        return None
+    header, _, output = response.partition(b'\n')
+    return json.loads(header), output
+
+
+def _recv_all(sock) -> bytes:
+    chunks = []
+    while True:
+        chunk = sock.recv(1 << 16)
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
+
+
+def _script_version() -> int:
+    """Changes whenever this file is edited: a serve process must not outlive it."""
+    return Path(__file__).stat().st_mtime_ns
+
+
+# === Subcommands ===
+
+def cmd_summary(sessions: list, args):
+    """Quick session summary."""
+    run_single_report('summary', sessions, args)
+
+
+def cmd_permissions(sessions: list, args):
+    """Analyze permission requests (approve/reject/block)."""
+    run_single_report('permissions', sessions, args)
+
+
+def cmd_tools(sessions: list, args):
+    """Tool call frequency overview."""
+    run_single_report('tools', sessions, args)
+
+
+def cmd_latency(sessions: list, args):
+    """Tool call latency percentiles, histogram and slowest calls."""
+    run_single_report('latency', sessions, args)
+
+
+def cmd_turns(sessions: list, args):
+    """Slowest turns and where turn time goes."""
+    run_single_report('turns', sessions, args)
+
+
+def cmd_hooks(sessions: list, args):
+    """Hook runs, errors and the latency they add per turn."""
+    run_single_report('hooks', sessions, args)
+
+
+def cmd_tokens(sessions: list, args):
+    """Token usage and prompt-cache efficiency."""
+    run_single_report('tokens', sessions, args)
+
+
+def cmd_context(sessions: list, args):
+    """Context growth by tool result size."""
+    run_single_report('context', sessions, args)
+
+
+def cmd_timeline(sessions: list, args):
+    """Chronological event timeline."""
+    if args.follow:
+        follow_report('timeline', sessions, args)
+    else:
+        run_single_report('timeline', sessions, args)
+
+
+def cmd_errors(sessions: list, args):
+    """Extract only errors, rejections, and failures."""
+    if args.follow:
+        follow_report('errors', sessions, args)
+    else:
+        run_single_report('errors', sessions, args)
+
+
+def cmd_all(sessions: list, args):
+    """Run several reports from a single pass over the sessions."""
+    names = args.reports.split(',') if args.reports else list(REPORTS)
+    unknown = [n for n in names if n not in REPORTS]
+    if unknown:
+        print(f"Error: Unknown report(s): {', '.join(unknown)} "
+              f"(available: {', '.join(REPORTS)})", file=sys.stderr)
+        sys.exit(1)
+
+    reports = run_reports([REPORTS[n] for n in names], sessions, args)
+
+    with profile_phase('render'):
+        if args.json:
+            print(json.dumps({r.name: r.as_json() for r in reports}, indent=2,
+                             ensure_ascii=False))
+            return
+
+        for report in reports:
+            print(f"=== {report.title} ===")
+            print()
+            report.render()
+            print()
+
+
+def cmd_search(sessions: list, args):
+    """Ranked full-text search over messages, commands, file paths and errors."""
+    if args.no_cache:
+        print("Error: search needs the index (drop --no-cache)", file=sys.stderr)
+        sys.exit(1)
+    kinds = [k.strip() for k in args.kind.split(',')] if args.kind else None
+    unknown = set(kinds or ()) - set(SEARCH_KINDS)
+    if unknown:
+        print(f"Error: unknown kind(s) {', '.join(sorted(unknown))} "
+              f"(choose from {', '.join(SEARCH_KINDS)})", file=sys.stderr)
+        sys.exit(1)
+    query = ' '.join(args.query) if args.fts else _fts_query(args.query)
+    if not query:
+        print("Error: empty search query", file=sys.stderr)
+        sys.exit(1)
+
+    index = open_index(args)
+    if index is None:
+        sys.exit(1)
+    try:
+        # Bring the index up to date; unchanged sessions cost one lookup
+        updated = sum(index.load(f, proj_name, read=False, texts=True) is not None
+                      for _, f, proj_name in sessions)
+        if updated:
+            print(f"[indexed {updated} new or changed session(s)]", file=sys.stderr)
+        try:
+            rows = index.search(query, [f for _, f, _ in sessions], kinds,
+                                _utc_iso(args.since), _utc_iso(args.until),
+                                args.last or SEARCH_RESULTS)
+        except sqlite3.OperationalError as e:
+            print(f"Error: invalid search query ({e})", file=sys.stderr)
+            sys.exit(1)
+    finally:
+        index.close()
+
+    projects = {str(f): decode_project_name(proj_name) for _, f, proj_name in sessions}
+    results = [{
+        'session': Path(path).stem,
+        'project': projects.get(path, ''),
+        'timestamp': ts,
+        'kind': kind,
+        'snippet': ' '.join(snippet.split()),
+        'score': round(-score, 3),
+    } for path, ts, kind, snippet, score in rows]
+
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+        return
+    print(f"Results: {len(results)} for {query}")
+    if not results:
+        return
+    print(f"{'Time':<20} {'Project':<16} {'Session':<9} {'Kind':<9} {'Match'}")
+    print("-" * 100)
+    for r in results:
+        print(f"{_format_datetime(r['timestamp']):<20} {r['project'][:16]:<16} "
+              f"{r['session'][:8]:<9} {r['kind']:<9} {r['snippet']}")
+
+
+def _fts_query(terms: list) -> str:
+    """FTS5 query matching all arguments, each as a phrase (`word*` searches a prefix)."""
+    parts = []
+    for term in terms:
+        prefix = term.endswith('*')
+        term = ' '.join(term.rstrip('*').split()).replace('"', '""')
+        if term:
+            parts.append(f'"{term}"' + ('*' if prefix else ''))
+    return ' '.join(parts)
+
+
+def _utc_iso(dt: datetime):
+    """A --since/--until datetime as a string comparable with entry timestamps."""
+    return dt.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S') if dt else None
+
+
+def cmd_export(sessions: list, args):
+    """Export parsed sessions to SQLite or NDJSON, incrementally."""
+    target = EXPORT_FORMATS[args.format](args.output)
+    exported, counts, restarted = export_sessions(sessions, args, target)
+    if restarted:
+        print("[a session was replaced: NDJSON export written from scratch]", file=sys.stderr)
+    tables = ', '.join(f"{counts[table]} {table.replace('_', ' ')}"
+                       for table in EXPORT_TABLES if table != 'sessions')
+    print(f"Exported {exported} new or changed of {len(sessions)} session(s) "
+          f"({tables}) -> {args.output}")
+
+
+def cmd_classify(sessions: list, args):
+    """Named classes of the string results in the given sessions."""
+    results, examples = 0, {}
+    classes = Counter()
+    for data in iter_session_data(sessions, args, LINE_TOOL_USE | LINE_TOOL_RESULT):
+        for tc in data['tool_calls']:
+            if tc['result_class'] == 'pending':
+                continue
+            results += 1
+            if tc['result_kind'] is None and not isinstance(tc['result'], str):
+                continue
+            key = (tc['result_kind'] or '-', tc['result_class'])
+            classes[key] += 1
+            if key not in examples and isinstance(tc['result'], str):
+                examples[key] = ' '.join(tc['result'].split())
+
+    rows = [{'class': kind, 'category': category, 'count': n,
+             'example': examples.get((kind, category), '')}
+            for (kind, category), n in classes.most_common()]
+    classifier = get_classifier()
+    if args.json:
+        output = {'results': results, 'string_results': sum(classes.values()), 'classes': rows}
+        if args.explain:
+            output['rules'] = _rule_rows(classifier)
+        print(json.dumps(output, indent=2, ensure_ascii=False))
+        return
+
+    print(f"String results: {sum(classes.values())} of {results} tool results")
+    if rows:
+        print()
+        print(f"{'Class':<18} {'Category':<14} {'Count':>7}  {'Example'}")
+        print("-" * 100)
+        for r in rows:
+            print(f"{r['class']:<18} {r['category']:<14} {r['count']:>7}  {r['example'][:56]}")
+    if args.explain:
+        print()
+        _print_rules(classifier)
+
+
+def classify_texts(texts: list, args):
+    """Classify given texts ("-" reads stdin); --explain traces every rule."""
+    texts = [sys.stdin.read() if text == '-' else text for text in texts]
+    classifier = get_classifier()
+    output = []
+    for text in texts:
+        i = classifier.match(text)
+        category, kind = classifier.classify(text)
+        entry = {'text': text, 'class': kind, 'category': category,
+                 'rule': classifier.sources[i] if i >= 0 else None}
+        if args.explain:
+            entry['trace'] = [dict(rule, match=list(span) if span else None)
+                              for rule, span in zip(_rule_rows(classifier),
+                                                    classifier.explain(text))]
+        output.append(entry)
+
+    if args.json:
+        print(json.dumps(output, indent=2, ensure_ascii=False))
+        return
+    for entry in output:
+        preview = ' '.join(entry['text'].split())[:60]
+        print(f"{entry['class'] or '-':<18} {entry['category']:<14} "
+              f"{entry['rule'] or 'no rule':<18} {preview}")
+        if not args.explain:
+            continue
+        print()
+        print(f"{'Source':<18} {'Class':<18} {'Category':<14} {'Match':<10} {'Rule'}")
+        print("-" * 100)
+        for row in entry['trace']:
+            match = '-' if row['match'] is None else '{}-{}'.format(*row['match'])
+            marker = ('<= first match' if row['source'] == entry['rule']
+                      else '(shadowed)' if row['match'] else '')
+            print(f"{row['source']:<18} {row['class']:<18} {row['category']:<14} "
+                  f"{match:<10} {_rule_text(row)} {marker}".rstrip())
+        print()
+
+
+def _rule_rows(classifier: Classifier) -> list:
+    """Rules of a classifier in order, as dicts for output."""
+    return [dict(rule, source=source, category=rule.get('category', 'error'))
+            for source, rule in zip(classifier.sources, classifier.rules)]
+
+
+def _rule_text(rule: dict) -> str:
+    """A rule as text: literals quoted, regexes between slashes."""
+    parts = []
+    if 'prefix' in rule:
+        parts.append(f"prefix {rule['prefix']!r}")
+    if 'substring' in rule:
+        parts.append(f"substring {rule['substring']!r}")
+    if 'regex' in rule:
+        parts.append(f"regex /{rule['regex']}/")
+    return ' + '.join(parts) + (' (ignore case)' if rule.get('ignore_case') else '')
+
+
+def _print_rules(classifier: Classifier):
+    print("Rules (first match wins):")
+    print(f"{'Source':<18} {'Class':<18} {'Category':<14} {'Rule'}")
+    print("-" * 100)
+    for row in _rule_rows(classifier):
+        print(f"{row['source']:<18} {row['class']:<18} {row['category']:<14} "
+              f"{_rule_text(row)}")
+
+
+def cmd_suggest_rules(sessions: list, args):
+    """Allow rules that would have saved the most permission prompts."""
+    paths = args.settings or [path for path in (DEFAULT_SETTINGS_PATH,) if path.exists()]
+    try:
+        args.allow_rules = load_permission_rules(paths)['allow']
+    except (OSError, ValueError) as e:
+        print(f"Error: cannot read settings: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    report, = run_reports([RuleSuggestionsReport], sessions, args)
+    with profile_phase('render'):
+        if args.json:
+            report.print_json()
+        else:
+            report.render()
+
+
+def cmd_replay(sessions: list, args):
+    """Replay recorded tool calls against a candidate permission ruleset."""
+    try:
+        args.ruleset_rules = load_permission_rules(args.ruleset)
+    except (OSError, ValueError) as e:
+        print(f"Error: cannot read ruleset: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    report, = run_reports([ReplayReport], sessions, args)
+    with profile_phase('render'):
+        if args.json:
+            report.print_json()
+        else:
+            report.render()
+
+
+def cmd_reindex(sessions: list, args):
+    """Drop and rebuild the index entries of the given sessions."""
+    if args.no_cache:
+        print("Error: reindex needs the index (drop --no-cache)", file=sys.stderr)
+        sys.exit(1)
+
+    index = open_index(args)
+    if index is None:
+        sys.exit(1)
+    try:
+        tool_calls = 0
+        for _, session_file, proj_name in sessions:
+            index.forget(session_file)
+            tool_calls += len(index.load(session_file, proj_name)['tool_calls'])
+    finally:
+        index.close()
+
+    print(f"Reindexed {len(sessions)} session(s), {tool_calls} tool calls -> {args.index}")
+
+
+def cmd_serve(args):
+    """Answer commands from a resident process (see InspectorServer)."""
+    import signal
+    import socket
+    if not hasattr(socket, 'AF_UNIX'):
+        print("Error: serve needs Unix domain sockets", file=sys.stderr)
+        sys.exit(1)
+
+    running = _send_request(args.socket, {'ping': True})
+    running = running and running[0]
+    if args.stop:
+        if running is None:
+            print(f"No serve process on {args.socket}", file=sys.stderr)
+            sys.exit(1)
+        _send_request(args.socket, {'stop': True})
+        print(f"Stopped serve process {running['pid']}")
+        return
+    if running is not None:
+        print(f"Error: serve process {running['pid']} already listens on {args.socket}",
+              file=sys.stderr)
+        sys.exit(1)
+
+    server = InspectorServer(args.socket, args.idle_timeout)
+    if args.detach:
+        # The socket listens already: clients queue until the child accepts
+        pid = os.fork()
+        if pid:
+            server.listener.close()
+            print(f"Serving on {args.socket} (pid {pid})")
+            return
+        os.setsid()
+        os.chdir('/')
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+    else:
+        print(f"Serving on {args.socket} (pid {os.getpid()}), Ctrl-C to stop",
+              file=sys.stderr)
+
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.serve()
+    except KeyboardInterrupt:
+        pass
+
+
+# === Helpers ===
+
+def _tool_detail(block: dict) -> str:
+    """Short description of a tool call."""
+    name = block.get('name', '')
+    inp = block.get('input', {})
+    if name == 'Bash':
+        cmd = inp.get('command', '')
+        return cmd[:60].replace('\n', ' ')
+    elif name in ('Read', 'Write', 'Edit'):
+        path = inp.get('file_path', '')
+        return os.path.basename(path) if path else ''
+    elif name == 'Glob':
+        return inp.get('pattern', '')
+    elif name == 'Grep':
+        return inp.get('pattern', '')[:40]
+    elif name == 'Task':
+        return inp.get('description', '')[:40]
+    elif name == 'Skill':
+        return inp.get('skill', '')
+    else:
+        return str(inp)[:40]
+
+
+def _result_preview(result) -> str:
+    """Short preview of a tool result."""
+    if isinstance(result, str):
+        return result[:60].replace('\n', ' ')
+    elif isinstance(result, dict):
+        if 'stdout' in result:
+            return result['stdout'][:60].replace('\n', ' ')
+        elif 'file' in result:
+            fp = result['file']
+            if isinstance(fp, dict):
+                return f"file: {os.path.basename(fp.get('filePath', ''))}"
+        elif 'filePath' in result:
+            return f"edited: {os.path.basename(result['filePath'])}"
+        return str(result)[:60]
+    return str(result)[:60]
+
+
+def _parse_ts(ts: str):
+    """ISO timestamp to aware datetime, None if missing or malformed."""
+    if not ts:
+        return None
+    try:
+        return datetime.fromisoformat(ts.replace('Z', '+00:00'))
+    except (ValueError, TypeError):
+        return None
+
+
+def _intern(name) -> str:
+    """One shared copy of a name that repeats (tool, event); str() of a malformed one."""
+    return sys.intern(name if isinstance(name, str) else str(name))
+
+
+def _duration_ms(start: str, end: str):
+    """Milliseconds between two ISO timestamps, None if either is unusable."""
+    dt_start = _parse_ts(start)
+    dt_end = _parse_ts(end)
+    if dt_start is None or dt_end is None:
+        return None
+    return max(0, round((dt_end - dt_start).total_seconds() * 1000))
+
+
+def _parse_date(value: str, end_of_day: bool = False) -> datetime:
+    """Parse a --since/--until value: ISO date/datetime (local time) or 2h/3d/1w ago."""
+    match = re.fullmatch(r'(\d+)([mhdw])', value.strip())
+    if match:
+        unit = {'m': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}[match.group(2)]
+        return datetime.now(timezone.utc) - timedelta(**{unit: int(match.group(1))})
+    try:
+        dt = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date: {value!r}")
+    if end_of_day and len(value.strip()) == 10:
+        dt += timedelta(days=1)
+    return dt if dt.tzinfo else dt.astimezone()
+
+
+def _parse_since(value: str) -> datetime:
+    return _parse_date(value)
+
+
+def _parse_until(value: str) -> datetime:
+    return _parse_date(value, end_of_day=True)
+
+
+def _format_ms(ms) -> str:
+    """Format a duration in milliseconds compactly (850ms, 4.2s, 3m05s)."""
+    if ms < 1000:
+        return f"{ms}ms"
+    if ms < 60000:
+        return f"{ms / 1000:.1f}s"
+    minutes, seconds = divmod(round(ms / 1000), 60)
+    return f"{minutes}m{seconds:02d}s"
+
+
+def _format_tokens(n) -> str:
+    """Format a token count compactly (950, 12.3k, 4.56M)."""
+    if n < 1000:
+        return f"{round(n)}"
+    if n < 1000000:
+        return f"{n / 1000:.1f}k"
+    return f"{n / 1000000:.2f}M"
+
+
+def _format_bytes(n) -> str:
+    """Format a byte count compactly (512 B, 3.4 kB, 1.2 MB)."""
+    if n < 1000:
+        return f"{n} B"
+    if n < 1000000:
+        return f"{n / 1000:.1f} kB"
+    return f"{n / 1000000:.1f} MB"
+
+
+def _format_time(ts: str) -> str:
+    """Format ISO timestamp to HH:MM:SS."""
+    if not ts:
+        return ''
+    try:
+        dt = datetime.fromisoformat(ts.replace('Z', '+00:00'))
+        # Convert to local time
+        local = dt.astimezone()
+        return local.strftime('%H:%M:%S')
+    except (ValueError, TypeError):
+        return ts[:8]
+
+
+def _format_datetime(ts: str) -> str:
+    """Format ISO timestamp to readable datetime."""
+    if not ts:
+        return 'N/A'
+    try:
+        dt = datetime.fromisoformat(ts.replace('Z', '+00:00'))
+        local = dt.astimezone()
+        return local.strftime('%Y-%m-%d %H:%M:%S')
+    except (ValueError, TypeError):
+        return ts
+
+
+def _format_duration(start: str, end: str) -> str:
+    """Format duration between two ISO timestamps."""
+    if not start or not end:
+        return 'N/A'
+    try:
+        dt_start = datetime.fromisoformat(start.replace('Z', '+00:00'))
+        dt_end = datetime.fromisoformat(end.replace('Z', '+00:00'))
+        delta = dt_end - dt_start
+        hours = int(delta.total_seconds() // 3600)
+        minutes = int((delta.total_seconds() % 3600) // 60)
+        return f"{hours}h {minutes}min"
+    except (ValueError, TypeError):
+        return 'N/A'
+
+
+# === Profiling ===
+
+_profiler = None  # Phase recorder of this process with --profile (see set_profiler)
+
+
+def set_profiler(profiler):
+    """Install the --profile phase recorder of this process (None: not profiling)."""
+    global _profiler
+    _profiler = profiler
+
+
+def profile_phase(name: str):
+    """Context timing a block as a --profile phase; does nothing when not profiling."""
+    return _profiler.phase(name) if _profiler is not None else contextlib.nullcontext()
+
+
+def _new_phase_stats() -> dict:
+    return {'wall': 0.0, 'cpu': 0.0, 'calls': 0, 'bytes': 0, 'lines': 0, 'decoded': 0,
+            'peak_rss_mb': 0.0}
+
+
+class Profiler:
+    """Wall time, CPU time, bytes read, lines and peak RSS per phase of a run.
+
+    Phases are timed per call (one session parse, one report render), at the
+    cost of a few clock reads per session and two per decoded line, so
+    --profile can stay on in scheduled jobs. Pool workers profile their own
+    chunks and are merged in: phase times are then summed over processes.
+    """
+
+    def __init__(self):
+        self.phases = defaultdict(_new_phase_stats)
+        self.pids = {os.getpid()}  # A worker profiles several chunks
+        self.start_wall = time.perf_counter()
+        self.start_cpu = _cpu_seconds()
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """Time the block; counters set on the yielded dict are added to the phase."""
+        call = {'bytes': 0, 'lines': 0, 'decoded': 0}
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield call
+        finally:
+            call['wall'] = time.perf_counter() - wall
+            call['cpu'] = time.process_time() - cpu
+            stats = self.phases[name]
+            for key, value in call.items():
+                stats[key] += value
+            stats['calls'] += 1
+            stats['peak_rss_mb'] = max(stats['peak_rss_mb'], peak_rss_mb())
+
+    def split(self, parse: dict, decode: float, extract: float):
+        """Attribute the wall time of one parse call to reading, decoding and extraction."""
+        read = max(0.0, parse['wall'] - decode - extract)
+        for name, seconds, counters in (
+                ('read', read, ('bytes', 'lines')), ('decode', decode, ('decoded',)),
+                ('extract', extract, ())):
+            stats = self.phases[name]
+            stats['wall'] += seconds
+            stats['calls'] += 1
+            for key in counters:
+                stats[key] += parse[key]
+
+    def merge(self, other: 'Profiler'):
+        for name, theirs in other.phases.items():
+            stats = self.phases[name]
+            for key, value in theirs.items():
+                stats[key] = max(stats[key], value) if key == 'peak_rss_mb' else stats[key] + value
+        self.pids |= other.pids
+
+    def as_json(self):
+        wall = time.perf_counter() - self.start_wall
+        phases = {}
+        for name in PROFILE_PHASES:
+            if name not in self.phases:
+                continue
+            stats = self.phases[name]
+            phases[name] = {
+                'wall_s': round(stats['wall'], 4),
+                'cpu_s': None if name in PROFILE_PARSE_PHASES else round(stats['cpu'], 4),
+                'calls': stats['calls'],
+                'bytes': stats['bytes'],
+                'lines': stats['lines'],
+                'decoded': stats['decoded'],
+                'peak_rss_mb': (None if name in PROFILE_PARSE_PHASES
+                                else round(stats['peak_rss_mb'], 1)),
+            }
+        # Time outside every phase (startup, session filtering, output of commands
+        # without a render phase); phase sums of several processes do not add up
+        timed = sum(stats['wall'] for name, stats in self.phases.items()
+                    if name not in PROFILE_PARSE_PHASES)
+        return {
+            'wall_s': round(wall, 4),
+            'cpu_s': round(_cpu_seconds() - self.start_cpu, 4),
+            'peak_rss_mb': round(max(peak_rss_mb(), peak_rss_mb(children=True)), 1),
+            'processes': len(self.pids),
+            'phases': phases,
+            'other_wall_s': round(max(0.0, wall - timed), 4) if len(self.pids) == 1 else None,
+        }
+
+    def render(self):
+        """Print the phase breakdown to stderr."""
+        out = self.as_json()
+        summed = (f", {out['processes']} processes (phase times summed)"
+                  if out['processes'] > 1 else '')
+        print(f"\nProfile: {out['wall_s']:.3f}s wall, {out['cpu_s']:.3f}s CPU, "
+              f"peak RSS {out['peak_rss_mb']:.1f} MB{summed}", file=sys.stderr)
+        print(f"{'Phase':<14} {'Wall s':>8} {'CPU s':>8} {'Calls':>7} {'Read':>9} "
+              f"{'Lines':>10} {'Decoded':>10} {'RSS MB':>8}", file=sys.stderr)
+        print("-" * 80, file=sys.stderr)
+        rows = list(out['phases'].items())
+        if out['other_wall_s'] is not None:
+            rows.append(('other', {'wall_s': out['other_wall_s']}))
+        for name, p in rows:
+            label = f"  {name}" if name in PROFILE_PARSE_PHASES else name
+            cpu = '' if p.get('cpu_s') is None else f"{p['cpu_s']:.3f}"
+            read = _format_bytes(p['bytes']) if p.get('bytes') else ''
+            lines = f"{p['lines']:,}" if p.get('lines') else ''
+            decoded = f"{p['decoded']:,}" if p.get('decoded') else ''
+            rss = f"{p['peak_rss_mb']:.1f}" if p.get('peak_rss_mb') else ''
+            print(f"{label:<14} {p['wall_s']:>8.3f} {cpu:>8} {p.get('calls', ''):>7} "
+                  f"{read:>9} {lines:>10} {decoded:>10} {rss:>8}".rstrip(), file=sys.stderr)
+
+    def print_json(self):
+        print(json.dumps(self.as_json(), indent=2), file=sys.stderr)
+
+
+def peak_rss_mb(children: bool = False) -> float:
+    """Peak resident set size of this process (or its largest child) in MB, 0 if unknown."""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    return usage.ru_maxrss / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
+
+
+def _cpu_seconds() -> float:
+    """CPU time of this process and its finished children (pool workers)."""
+    if resource is None:
+        return time.process_time()
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + usage.ru_utime + usage.ru_stime
+
+
+# === Main ===
+
+def main():
+    parser = build_parser(sys.argv[1] if len(sys.argv) > 1 else None)
+    args = parser.parse_args()
+
+    if not args.command:
+        parser.print_help()
+        sys.exit(1)
+
+    if args.command == 'serve':
+        cmd_serve(args)
+    elif not query_server(args, sys.argv[1:]):
+        run(args)
+
+
+def build_parser(command: str = None) -> argparse.ArgumentParser:
+    """The command line parser (the serve process parses client requests with it too).
+
+    Given the command about to run, only its subparser gets the common
+    options: they are most of the parser's build time.
+    """
+    parser = argparse.ArgumentParser(
+        description='Session Inspector - Analyze Claude Code sessions',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  %(prog)s summary -c
+  %(prog)s permissions -c
+  %(prog)s permissions -p fleet-plugins -r 5
+  %(prog)s errors -c -n 20
+  %(prog)s timeline -c -f dcg
+  %(prog)s timeline -c -f rejected -n 10
+  %(prog)s errors -p fleet-plugins -r 3 --follow
+  %(prog)s tools -c
+  %(prog)s latency -r 20 --tool mcp__
+  %(prog)s turns -r 10 -n 5
+  %(prog)s hooks -r 20
+  %(prog)s tokens -p fleet-plugins --since 1w
+  %(prog)s context -c
+  %(prog)s all -r 20 --reports summary,permissions,errors --json
+  %(prog)s errors -p fleet-plugins --since 3d
+  %(prog)s search "permission denied" -p fleet-plugins --since 4w
+  %(prog)s export -o sessions.db --since 4w
+  %(prog)s suggest-rules --since 4w --json
+  %(prog)s replay candidate.json --since 52w
+  %(prog)s all -r 50 --no-cache --profile
+  %(prog)s serve --detach
+  %(prog)s reindex -p fleet-plugins
+        """
+    )
+
+    # Common args (shared by all subcommands via parents)
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--path', type=Path, default=DEFAULT_CLAUDE_PATH,
+                        help='Path to Claude projects directory')
+    common.add_argument('--session', '-s', help='Session UUID (or prefix)')
+    common.add_argument('--project', '-p', help='Filter by project name')
+    common.add_argument('--transcript', type=Path, metavar='PATH',
+                        help='Session file to inspect (a hook\'s transcript_path), '
+                             'instead of finding sessions under --path')
+    common.add_argument('--current', '-c', action='store_true',
+                        help='Use most recent session (of $CLAUDE_PROJECT_DIR, if set)')
+    common.add_argument('--recent', '-r', type=int,
+                        help='Analyze N most recent sessions')
+    common.add_argument('--since', type=_parse_since,
+                        help='Entries since DATE (YYYY-MM-DD[ HH:MM], or 2h/3d/1w ago)')
+    common.add_argument('--until', type=_parse_until,
+                        help='Entries before DATE (a bare date includes that day)')
+    common.add_argument('--last', '-n', type=int,
+                        help='Show only last N entries')
+    common.add_argument('--json', action='store_true',
+                        help='Output as JSON')
+    common.add_argument('--brief', '-b', action='store_true',
+                        help='Brief output (skip full tables)')
+    common.add_argument('--index', type=Path, default=DEFAULT_INDEX_PATH,
+                        help='Path to the session index database')
+    common.add_argument('--no-cache', action='store_true',
+                        help='Parse session files directly, bypassing the index')
+    common.add_argument('--catalog', action='store_true',
+                        help='Find sessions through the cached file catalog in the index')
+    common.add_argument('--json-decoder', choices=('auto', 'stdlib', 'orjson'),
+                        default='auto',
+                        help='JSON decoder (auto: orjson if installed, else stdlib)')
+    common.add_argument('--jobs', '-j', type=int,
+                        help='Worker processes for multi-session reports (default: CPU count)')
+    common.add_argument('--classify-rules', type=Path, metavar='PATH',
+                        help='Result classification rules (JSON, tried before the built-in '
+                             f'rules; default: {DEFAULT_CLASSIFY_RULES_PATH} if present)')
+    common.add_argument('--profile', action='store_true',
+                        help='Print wall/CPU time, bytes, lines and peak memory per phase '
+                             '(discovery, I/O, decode, extract, index, aggregation, render) '
+                             'to stderr')
+    common.add_argument('--profile-json', action='store_true',
+                        help='Like --profile, as JSON')
+    common.add_argument('--cprofile', type=Path, metavar='PATH',
+                        help='Write cProfile stats of the run to PATH (main process only: '
+                             'use with -j 1)')
+    common.add_argument('--socket', type=Path, default=DEFAULT_SOCKET_PATH,
+                        help='Socket of a serve process to answer from, when one listens '
+                             f'(default: {DEFAULT_SOCKET_PATH})')
+    common.add_argument('--no-server', action='store_true',
+                        help='Run in this process even if a serve process listens')
+
+    # Subcommands
+    subparsers = parser.add_subparsers(dest='command', help='Command to run')
+
+    def add_command(name: str, **kwargs):
+        parents = [common] if command in (None, name) else []
+        return subparsers.add_parser(name, parents=parents, **kwargs)
+
+    add_command('summary', help='Quick session summary')
+    permissions_parser = add_command('permissions', help='Permission request analysis')
+    permissions_parser.add_argument('--segments', action='store_true',
+                                    help='Key Bash calls by every command of the line '
+                                         '(pipelines, &&, ;, subshells), not the main one')
+    add_command('tools', help='Tool call frequency overview')
+
+    latency_parser = add_command('latency', help='Tool call latency percentiles')
+    latency_parser.add_argument('--tool', '-t',
+                                help='Only tools whose name contains TEXT (e.g. mcp__, Bash)')
+
+    add_command('turns', help='Turn time split into model, tools, permission, hooks')
+
+    hooks_parser = add_command('hooks', help='Hook runs, errors and added latency')
+    hooks_parser.add_argument('--hook-logs', type=Path, metavar='DIR',
+                              help='Directory with hook-debug-*.log files '
+                                   f'(default: {DEFAULT_HOOK_LOG_PATH})')
+
+    tokens_parser = add_command('tokens', help='Token usage and prompt-cache efficiency')
+    tokens_parser.add_argument('--bucket', choices=('hour', 'day', 'week'), default='day',
+                               help='Time bucket for the usage table (default: day)')
+
+    add_command('context', help='Context growth by tool result size')
+
+    timeline_parser = add_command('timeline', help='Chronological event timeline')
+    timeline_parser.add_argument('--filter', '-f', help='Filter events (text match)')
+    timeline_parser.add_argument('--follow', '-F', action='store_true',
+                                 help='Keep printing new events as they are appended')
+
+    errors_parser = add_command('errors', help='Errors, rejections, and failures')
+    errors_parser.add_argument('--follow', '-F', action='store_true',
+                               help='Keep printing new errors as they are appended')
+    all_parser = add_command('all', help='Several reports from a single pass')
+    all_parser.add_argument('--reports', help='Comma-separated reports '
+                            f'(default: {",".join(REPORTS)})')
+    all_parser.add_argument('--filter', '-f', help='Filter timeline events (text match)')
+    search_parser = add_command('search', help='Ranked full-text search (indexed)')
+    search_parser.add_argument('query', nargs='+',
+                               help='Words or quoted phrases that must all occur '
+                                    '(word* for prefixes)')
+    search_parser.add_argument('--kind', '-k',
+                               help=f"Comma-separated text kinds ({', '.join(SEARCH_KINDS)})")
+    search_parser.add_argument('--fts', action='store_true',
+                               help='Pass the query to SQLite FTS5 as is (OR, NEAR, ...)')
+
+    export_parser = add_command('export', help='Export sessions to SQLite/NDJSON (incremental)')
+    export_parser.add_argument('--output', '-o', type=Path, required=True,
+                               help='SQLite database file, or directory for NDJSON')
+    export_parser.add_argument('--format', choices=tuple(EXPORT_FORMATS), default='sqlite',
+                               help='Output format (default: sqlite)')
+
+    classify_parser = add_command('classify', help='Result classes of sessions or given texts')
+    classify_parser.add_argument('text', nargs='*',
+                                 help='Texts to classify ("-" reads stdin) instead of '
+                                      'the session results')
+    classify_parser.add_argument('--explain', action='store_true',
+                                 help='Show the rules and which one matched')
+
+    suggest_parser = add_command('suggest-rules',
+                                 help='Allow rules that would save the most prompts')
+    suggest_parser.add_argument('--settings', type=Path, action='append', metavar='PATH',
+                                help='settings.json whose allow rules count as granted '
+                                     f'(repeatable; default: {DEFAULT_SETTINGS_PATH} if present)')
+    suggest_parser.add_argument('--min-prompts', type=int, default=SUGGEST_MIN_PROMPTS,
+                                help='Prompts a rule must save to be suggested '
+                                     f'(default: {SUGGEST_MIN_PROMPTS})')
+    suggest_parser.add_argument('--max-rules', type=int,
+                                help='Suggest at most N rules (those saving the most prompts)')
+
+    replay_parser = add_command('replay', help='Replay tool calls against a candidate ruleset')
+    replay_parser.add_argument('ruleset', type=Path, nargs='+',
+                               help='settings.json-style files with allow/ask/deny rules '
+                                    'and "dcg" block patterns (merged in order)')
+
+    add_command('reindex', help='Rebuild the index for matching sessions (all by default)')
+
+    serve_parser = subparsers.add_parser('serve',
+                                         help='Answer commands from a resident process '
+                                              'with sessions kept in memory')
+    serve_parser.add_argument('--socket', type=Path, default=DEFAULT_SOCKET_PATH,
+                              help=f'Unix socket to listen on (default: {DEFAULT_SOCKET_PATH})')
+    serve_parser.add_argument('--idle-timeout', type=float, default=SERVE_IDLE_TIMEOUT,
+                              metavar='SECONDS',
+                              help='Exit after this long without a request (0: never; '
+                                   f'default: {SERVE_IDLE_TIMEOUT})')
+    serve_parser.add_argument('--detach', '-d', action='store_true',
+                              help='Run in the background, return once it listens')
+    serve_parser.add_argument('--stop', action='store_true',
+                              help='Stop the process serving on --socket')
+    return parser
+
+
+def run(args):
+    """Run a parsed command line in this process, with --profile / --cprofile."""
+    if args.profile or args.profile_json:
+        set_profiler(Profiler())
+    cprofile = None
+    if args.cprofile:
+        import cProfile  # Only needed here
+        cprofile = cProfile.Profile()
+        cprofile.enable()
+    try:
+        run_command(args)
+    finally:
+        if cprofile is not None:
+            cprofile.disable()
+            cprofile.dump_stats(args.cprofile)
+        if _profiler is not None:
+            if args.profile_json:
+                _profiler.print_json()
+            else:
+                _profiler.render()
+            set_profiler(None)
+
+
+def run_command(args):
+    """Find the sessions selected by the common options and run the subcommand."""
+    set_json_decoder(args.json_decoder)
+    try:
+        set_classify_rules(args.classify_rules)
+    except ValueError as e:
+        print(f"Error: invalid classification rules: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.command == 'classify' and args.text:
+        classify_texts(args.text, args)
+        return
+
+    if args.transcript is None and not args.path.exists():
+        print(f"Error: Path not found: {args.path}", file=sys.stderr)
+        sys.exit(1)
+
+    # Find sessions
+    with profile_phase('discover'):
+        if args.transcript is not None:
+            sessions = transcript_session(args.transcript)
+        else:
+            catalog = open_index(args) if args.catalog else None
+            # The current session is the newest of the current project, when known
+            project_dir = None
+            if args.current and not (args.session or args.project):
+                project_dir = current_project_dir(args.path)
+            try:
+                sessions = find_sessions(args.path, args.session, args.project,
+                                         args.current, args.recent, args.since, args.until,
+                                         catalog, project_dir)
+            finally:
+                if catalog is not None:
+                    catalog.close()
+
+    if not sessions:
+        print("No sessions found matching criteria.", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"[{len(sessions)} session(s) | "
+          f"{decode_project_name(sessions[0][2]) if sessions else '?'}]",
+          file=sys.stderr)
+
+    # Dispatch
+    commands = {
+        'summary': cmd_summary,
+        'permissions': cmd_permissions,
+        'tools': cmd_tools,
+        'latency': cmd_latency,
+        'turns': cmd_turns,
+        'hooks': cmd_hooks,
+        'tokens': cmd_tokens,
+        'context': cmd_context,
+        'timeline': cmd_timeline,
+        'errors': cmd_errors,
+        'all': cmd_all,
+        'search': cmd_search,
+        'export': cmd_export,
+        'classify': cmd_classify,
+        'suggest-rules': cmd_suggest_rules,
+        'replay': cmd_replay,
+        'reindex': cmd_reindex,
+    }
+    commands[args.command](sessions, args)
+
+
+if __name__ == '__main__':
+    main()
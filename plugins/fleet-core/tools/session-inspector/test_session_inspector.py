@@ -0,0 +1,536 @@
+#!/usr/bin/env python3
+"""
+Session Inspector Tests - the shell tokenizer behind command names and permission
+rules, result classification, the session index, time range and tail reads, and export.
+
+Run with: python3 -m unittest test_session_inspector (or pytest) in this directory.
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import generate_sessions as gen
+import session_inspector_core as si
+
+
+def tool_call(n: int, command: str = 'ls') -> list:
+    """The entries of Bash call n (assistant tool_use, then its result) at 10:00 + n minutes."""
+    ts = f'2026-04-01T{10 + n // 60:02d}:{n % 60:02d}:00.000Z'
+    return [{'type': 'assistant', 'timestamp': ts, 'uuid': f'a{n}',
+             'message': {'id': f'm{n}', 'content': [
+                 {'type': 'tool_use', 'id': f't{n}', 'name': 'Bash',
+                  'input': {'command': command}}]}},
+            {'type': 'user', 'timestamp': ts, 'uuid': f'u{n}',
+             'sourceToolAssistantUUID': f'a{n}', 'toolUseResult': 'ok',
+             'message': {'content': [{'type': 'tool_result', 'tool_use_id': f't{n}',
+                                      'content': 'ok'}]}}]
+
+
+def append_entries(path: Path, *entries):
+    with open(path, 'a', encoding='utf-8') as f:
+        f.writelines(json.dumps(entry) + '\n' for entry in entries)
+
+
+def plain(data: dict) -> dict:
+    """Session data with its tool call and event records as dicts, for comparison."""
+    return {key: [item.as_dict() if isinstance(item, si.Record) else item for item in value]
+            if isinstance(value, list) else value for key, value in data.items()}
+
+
+class ShellTokensTest(unittest.TestCase):
+    def words(self, command):
+        tokens, _ = si._shell_tokens(command)
+        return [text for kind, text in tokens if kind == 'word']
+
+    def test_quotes_are_removed(self):
+        self.assertEqual(self.words('''echo 'a b' "c d" e\\ f'''), ['echo', 'a b', 'c d', 'e f'])
+
+    def test_quoted_operators_are_words(self):
+        self.assertEqual(self.words('''grep 'a|b;c' "x && y"'''), ['grep', 'a|b;c', 'x && y'])
+
+    def test_double_quote_escapes(self):
+        self.assertEqual(self.words(r'echo "a\"b" "\$HOME" "c\d"'),
+                         ['echo', 'a"b', '$HOME', r'c\d'])
+
+    def test_adjacent_quotes_join(self):
+        self.assertEqual(self.words('''echo a'b'"c"'''), ['echo', 'abc'])
+
+    def test_line_continuation(self):
+        self.assertEqual(self.words('npm \\\n  test'), ['npm', 'test'])
+
+    def test_comments_are_dropped(self):
+        self.assertEqual(self.words('ls # list files\necho a#b'), ['ls', 'echo', 'a#b'])
+
+    def test_redirections_are_dropped(self):
+        self.assertEqual(self.words('make 2>&1 >build.log < in.txt'), ['make'])
+        self.assertEqual(self.words('cmd &>> "out file"'), ['cmd'])
+
+    def test_substitutions(self):
+        tokens, substitutions = si._shell_tokens('echo "$(git rev-parse HEAD)" `date`')
+        self.assertEqual(substitutions, ['git rev-parse HEAD', 'date'])
+        self.assertEqual(tokens[1], ('word', '$(git rev-parse HEAD)'))
+
+    def test_pasted_blanks_separate_words(self):
+        for blank in '\xa0', '\x0c', '\x0b', ' ':
+            self.assertEqual(self.words(f'ls{blank}-l'), ['ls', '-l'])
+        self.assertEqual(si.bash_commands('echo\xa0hi > \xa0out.txt\nls'),
+                         (('echo', 'hi'), ('ls',)))
+
+    def test_arithmetic_is_not_a_command(self):
+        _, substitutions = si._shell_tokens('echo $((1 + 2))')
+        self.assertEqual(substitutions, [''])
+
+
+class HeredocTest(unittest.TestCase):
+    def test_body_is_skipped(self):
+        command = "cat <<EOF > out.txt\nrm -rf /\nEOF\nls"
+        self.assertEqual(si.bash_commands(command), (('cat',), ('ls',)))
+
+    def test_quoted_delimiter(self):
+        command = "cat <<'END'\n$(whoami) && sudo reboot\nEND\necho done"
+        self.assertEqual(si.bash_commands(command), (('cat',), ('echo', 'done')))
+
+    def test_tab_stripped_delimiter(self):
+        command = "cat <<-EOF\n\tbody\n\tEOF\npwd"
+        self.assertEqual(si.bash_commands(command), (('cat',), ('pwd',)))
+
+    def test_two_heredocs_on_one_line(self):
+        command = "diff <<A <<B\none\nA\ntwo\nB\ntrue"
+        self.assertEqual(si.bash_commands(command), (('diff',), ('true',)))
+
+    def test_here_string_is_not_a_heredoc(self):
+        self.assertEqual(si.bash_commands('grep x <<< "a\nb"\nls'), (('grep', 'x'), ('ls',)))
+
+    def test_unterminated_body(self):
+        self.assertEqual(si.bash_commands('cat <<EOF\nno end'), (('cat',),))
+
+
+class SplittingTest(unittest.TestCase):
+    def test_lists_and_pipelines(self):
+        self.assertEqual(si.bash_commands('cd src && npm test || echo fail; ls | wc -l & wait'),
+                         (('cd', 'src'), ('npm', 'test'), ('echo', 'fail'), ('ls',),
+                          ('wc', '-l'), ('wait',)))
+
+    def test_newlines(self):
+        self.assertEqual(si.bash_commands('git add .\ngit commit -m x'),
+                         (('git', 'add', '.'), ('git', 'commit', '-m', 'x')))
+
+    def test_subshells_and_groups(self):
+        self.assertEqual(si.bash_commands('(cd a && make) ; { ls; pwd; }'),
+                         (('cd', 'a'), ('make',), ('ls',), ('pwd',)))
+
+    def test_reserved_words(self):
+        self.assertEqual(si.bash_commands('if test -f x; then cat x; else touch x; fi'),
+                         (('test', '-f', 'x'), ('cat', 'x'), ('touch', 'x')))
+
+    def test_loop_headers_are_dropped(self):
+        self.assertEqual(si.bash_commands('for f in *.py; do black "$f"; done'),
+                         (('black', '$f'),))
+
+    def test_substitution_commands_follow(self):
+        self.assertEqual(si.bash_commands('kill $(pgrep -f server)'),
+                         (('kill', '$(pgrep -f server)'), ('pgrep', '-f', 'server')))
+
+
+class WrapperTest(unittest.TestCase):
+    def test_env_assignment_prefixes(self):
+        self.assertEqual(si.bash_commands('FOO=1 BAR="a b" npm test'), (('npm', 'test'),))
+        self.assertEqual(si.bash_commands('ARR[0]=x PATH+=:/bin make'), (('make',),))
+        self.assertEqual(si.shell_segments('FOO=1 npm test'), (('FOO=1', 'npm', 'test'),))
+
+    def test_wrappers_are_stripped(self):
+        self.assertEqual(si.bash_commands('sudo -u www env A=1 timeout -s KILL 5 nice -n 5 make'),
+                         (('make',),))
+        self.assertEqual(si.bash_commands('/usr/bin/sudo systemctl restart nginx'),
+                         (('systemctl', 'restart', 'nginx'),))
+        self.assertEqual(si.bash_commands('find . | xargs -n 1 -I {} rm {}'),
+                         (('find', '.'), ('rm', '{}')))
+
+    def test_wrappers_are_kept_for_permission_rules(self):
+        self.assertEqual(si.shell_segments('sudo -u www make'), (('sudo', '-u', 'www', 'make'),))
+
+    def test_options_end_marker(self):
+        self.assertEqual(si.bash_commands('command -- ls -l'), (('ls', '-l'),))
+        self.assertEqual(si.bash_commands('env -u FOO -- make -j'), (('make', '-j'),))
+
+    def test_option_value_is_not_the_end_marker(self):
+        self.assertEqual(si.bash_commands('env -u -- -i make'), (('make',),))
+        self.assertEqual(si.bash_commands('timeout -s -- 5 make'), (('make',),))
+
+    def test_command_lookup_does_not_run(self):
+        self.assertEqual(si.bash_commands('command -v node'), (('command', '-v', 'node'),))
+        self.assertEqual(si.bash_commands('command -pV git'), (('command', '-pV', 'git'),))
+        self.assertEqual(si.bash_commands('command ls'), (('ls',),))
+
+    def test_lookups_do_not_key_a_line(self):
+        self.assertEqual(si.get_bash_cmd_name('command -v node'), 'command')
+        self.assertEqual(si.get_bash_cmd_name('command -v node >/dev/null && node x.js'), 'node')
+        self.assertEqual(si.get_bash_cmd_name('which jq && jq . a.json'), 'jq')
+        self.assertEqual(si.get_bash_cmd_name('type -t npm || exit 1'), 'exit')
+        self.assertEqual(si.get_bash_cmd_name('cd src && export X=1'), 'cd')
+
+
+class CachedSegmentsTest(unittest.TestCase):
+    def test_cached_and_uncached_agree(self):
+        command = 'cd a && FOO=1 sudo make "x y" | tee log; cat <<EOF\nbody\nEOF'
+        for unwrap in (True, False):
+            self.assertEqual(si._cached_bash_segments(command, unwrap),
+                             si._parse_bash_segments(command, unwrap))
+
+    def test_unwrap_is_part_of_the_key(self):
+        si._cached_bash_segments.cache_clear()
+        self.assertEqual(si._cached_bash_segments('sudo make', True), (('make',),))
+        self.assertEqual(si._cached_bash_segments('sudo make', False), (('sudo', 'make'),))
+
+    def test_long_commands_bypass_the_cache(self):
+        si._cached_bash_segments.cache_clear()
+        command = 'echo ' + 'x' * si.BASH_PARSE_CACHE_CHARS
+        self.assertEqual(si.bash_commands(command), (('echo', 'x' * si.BASH_PARSE_CACHE_CHARS),))
+        self.assertEqual(si._cached_bash_segments.cache_info().currsize, 0)
+
+    def test_repeated_lines_hit_the_cache(self):
+        si._cached_bash_segments.cache_clear()
+        si.bash_commands('git status')
+        si.bash_commands('git status')
+        self.assertEqual(si._cached_bash_segments.cache_info().hits, 1)
+
+
+class PermissionPathsTest(unittest.TestCase):
+    def call(self, command):
+        return {'tool': 'Bash', 'command': command}
+
+    def test_one_path_per_command(self):
+        self.assertEqual(si.permission_paths(self.call('npm test && npm test; git push')),
+                         (('Bash', 'npm', 'test'), ('Bash', 'git', 'push')))
+
+    def test_empty_command(self):
+        self.assertEqual(si.permission_paths(self.call('')), (('Bash',),))
+
+    def test_prefix_rules_end_at_a_word(self):
+        ruleset = si.Ruleset({'allow': ['Bash(npm test:*)', 'Bash(ls:*)']})
+        for command, outcome in (('npm test', 'allow'), ('npm test --watch', 'allow'),
+                                 ('npm test-all', 'prompt'), ('ls -la', 'allow'),
+                                 ('lsof', 'prompt')):
+            self.assertEqual(ruleset.decide(self.call(command))[0], outcome, command)
+
+
+class RuleSuggestionsTest(unittest.TestCase):
+    def suggest(self, *calls):
+        report = si.RuleSuggestionsReport(argparse.Namespace())
+        report.add({'tool_calls': [{'tool': 'Bash', 'command': command, 'result_class': rc,
+                                    'timestamp': '2026-04-01T10:00:00.000Z'}
+                                   for command, rc in calls]})
+        rules, _ = report._suggest()
+        return [si.format_permission_rule(path, prefix) for path, prefix, _, _ in rules]
+
+    def test_rejected_command_only_blocks_rules_covering_it(self):
+        self.assertEqual(self.suggest(('npm test', 'success'), ('npm test -v', 'error'),
+                                      ('npm test-all', 'user_rejected')), ['Bash(npm test:*)'])
+        self.assertEqual(self.suggest(('npm test', 'success'), ('npm test', 'success'),
+                                      ('npm test -v', 'user_rejected')), ['Bash(npm test)'])
+
+
+class ClassifierTest(unittest.TestCase):
+    RULES = [{'class': 'boom', 'substring': 'boom'},
+             {'class': 'late', 'prefix': 'Error:', 'regex': 'late$'},
+             {'class': 'error', 'prefix': 'Error:'},
+             {'class': 'shout', 'category': 'user_rejected', 'substring': 'NO',
+              'ignore_case': True},
+             {'class': 'warning', 'prefix': 'warn', 'ignore_case': True}]
+
+    def test_first_matching_rule_wins(self):
+        classifier = si.Classifier(self.RULES)
+        for text in ('Error: boom', 'Error: too late', 'Error: late again', 'no way',
+                     'Warning: x', 'all good', 'Error: no', 'WARN no', ''):
+            spans = classifier.explain(text)
+            first = next((i for i, span in enumerate(spans) if span is not None), -1)
+            self.assertEqual(classifier.match(text), first, text)
+
+    def test_builtin_error_kinds(self):
+        classifier = si.Classifier(si.CLASSIFY_RULES)
+        for result, outcome in (('Error: Exit code 1\nfailed', ('error', 'exit_code')),
+                                ('Error: Command timed out after 2m', ('error', 'timeout')),
+                                ('Error: connect ECONNREFUSED', ('error', 'network')),
+                                ('Error: something else', ('error', 'error')),
+                                ('User rejected tool use', ('user_rejected', 'user_rejected')),
+                                ('Hook PreToolUse BLOCKED by dcg', ('dcg_blocked', 'dcg_blocked')),
+                                ('Error: timed out\n', ('error', 'timeout')),
+                                ('All tests passed', ('success', None)),
+                                ({'stdout': 'Error: Exit code 1'}, ('success', None)),
+                                (None, ('pending', None))):
+            self.assertEqual(classifier.classify(result), outcome, result)
+
+    def test_rules_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'rules.json'
+            path.write_text(json.dumps({'rules': self.RULES[:2]}))
+            rules, sources = si.load_classify_rules(path)
+            self.assertEqual(rules, self.RULES[:2] + si.CLASSIFY_RULES)
+            self.assertEqual(sources[:3], ['rules.json #1', 'rules.json #2', 'built-in #1'])
+
+            path.write_text(json.dumps({'rules': self.RULES[:2], 'builtin': False}))
+            self.assertEqual(si.load_classify_rules(path)[0], self.RULES[:2])
+
+            path.write_text(json.dumps({'rules': [self.RULES[0], {'class': 'x'}]}))
+            with self.assertRaisesRegex(ValueError, 'rule 2: needs a "substring"'):
+                si.load_classify_rules(path)
+
+
+class TurnBreakdownTest(unittest.TestCase):
+    def call(self, second: int, duration_ms: int, result_class: str = 'success') -> dict:
+        return {'timestamp': f'2026-04-01T10:00:{second:02d}.000Z', 'duration_ms': duration_ms,
+                'result_class': result_class}
+
+    def test_parts(self):
+        turn = {'start': '2026-04-01T10:00:00.000Z', 'hook_ms': 1000, 'first_call': 1,
+                'prompt': 'go'}
+        calls = [self.call(0, 9000),  # Before the turn
+                 self.call(1, 3000), self.call(2, 3000),  # In parallel: 4s of tool time
+                 self.call(5, 2000, 'user_rejected'), self.call(6, None)]
+        self.assertEqual(si.turn_breakdown(turn, calls, 10000),
+                         {'start': turn['start'], 'duration_ms': 10000, 'model_ms': 3000,
+                          'tool_ms': 4000, 'permission_ms': 2000, 'hook_ms': 1000,
+                          'tool_calls': 4, 'prompt': 'go'})
+
+    def test_parts_never_exceed_the_duration(self):
+        turn = {'start': '2026-04-01T10:00:00.000Z', 'last_ts': '2026-04-01T10:00:05.000Z',
+                'hook_ms': 3000, 'first_call': 0, 'prompt': ''}
+        parts = si.turn_breakdown(turn, [self.call(1, 2000), self.call(3, 1000, 'user_rejected')])
+        self.assertEqual((parts['duration_ms'], parts['tool_ms'], parts['permission_ms'],
+                          parts['hook_ms'], parts['model_ms']), (5000, 2000, 1000, 2000, 0))
+
+
+class IndexTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.session = self.dir / 'session.jsonl'
+        gen.write_session(self.session, random.Random(1), turns=8)
+        self.index = si.SessionIndex(self.dir / 'index.db')
+        self.addCleanup(lambda: self.index.close())
+
+    def fresh(self) -> dict:
+        return plain(si.load_session(self.session, 'proj'))
+
+    def indexed(self) -> dict:
+        return plain(self.index.load(self.session, 'proj'))
+
+    def rewrite(self, lines: list):
+        """Replace the session with the given lines (a new file, as an editor would)."""
+        tmp = self.session.with_suffix('.tmp')
+        tmp.write_bytes(b''.join(lines))
+        os.replace(tmp, self.session)
+
+    def test_read_back_equals_a_fresh_parse(self):
+        parsed = self.indexed()
+        self.assertEqual(parsed, self.fresh())
+        with mock.patch.object(si, 'SessionReader', side_effect=AssertionError('parsed again')):
+            self.assertEqual(self.indexed(), parsed)
+
+    def test_appended_entries_are_parsed_from_the_offset(self):
+        lines = self.session.read_bytes().splitlines(keepends=True)
+        # Cut after a tool_use: its result comes with the appended lines
+        cut = next(i for i, line in enumerate(lines) if b'"tool_use"' in line) + 1
+        self.rewrite(lines[:cut])
+        self.assertIn('pending', [tc['result_class'] for tc in self.indexed()['tool_calls']])
+        offset = self.index.offset(self.session)
+        self.assertEqual(offset, self.session.stat().st_size)
+
+        with open(self.session, 'ab') as f:
+            f.writelines(lines[cut:])
+        starts = []
+        reader = si.SessionReader
+
+        def tracked(session_file, start=0, *args):
+            starts.append(start)
+            return reader(session_file, start, *args)
+        with mock.patch.object(si, 'SessionReader', tracked):
+            data = self.indexed()
+        self.assertEqual(starts, [offset])
+        self.assertEqual(data, self.fresh())
+
+    def test_replaced_or_truncated_file_is_parsed_again(self):
+        lines = self.session.read_bytes().splitlines(keepends=True)
+        self.indexed()
+        self.rewrite(lines[:len(lines) // 2])
+        self.assertEqual(self.indexed(), self.fresh())
+        with open(self.session, 'r+b') as f:
+            f.truncate(len(b''.join(lines[:len(lines) // 4])))
+        self.assertEqual(self.indexed(), self.fresh())
+
+    def test_other_schema_version_rebuilds(self):
+        self.indexed()
+        self.index.conn.execute('PRAGMA user_version = 1')
+        self.index.close()
+        self.index = si.SessionIndex(self.dir / 'index.db')
+        self.assertEqual(self.index.offset(self.session), 0)
+        self.assertEqual(self.indexed(), self.fresh())
+
+    def test_other_classify_rules_reclassify(self):
+        self.addCleanup(setattr, si, '_classifier', si._classifier)
+        before = self.indexed()
+        rules = self.dir / 'rules.json'
+        rules.write_text(json.dumps({'rules': [{'class': 'any', 'regex': '.'}],
+                                     'builtin': False}))
+        si.set_classify_rules(rules)
+        after = self.indexed()
+        self.assertNotEqual(after, before)
+        self.assertEqual(after, self.fresh())
+        self.assertEqual({tc['result_kind'] for tc in after['tool_calls']
+                          if isinstance(tc['result'], str)}, {'any'})
+
+
+class TimeRangeTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        gen.generate_tree(self.dir / 'projects', 200_000, projects=1, sessions=4,
+                          options=dict(gen.default_options(), large_results=0))
+        self.files = sorted((self.dir / 'projects').glob('*/*.jsonl'))
+
+    def timestamps(self, path: Path) -> list:
+        """(offset, timestamp) of the lines of a session that carry one."""
+        found, offset = [], 0
+        for line in path.read_bytes().splitlines(keepends=True):
+            ts = si._line_timestamp(line)
+            if ts:
+                found.append((offset, ts))
+            offset += len(line)
+        return found
+
+    def test_seek_timestamp_bisection(self):
+        path = max(self.files, key=lambda f: f.stat().st_size)
+        found = self.timestamps(path)
+        size = path.stat().st_size
+        targets = [ts for _, ts in found[::7]] + [ts[:-5] + '9Z' for _, ts in found[::11]]
+        targets += ['2000-01-01T00:00:00Z', '2100-01-01T00:00:00Z']
+        with mock.patch.object(si, 'BISECT_MIN_BYTES', 512), open(path, 'rb') as f:
+            for target in targets:
+                expected = next((offset for offset, ts in found if ts >= target), size)
+                self.assertEqual(si.seek_timestamp(f, target), expected, target)
+
+    def test_range_with_index_equals_no_cache(self):
+        stamps = sorted(ts for path in self.files for _, ts in self.timestamps(path))
+        since = si._parse_ts(stamps[len(stamps) * 3 // 10])
+        until = si._parse_ts(stamps[len(stamps) * 8 // 10])
+        sessions = si.find_sessions(self.dir / 'projects', since=since, until=until)
+        self.assertGreater(len(sessions), 1)
+
+        def load(**options):
+            args = argparse.Namespace(since=since, until=until, index=self.dir / 'index.db',
+                                      **options)
+            return [plain(data) for data in si.iter_session_data(sessions, args)]
+        expected = load(no_cache=True)
+        self.assertEqual(load(no_cache=False), expected)  # Filling the index
+        self.assertEqual(load(no_cache=False), expected)  # Read back from it
+        starts = [data['first_ts'] for data in expected if data['first_ts']]
+        self.assertGreaterEqual(min(starts), si._utc_iso(since))
+
+    def test_tail_reads(self):
+        path = max(self.files, key=lambda f: f.stat().st_size)
+        full = plain(si.load_session(path, 'proj'))['tool_calls']
+        with mock.patch.object(si, 'TAIL_READ_BYTES', 2048):
+            tail = plain(si.load_session_tail(path, 'proj', si.LINE_ALL,
+                                              lambda data: len(data['tool_calls']) >= 5))
+            self.assertLess(len(tail['tool_calls']), len(full))
+            self.assertGreaterEqual(len(tail['tool_calls']), 5)
+            self.assertEqual(tail['tool_calls'], full[-len(tail['tool_calls']):])
+            whole = si.load_session_tail(path, 'proj', si.LINE_ALL, lambda data: False)
+            self.assertEqual(plain(whole)['tool_calls'], full)
+
+
+class ExportTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.session = self.dir / 'session.jsonl'
+
+    def export(self) -> int:
+        """Export the session again, returning the results in the export."""
+        si.export_sessions([(0, self.session, 'proj')], argparse.Namespace(no_cache=True),
+                           si.SQLiteExport(self.dir / 'export.db'))
+        conn = sqlite3.connect(self.dir / 'export.db')
+        try:
+            return conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        finally:
+            conn.close()
+
+    def test_lines_appended_while_reading_are_exported_next_time(self):
+        append_entries(self.session, *tool_call(1))
+        load = si.load_session_offset
+
+        def load_then_append(*args):
+            loaded = load(*args)
+            append_entries(self.session, *tool_call(2))
+            return loaded
+        with mock.patch.object(si, 'load_session_offset', load_then_append):
+            self.assertEqual(self.export(), 1)
+        self.assertEqual(self.export(), 2)
+
+    def test_unfinished_line_is_exported_once_complete(self):
+        append_entries(self.session, *tool_call(1), tool_call(2)[0])
+        line = json.dumps(tool_call(2)[1]) + '\n'
+        with open(self.session, 'a', encoding='utf-8') as f:
+            f.write(line[:40])
+        self.assertEqual(self.export(), 1)
+        with open(self.session, 'a', encoding='utf-8') as f:
+            f.write(line[40:])
+        self.assertEqual(self.export(), 2)
+
+    def test_replaced_session_starts_ndjson_over(self):
+        def export():
+            _, counts, restarted = si.export_sessions(
+                [(0, self.session, 'proj')], argparse.Namespace(no_cache=True),
+                si.NDJSONExport(self.dir / 'ndjson'))
+            return counts['results'], restarted
+        append_entries(self.session, *tool_call(1), *tool_call(2))
+        self.assertEqual(export(), (2, False))
+        append_entries(self.session, *tool_call(3))
+        self.assertEqual(export(), (1, False))
+        replacement = self.dir / 'replacement.jsonl'
+        append_entries(replacement, *tool_call(4))
+        os.replace(replacement, self.session)
+        self.assertEqual(export(), (1, True))
+        results = (self.dir / 'ndjson' / 'results.ndjson').read_text().splitlines()
+        self.assertEqual([json.loads(line)['seq'] for line in results], [0])
+
+
+class MalformedEntryTest(unittest.TestCase):
+    def scan(self, *entries):
+        scanner = si.SessionScanner()
+        for entry in entries:
+            scanner.feed(entry)
+        return scanner.data
+
+    def test_tool_name_that_is_not_a_string(self):
+        data = self.scan(*({'type': 'assistant', 'timestamp': '2026-04-01T10:00:00.000Z',
+                            'uuid': f'a{i}', 'message': {'content': [
+                                {'type': 'tool_use', 'id': f't{i}', 'name': name, 'input': {}}]}}
+                           for i, name in enumerate((5, None, {'x': 1}))))
+        self.assertEqual([tc['tool'] for tc in data['tool_calls']], ['5', 'None', "{'x': 1}"])
+        self.assertEqual([e['tool'] for e in data['events']], ['5', 'None', "{'x': 1}"])
+
+    def test_hook_progress_fields_that_are_not_strings(self):
+        def progress(**fields):
+            return {'type': 'progress', 'timestamp': '2026-04-01T10:00:00.000Z',
+                    'data': dict(type='hook_progress', **fields)}
+        data = self.scan(progress(hookEvent=7, command='x'),
+                         progress(hookEvent='PostToolUse', command=['x'],
+                                  hookName='PostToolUse:Bash'),
+                         progress(hookEvent='SessionEnd', command={'x': 1}))
+        self.assertEqual(data['hook_runs'], {('PostToolUse', 'PostToolUse:Bash'): 1,
+                                             ('SessionEnd', '(unknown)'): 1})
+
+
+if __name__ == '__main__':
+    unittest.main()